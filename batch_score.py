@@ -0,0 +1,185 @@
+# batch_score.py
+"""Headless batch scoring of CSV/Parquet patient cohorts.
+
+Streams the input in fixed-size chunks through the same model the
+Streamlit app loads and writes the angina probability and LOW/MODERATE/HIGH
+tier for every row. Only one chunk is held in memory at a time.
+
+Usage:
+    python batch_score.py cohort.parquet scored.csv --chunk-size 50000
+"""
+import argparse
+import sys
+import time
+import numpy as np
+import pandas as pd
+from typing import Iterator, Optional
+
+from fast_inference import (BOOLEAN_FEATURES, CATEGORICAL_LEVELS, MODEL_NAME, NUMERIC_RANGES, load_scoring_model,
+                            risk_tiers, score_frame)
+
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith(('.parquet', '.pq'))
+
+
+def iter_chunks(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Yield the input file as DataFrames of at most chunk_size rows"""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+OUTPUT_FLOAT_COLUMNS = ('angina_probability',)
+OUTPUT_STRING_COLUMNS = ('risk_level',)
+
+
+def _declared_type(name: str):
+    """Arrow type of a schema field or score column, None for any other column"""
+    import pyarrow as pa
+
+    if name in NUMERIC_RANGES or name in OUTPUT_FLOAT_COLUMNS:
+        return pa.float64()
+    if name in CATEGORICAL_LEVELS or name in OUTPUT_STRING_COLUMNS:
+        return pa.string()
+    if name in BOOLEAN_FEATURES:
+        return pa.bool_()
+    return None
+
+
+def _conform(frame: pd.DataFrame) -> pd.DataFrame:
+    """Input fields converted to their declared types, the way the scorer reads them"""
+    frame = frame.copy()
+    for name in frame.columns:
+        values = frame[name]
+        if name in NUMERIC_RANGES:
+            frame[name] = pd.to_numeric(values, errors='coerce').astype(np.float64)
+        elif name in CATEGORICAL_LEVELS:
+            frame[name] = values.astype(str).where(values.notna(), None)
+        elif name in BOOLEAN_FEATURES:
+            flags = pd.to_numeric(values, errors='coerce')
+            frame[name] = (flags != 0).astype('boolean').where(flags.notna())
+    return frame
+
+
+def _output_schema(table):
+    """Parquet schema for the whole output.
+
+    Input fields and score columns get their declared types whatever the
+    first chunk holds. Other columns (e.g. an ID) are typed from the first
+    chunk, with integers widened to float64 (a later chunk may have a missing
+    value) and all-null columns written as strings.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for field in table.schema:
+        declared = _declared_type(field.name)
+        if declared is not None:
+            field = field.with_type(declared)
+        elif pa.types.is_integer(field.type):
+            field = field.with_type(pa.float64())
+        elif pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+class ChunkWriter:
+    """Appends scored chunks to a CSV or Parquet output file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._parquet_writer = None
+        self._schema = None
+        self._header_written = False
+
+    def write(self, frame: pd.DataFrame):
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(_conform(frame), preserve_index=False)
+            if self._parquet_writer is None:
+                self._schema = _output_schema(table)
+                self._parquet_writer = pq.ParquetWriter(self.path, self._schema)
+            try:
+                # Columns beyond the declared ones are cast, e.g. numbers into a column first seen empty
+                table = table.cast(self._schema)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, ValueError) as e:
+                raise ValueError(f"Chunk does not fit the output schema of {self.path}: {e}") from e
+            self._parquet_writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a' if self._header_written else 'w',
+                         header=not self._header_written, index=False)
+            self._header_written = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def score_chunk(chunk: pd.DataFrame, model, scorer) -> np.ndarray:
+    """Angina probabilities for every row of a chunk"""
+    return score_frame(model, scorer, chunk)
+
+
+def score_file(input_path: str, output_path: str, chunk_size: int = 50000,
+               model_name: str = MODEL_NAME, id_column: Optional[str] = None,
+               quiet: bool = False) -> int:
+    """Score input_path into output_path chunk by chunk; returns rows scored"""
+    model, scorer = load_scoring_model(model_name)
+    if not quiet:
+        print(f"Scoring with {'native LightGBM fast path' if scorer else 'PyCaret predict_model'}",
+              file=sys.stderr)
+
+    writer = ChunkWriter(output_path)
+    total_rows = 0
+    start = time.perf_counter()
+    try:
+        for chunk in iter_chunks(input_path, chunk_size):
+            chunk_start = time.perf_counter()
+            probabilities = score_chunk(chunk, model, scorer)
+
+            out = chunk[[id_column]].copy() if id_column else chunk
+            out['angina_probability'] = probabilities
+            out['risk_level'] = risk_tiers(probabilities)
+            writer.write(out)
+
+            total_rows += len(chunk)
+            if not quiet:
+                elapsed = time.perf_counter() - chunk_start
+                print(f"  {total_rows:>12,} rows | chunk {len(chunk) / max(elapsed, 1e-9):,.0f} rows/s",
+                      file=sys.stderr)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    if not quiet:
+        print(f"Scored {total_rows:,} rows in {elapsed:.2f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/s)",
+              file=sys.stderr)
+    return total_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch angina risk scoring for CSV/Parquet cohorts")
+    parser.add_argument('input', help="Input cohort (.csv or .parquet)")
+    parser.add_argument('output', help="Output file (.csv or .parquet)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per streamed chunk")
+    parser.add_argument('--model', default=MODEL_NAME, help="PyCaret model name (without .pkl)")
+    parser.add_argument('--id-column', help="Only write this column alongside the scores")
+    parser.add_argument('--quiet', action='store_true', help="Suppress progress output")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be positive")
+    score_file(args.input, args.output, chunk_size=args.chunk_size, model_name=args.model,
+               id_column=args.id_column, quiet=args.quiet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# cohort_analytics.py
+"""Out-of-core summaries of scored patient cohorts.
+
+Streams a CSV/Parquet extract chunk by chunk, scores each chunk (or reuses an
+angina_probability column written by batch_score.py) and folds it into a
+fixed-size CohortAggregate: risk-tier counts, a risk histogram, fixed-bin
+histograms of every numeric input, category counts, and risk sums by sex,
+ethnic group and diabetes status. Rows whose probability is missing or not
+finite are counted as unscored and left out of every risk figure. Aggregates merge by addition, so memory is
+bounded by one chunk however large the file, and partial results can be shown
+or combined as chunks finish.
+
+Usage:
+    python cohort_analytics.py cohort.parquet --chunk-size 50000 --json summary.json
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from batch_score import iter_chunks
+from fast_inference import (CATEGORICAL_LEVELS, HIGH_RISK_THRESHOLD, MODEL_NAME, MODERATE_RISK_THRESHOLD,
+                            NUMERIC_RANGES, load_scoring_model, score_frame)
+
+RISK_COLUMN = 'angina_probability'
+TIERS = ('LOW', 'MODERATE', 'HIGH')
+GROUP_FIELDS = ('sex', 'ethnic', 'diabetes_status')
+HISTOGRAM_BINS = 40
+RISK_BINS = 20
+
+ScoreFrame = Callable[[pd.DataFrame], np.ndarray]
+
+
+def bin_counts(values: np.ndarray, low: float, high: float, bins: int) -> Tuple[np.ndarray, int]:
+    """Counts per fixed bin over [low, high] (out-of-range values land in the edge bins) and NaN count"""
+    missing = np.isnan(values)
+    positions = ((values[~missing] - low) * (bins / (high - low))).astype(np.intp)
+    return np.bincount(np.clip(positions, 0, bins - 1), minlength=bins), int(missing.sum())
+
+
+class CohortAggregate:
+    """Mergeable fixed-size summary of a scored cohort"""
+
+    def __init__(self, bins: int = HISTOGRAM_BINS):
+        self.bins = bins
+        self.rows = 0
+        self.unscored = 0
+        self.tier_counts = np.zeros(len(TIERS), dtype=np.int64)
+        self.risk_histogram = np.zeros(RISK_BINS, dtype=np.int64)
+        self.risk_sum = 0.0
+        self.histograms = {name: np.zeros(bins, dtype=np.int64) for name in NUMERIC_RANGES}
+        self.missing = dict.fromkeys(NUMERIC_RANGES, 0)
+        self.category_counts = {name: {} for name in CATEGORICAL_LEVELS}
+        self.group_risk = {name: {} for name in GROUP_FIELDS}
+
+    def update(self, chunk: pd.DataFrame, probabilities: np.ndarray) -> 'CohortAggregate':
+        """Fold one scored chunk into the aggregate"""
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        scored = np.isfinite(probabilities)
+        self.rows += len(chunk)
+        self.unscored += int((~scored).sum())
+        finite = probabilities[scored]
+        tiers = np.searchsorted([MODERATE_RISK_THRESHOLD, HIGH_RISK_THRESHOLD], finite, side='right')
+        self.tier_counts += np.bincount(tiers, minlength=len(TIERS))
+        counts, _ = bin_counts(finite, 0.0, 1.0, RISK_BINS)
+        self.risk_histogram += counts
+        self.risk_sum += float(finite.sum())
+
+        for name, (low, high) in NUMERIC_RANGES.items():
+            if name in chunk:
+                values = pd.to_numeric(chunk[name], errors='coerce').to_numpy(dtype=np.float64)
+                counts, missing = bin_counts(values, low, high, self.bins)
+                self.histograms[name] += counts
+                self.missing[name] += missing
+            else:
+                self.missing[name] += len(chunk)
+        for name, counts in self.category_counts.items():
+            if name in chunk:
+                for level, count in chunk[name].value_counts(dropna=False).items():
+                    level = 'Missing' if pd.isna(level) else str(level)
+                    counts[level] = counts.get(level, 0) + int(count)
+        risk = pd.Series(probabilities, index=chunk.index)[scored]
+        for name, sums in self.group_risk.items():
+            if name in chunk:
+                levels = chunk[name][scored]
+                levels = levels.astype(object).where(levels.notna(), 'Missing').astype(str)
+                grouped = risk.groupby(levels).agg(['sum', 'count'])
+                for level, (total, count) in grouped.iterrows():
+                    previous = sums.get(level, (0.0, 0))
+                    sums[level] = (previous[0] + float(total), previous[1] + int(count))
+        return self
+
+    def merge(self, other: 'CohortAggregate') -> 'CohortAggregate':
+        """Add another aggregate (e.g. from a parallel worker or another file) into this one"""
+        if other.bins != self.bins:
+            raise ValueError(f"Cannot merge aggregates with {self.bins} and {other.bins} bins")
+        self.rows += other.rows
+        self.unscored += other.unscored
+        self.tier_counts += other.tier_counts
+        self.risk_histogram += other.risk_histogram
+        self.risk_sum += other.risk_sum
+        for name in self.histograms:
+            self.histograms[name] += other.histograms[name]
+            self.missing[name] += other.missing[name]
+        for name, counts in self.category_counts.items():
+            for level, count in other.category_counts[name].items():
+                counts[level] = counts.get(level, 0) + count
+        for name, sums in self.group_risk.items():
+            for level, (total, count) in other.group_risk[name].items():
+                previous = sums.get(level, (0.0, 0))
+                sums[level] = (previous[0] + total, previous[1] + count)
+        return self
+
+    @property
+    def scored(self) -> int:
+        """Rows with a finite predicted probability"""
+        return self.rows - self.unscored
+
+    @property
+    def mean_risk(self) -> float:
+        return self.risk_sum / self.scored if self.scored else float('nan')
+
+    def histogram_edges(self, name: str) -> np.ndarray:
+        low, high = NUMERIC_RANGES[name]
+        return np.linspace(low, high, self.bins + 1)
+
+    def group_means(self) -> pd.DataFrame:
+        """Mean predicted risk and patient count for every level of each group field"""
+        rows = [(name, level, total / count, count)
+                for name, sums in self.group_risk.items() for level, (total, count) in sorted(sums.items())]
+        return pd.DataFrame(rows, columns=['group', 'level', 'mean_risk', 'patients'])
+
+    def to_dict(self) -> Dict:
+        """JSON-serialisable summary"""
+        return {
+            'rows': self.rows,
+            'unscored': self.unscored,
+            'mean_risk': self.mean_risk,
+            'tier_counts': dict(zip(TIERS, self.tier_counts.tolist())),
+            'risk_histogram': self.risk_histogram.tolist(),
+            'histograms': {name: {'range': list(NUMERIC_RANGES[name]), 'counts': counts.tolist(),
+                                  'missing': self.missing[name]}
+                           for name, counts in self.histograms.items()},
+            'category_counts': self.category_counts,
+            'group_mean_risk': {name: {level: {'mean_risk': total / count, 'patients': count}
+                                       for level, (total, count) in sums.items()}
+                                for name, sums in self.group_risk.items()}
+        }
+
+
+def cohort_row_count(path: str) -> Optional[int]:
+    """Row count from Parquet metadata without reading the data (None for CSV)"""
+    if path.lower().endswith(('.parquet', '.pq')):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    return None
+
+
+def stream_cohort(path: str, score: Optional[ScoreFrame], chunk_size: int = 50000) -> Iterator[CohortAggregate]:
+    """Yield the running aggregate after each chunk; chunks already scored are not rescored"""
+    total = CohortAggregate()
+    for chunk in iter_chunks(path, chunk_size):
+        if RISK_COLUMN in chunk:
+            probabilities = chunk[RISK_COLUMN].to_numpy(dtype=np.float64)
+        elif score is not None:
+            probabilities = score(chunk)
+        else:
+            raise ValueError(f"{path} has no {RISK_COLUMN} column and no model to score it")
+        yield total.merge(CohortAggregate().update(chunk, probabilities))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a CSV/Parquet cohort without loading it into memory")
+    parser.add_argument('input', help="Cohort file (.csv or .parquet), optionally scored by batch_score.py")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per streamed chunk")
+    parser.add_argument('--model', default=MODEL_NAME, help="PyCaret model name (without .pkl)")
+    parser.add_argument('--json', help="Write the full summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be positive")
+    model, scorer = load_scoring_model(args.model)
+    start = time.perf_counter()
+    aggregate = CohortAggregate()
+    for aggregate in stream_cohort(args.input, lambda chunk: score_frame(model, scorer, chunk), args.chunk_size):
+        print(f"  {aggregate.rows:>12,} rows", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    print(f"{aggregate.rows:,} patients in {elapsed:.1f}s, mean risk {aggregate.mean_risk:.1%}")
+    if aggregate.unscored:
+        print(f"  {aggregate.unscored:,} rows without a finite probability are left out of the risk figures")
+    for tier, count in zip(TIERS, aggregate.tier_counts):
+        print(f"  {tier:<9} {count:>12,} ({count / max(aggregate.scored, 1):.1%})")
+    print(aggregate.group_means().to_string(index=False, formatters={'mean_risk': '{:.1%}'.format}))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(aggregate.to_dict(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+# drift_monitor.py
+"""Input drift monitoring with fixed-size streaming sketches.
+
+Every patient the app scores is folded into an InputSketch: one fixed-bin
+histogram per numeric input (the same NUMERIC_RANGES bins cohort_analytics
+uses) and a counter per categorical and yes/no input. An update touches one
+slot per field, so it costs the same few microseconds however many patients
+have been seen, and the whole sketch serialises to a few kilobytes of JSON.
+Drift is reported as PSI and a binned KS distance against a baseline sketch
+built offline from the training extract.
+
+Usage:
+    python drift_monitor.py baseline training.parquet --output drift_baseline.json
+    python drift_monitor.py report --state ~/.cache/cardiopredict/drift_sketch.json --baseline drift_baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from batch_score import iter_chunks
+from cohort_analytics import HISTOGRAM_BINS, bin_counts
+from fast_inference import BOOLEAN_FEATURES, CATEGORICAL_LEVELS, NUMERIC_RANGES
+
+logger = logging.getLogger(__name__)
+
+BASELINE_PATH = 'drift_baseline.json'
+SKETCH_FORMAT_VERSION = 1
+MISSING = 'Missing'
+
+# Conventional PSI bands: below 0.1 stable, 0.1-0.25 moderate shift, above 0.25 significant
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+PSI_FLOOR = 1e-4
+# PSI is computed over groups of adjacent histogram bins, which keeps it from being inflated by sparse bins
+PSI_BINS = 10
+
+SAVE_EVERY = 100
+# Patient keys remembered so repeat analyses of the same inputs are recorded once
+RECENT_KEYS = 4096
+CHECK_EVERY = 500
+MIN_REPORT_SAMPLES = 200
+
+
+def _boolean_label(value) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return MISSING
+    if isinstance(value, str):
+        return str(value.strip().lower() in ('true', 'yes', '1', '1.0'))
+    return str(bool(value))
+
+
+def _category_label(value) -> str:
+    return MISSING if value is None or (isinstance(value, float) and np.isnan(value)) else str(value)
+
+
+def _write_json(path: str, data: Dict):
+    """Atomically replace path with data as JSON"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class InputSketch:
+    """Fixed-size per-field histograms and category counts of scored inputs"""
+
+    def __init__(self, bins: int = HISTOGRAM_BINS):
+        self.bins = bins
+        self.count = 0
+        self._numeric = list(NUMERIC_RANGES)
+        self._low = np.array([NUMERIC_RANGES[name][0] for name in self._numeric])
+        self._scale = bins / (np.array([NUMERIC_RANGES[name][1] for name in self._numeric]) - self._low)
+        self._offsets = np.arange(len(self._numeric)) * bins
+        self._counts = np.zeros((len(self._numeric), bins), dtype=np.int64)
+        self._flat = self._counts.reshape(-1)
+        self._missing = np.zeros(len(self._numeric), dtype=np.int64)
+        self.histograms = {name: self._counts[i] for i, name in enumerate(self._numeric)}
+        self.categories = {name: {} for name in [*CATEGORICAL_LEVELS, *BOOLEAN_FEATURES]}
+
+    @property
+    def missing(self) -> Dict[str, int]:
+        return dict(zip(self._numeric, self._missing.tolist()))
+
+    def update(self, inputs: Dict):
+        """Fold one patient in: one histogram slot or counter per field"""
+        try:
+            values = np.array([inputs.get(name) for name in self._numeric], dtype=np.float64)
+        except (TypeError, ValueError):
+            values = pd.to_numeric(pd.Series([inputs.get(name) for name in self._numeric], dtype=object),
+                                   errors='coerce').to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        # fmax maps NaN to bin 0, but missing fields are masked out of the increment below
+        positions = np.minimum(np.fmax((values - self._low) * self._scale, 0), self.bins - 1).astype(np.intp)
+        self._flat[(self._offsets + positions)[~missing]] += 1
+        self._missing += missing
+        self.count += 1
+        for name, counts in self.categories.items():
+            label = _boolean_label(inputs.get(name)) if name in BOOLEAN_FEATURES else _category_label(inputs.get(name))
+            counts[label] = counts.get(label, 0) + 1
+
+    def update_frame(self, frame: pd.DataFrame):
+        """Vectorised update with every row of a DataFrame"""
+        self.count += len(frame)
+        for i, (name, (low, high)) in enumerate(NUMERIC_RANGES.items()):
+            if name not in frame:
+                self._missing[i] += len(frame)
+                continue
+            values = pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=np.float64)
+            counts, missing = bin_counts(values, low, high, self.bins)
+            self._counts[i] += counts
+            self._missing[i] += missing
+        for name in self.categories:
+            if name not in frame:
+                continue
+            label = _boolean_label if name in BOOLEAN_FEATURES else _category_label
+            for value, count in frame[name].value_counts(dropna=False).items():
+                key = label(value)
+                self.categories[name][key] = self.categories[name].get(key, 0) + int(count)
+
+    def histogram(self, name: str, bins: Optional[int] = None) -> np.ndarray:
+        """Counts of one numeric input, summed into bins equal groups when a coarser resolution is asked for"""
+        counts = self.histograms[name]
+        if bins is None or bins == self.bins:
+            return counts
+        if self.bins % bins:
+            raise ValueError(f"Cannot rebin {self.bins} bins into {bins}")
+        return counts.reshape(bins, -1).sum(axis=1)
+
+    def to_dict(self) -> Dict:
+        return {
+            'format_version': SKETCH_FORMAT_VERSION,
+            'bins': self.bins,
+            'count': self.count,
+            'histograms': {name: counts.tolist() for name, counts in self.histograms.items()},
+            'missing': self.missing,
+            'categories': {name: dict(counts) for name, counts in self.categories.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'InputSketch':
+        if data.get('format_version') != SKETCH_FORMAT_VERSION:
+            raise ValueError(f"Unsupported sketch format {data.get('format_version')}")
+        sketch = cls(data['bins'])
+        sketch.count = data['count']
+        for i, name in enumerate(sketch._numeric):
+            if name in data['histograms']:
+                sketch._counts[i] = data['histograms'][name]
+                sketch._missing[i] = data['missing'].get(name, 0)
+        for name, counts in data['categories'].items():
+            if name in sketch.categories:
+                sketch.categories[name] = dict(counts)
+        return sketch
+
+    def save(self, path: str):
+        _write_json(path, self.to_dict())
+
+    @classmethod
+    def load(cls, path: str) -> 'InputSketch':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Population stability index between two count vectors over the same bins"""
+    p = np.maximum(expected / max(expected.sum(), 1), PSI_FLOOR)
+    q = np.maximum(actual / max(actual.sum(), 1), PSI_FLOOR)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def binned_ks(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Largest gap between the two binned CDFs (the KS statistic up to bin resolution)"""
+    p = np.cumsum(expected) / max(expected.sum(), 1)
+    q = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.max(np.abs(p - q)))
+
+
+def _coarsen(counts: np.ndarray, bins: int = PSI_BINS) -> np.ndarray:
+    return counts.reshape(bins, -1).sum(axis=1) if len(counts) % bins == 0 else counts
+
+
+def shared_bins(baseline: InputSketch, live: InputSketch) -> int:
+    """Histogram resolution both sketches can be compared at (the coarser one, if it divides the finer)"""
+    bins = min(baseline.bins, live.bins)
+    if baseline.bins % bins or live.bins % bins:
+        raise ValueError(f"Baseline sketch has {baseline.bins} bins and live sketch {live.bins}; "
+                         "rebuild one so the bin counts match")
+    return bins
+
+
+def drift_status(value: float) -> str:
+    if value >= PSI_SIGNIFICANT:
+        return 'significant'
+    if value >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+def drift_report(baseline: InputSketch, live: InputSketch) -> pd.DataFrame:
+    """PSI, binned KS and status per input field, most drifted first.
+
+    Sketches with different bin counts are compared at the coarser one when
+    it divides the finer, else a ValueError is raised. Numeric PSI uses
+    PSI_BINS groups of bins plus one for missing values; KS compares the
+    non-missing distributions at the shared resolution. Categorical fields
+    have PSI only.
+    """
+    bins = shared_bins(baseline, live)
+    rows = []
+    baseline_missing, live_missing = baseline.missing, live.missing
+    for name in NUMERIC_RANGES:
+        baseline_counts = baseline.histogram(name, bins)
+        live_counts = live.histogram(name, bins)
+        expected = np.append(_coarsen(baseline_counts), baseline_missing[name])
+        actual = np.append(_coarsen(live_counts), live_missing[name])
+        rows.append((name, 'numeric', psi(expected, actual), binned_ks(baseline_counts, live_counts)))
+    for name, counts in live.categories.items():
+        levels = sorted(set(baseline.categories[name]) | set(counts))
+        expected = np.array([baseline.categories[name].get(level, 0) for level in levels], dtype=float)
+        actual = np.array([counts.get(level, 0) for level in levels], dtype=float)
+        rows.append((name, 'categorical', psi(expected, actual), np.nan))
+    report = pd.DataFrame(rows, columns=['feature', 'kind', 'psi', 'ks'])
+    report['status'] = report['psi'].map(drift_status)
+    return report.sort_values('psi', ascending=False).reset_index(drop=True)
+
+
+class DriftMonitor:
+    """Thread-safe live sketch that persists itself and checks drift every CHECK_EVERY updates"""
+
+    def __init__(self, baseline: Optional[InputSketch] = None, state_path: Optional[str] = None,
+                 save_every: int = SAVE_EVERY, check_every: int = CHECK_EVERY):
+        self.state_path = state_path
+        self.save_every = save_every
+        self.check_every = check_every
+        self.sketch = InputSketch()
+        if state_path and os.path.exists(state_path):
+            try:
+                self.sketch = InputSketch.load(state_path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Discarding unreadable drift sketch %s: %s", state_path, e)
+        if baseline is not None:
+            try:
+                shared_bins(baseline, self.sketch)
+            except ValueError as e:
+                logger.warning("Drift baseline ignored: %s", e)
+                baseline = None
+        self.baseline = baseline
+        self.last_report: Optional[pd.DataFrame] = None
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, inputs: Dict, key: Optional[str] = None):
+        """Fold one scored patient into the live sketch; a key seen among the last RECENT_KEYS is skipped"""
+        with self._lock:
+            if key is not None:
+                if key in self._recent:
+                    self._recent.move_to_end(key)
+                    return
+                self._recent[key] = None
+                if len(self._recent) > RECENT_KEYS:
+                    self._recent.popitem(last=False)
+            self.sketch.update(inputs)
+            count = self.sketch.count
+        if self.state_path and count % self.save_every == 0:
+            self.save()
+        if self.baseline is not None and count % self.check_every == 0 and count >= MIN_REPORT_SAMPLES:
+            report = self.report()
+            drifted = report[report['status'] == 'significant']
+            if len(drifted):
+                logger.warning("Input drift after %d predictions: %s", count,
+                               ", ".join(f"{row.feature} (PSI {row.psi:.2f})" for row in drifted.itertuples()))
+
+    def report(self) -> Optional[pd.DataFrame]:
+        """Drift of the live sketch against the baseline (None without a baseline)"""
+        if self.baseline is None:
+            return None
+        with self._lock:
+            live = InputSketch.from_dict(self.sketch.to_dict())
+        self.last_report = drift_report(self.baseline, live)
+        return self.last_report
+
+    def save(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            snapshot = self.sketch.to_dict()
+        try:
+            _write_json(self.state_path, snapshot)
+        except OSError as e:
+            logger.warning("Could not persist drift sketch to %s: %s", self.state_path, e)
+
+    def reset(self):
+        with self._lock:
+            self.sketch = InputSketch()
+            self.last_report = None
+            self._recent.clear()
+        self.save()
+
+
+def build_baseline(input_path: str, chunk_size: int = 200000) -> InputSketch:
+    """Sketch a CSV/Parquet training extract chunk by chunk"""
+    sketch = InputSketch()
+    for chunk in iter_chunks(input_path, chunk_size):
+        sketch.update_frame(chunk)
+    return sketch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build drift baselines and report input drift")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    baseline = subparsers.add_parser('baseline', help="Sketch the training extract")
+    baseline.add_argument('input', help="Training data (.csv or .parquet)")
+    baseline.add_argument('--output', default=BASELINE_PATH, help="Baseline sketch JSON")
+    baseline.add_argument('--chunk-size', type=int, default=200000, help="Rows per streamed chunk")
+    report = subparsers.add_parser('report', help="Compare a live sketch with the baseline")
+    report.add_argument('--state', required=True, help="Live sketch JSON written by the app")
+    report.add_argument('--baseline', default=BASELINE_PATH, help="Baseline sketch JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == 'baseline':
+        sketch = build_baseline(args.input, args.chunk_size)
+        sketch.save(args.output)
+        print(f"Baseline of {sketch.count:,} rows written to {args.output}", file=sys.stderr)
+    else:
+        live = InputSketch.load(args.state)
+        result = drift_report(InputSketch.load(args.baseline), live)
+        print(f"{live.count:,} scored patients")
+        print(result.to_string(index=False, float_format='{:.3f}'.format))
+        sys.exit(1 if (result['status'] == 'significant').any() else 0)
+
+
+if __name__ == "__main__":
+    main()
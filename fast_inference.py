@@ -0,0 +1,890 @@
+# fast_inference.py
+"""Native LightGBM scoring path for the CardioPredict PyCaret pipeline"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = 'All_Variables_Model_LightGBM'
+
+# Compiled artifact written by `python fast_inference.py export`
+ARTIFACT_DIR = MODEL_NAME + '_compiled'
+ARTIFACT_FORMAT_VERSION = 1
+
+# Risk tier cutoffs used across the app and report
+HIGH_RISK_THRESHOLD = 0.7
+MODERATE_RISK_THRESHOLD = 0.3
+UNSCORED_TIER = "UNSCORED"
+
+# Input schema shared with the Streamlit sidebar (slider ranges and option lists)
+NUMERIC_RANGES = {
+    'age': (18, 120),
+    'BMI': (10.0, 60.0),
+    'mean_sbp': (70, 250),
+    'mean_dbp': (40, 150),
+    'mean_heart_rate': (30, 200),
+    'hba1c': (20, 150),
+    'random_glucose': (2.0, 20.0),
+    'total_cholesterol': (2.0, 12.0),
+    'hdl': (0.5, 3.0),
+    'ldl': (0.5, 8.0),
+    'triglyceride': (0.1, 5.0),
+    'Cholesterol_HDL_Ratio': (1.0, 10.0),
+    'creatinine': (30, 300),
+    'blood_urea_nitrogen': (1.0, 20.0),
+    'sodium': (120, 160),
+    'potassium': (2.5, 7.0),
+    'glucose': (2.0, 20.0),
+    'hemoglobin': (5.0, 20.0),
+    'hematocrit': (15.0, 60.0),
+    'mean_corpuscular_volume': (60.0, 120.0),
+    'mean_corpuscular_hemoglobin': (20.0, 40.0),
+    'mean_corpuscular_hemoglobin_concentration': (25.0, 40.0),
+    'white_blood_cell_count': (2.0, 20.0),
+    'red_blood_cell_count': (2.0, 7.0),
+    'platelet_count': (50.0, 600.0),
+    'creatine_phosphokinase': (10, 5000),
+    'ast': (5.0, 200.0),
+    'uric_acid': (100.0, 600.0)
+}
+
+CATEGORICAL_LEVELS = {
+    'sex': ['Female', 'Male'],
+    'ethnic': ['White European', 'Black African', 'Black Caribbean', 'Chinese', 'Mixed', 'Other ethnic group', 'South Asian'],
+    'smoking_status': ['ex-smoker', 'heavy smoker', 'light smoker', 'moderate smoker', 'non-smoker'],
+    'physical_activity': ['high', 'low', 'moderate'],
+    'diabetes_status': ['No Diabetes', 'Type 1 Diabetes', 'Type 2 Diabetes']
+}
+
+BOOLEAN_FEATURES = [
+    'chest_pain', 'fam_chd', 'chol_lowering', 'has_t1d', 'has_t2d',
+    'treated_hypertension', 'corticosteroid_use'
+]
+
+# Sidebar defaults; also the reference patient used to probe the fitted pipeline
+REFERENCE_PATIENT = {
+    'chest_pain': 0.0, 'age': 51, 'sex': 'Female', 'ethnic': 'White European', 'BMI': 20.2115,
+    'smoking_status': 'non-smoker', 'physical_activity': 'high', 'mean_sbp': 116, 'mean_dbp': 79.5,
+    'mean_heart_rate': 61, 'hba1c': 38.5, 'random_glucose': 5.995, 'total_cholesterol': 4.47,
+    'hdl': 1.492, 'ldl': 2.69, 'triglyceride': 0.504, 'Cholesterol_HDL_Ratio': 2.996, 'fam_chd': 1,
+    'chol_lowering': 0, 'has_t1d': 0, 'has_t2d': 0, 'diabetes_status': 'No Diabetes',
+    'treated_hypertension': 0, 'corticosteroid_use': 0, 'creatinine': 52, 'blood_urea_nitrogen': 2.36,
+    'sodium': 14, 'potassium': 13.6, 'glucose': 5.995, 'hemoglobin': 11.93, 'hematocrit': 35.34,
+    'mean_corpuscular_volume': 91.24, 'mean_corpuscular_hemoglobin': 30.79,
+    'mean_corpuscular_hemoglobin_concentration': 33.75, 'white_blood_cell_count': 5.24,
+    'red_blood_cell_count': 3.873, 'platelet_count': 242.7, 'creatine_phosphokinase': 1690,
+    'ast': 24.6, 'uric_acid': 131.7
+}
+
+# Sidebar widget order, i.e. the column order of pd.DataFrame([inputs]) in the app
+INPUT_FEATURES = [
+    'age', 'sex', 'ethnic', 'BMI', 'smoking_status', 'physical_activity',
+    'chest_pain', 'mean_sbp', 'mean_dbp', 'mean_heart_rate', 'fam_chd', 'diabetes_status',
+    'treated_hypertension', 'chol_lowering', 'corticosteroid_use', 'has_t1d', 'has_t2d',
+    'total_cholesterol', 'hdl', 'ldl', 'triglyceride', 'Cholesterol_HDL_Ratio',
+    'glucose', 'random_glucose', 'hba1c', 'creatinine', 'blood_urea_nitrogen', 'sodium', 'potassium',
+    'hemoglobin', 'hematocrit', 'white_blood_cell_count', 'red_blood_cell_count', 'platelet_count',
+    'mean_corpuscular_volume', 'mean_corpuscular_hemoglobin', 'mean_corpuscular_hemoglobin_concentration',
+    'creatine_phosphokinase', 'ast', 'uric_acid'
+]
+
+# predict_model rounds prediction_score to 4 decimals
+PARITY_TOLERANCE = 1e-4
+
+
+def canonical_patient(inputs: Dict) -> Dict:
+    """Normalise a patient dict to the types the sidebar widgets produce"""
+    patient = dict(inputs)
+    for name in BOOLEAN_FEATURES:
+        if name in patient and patient[name] is not None:
+            patient[name] = bool(patient[name])
+    return patient
+
+
+def risk_tier(probability: float) -> str:
+    """LOW / MODERATE / HIGH tier for an angina probability, UNSCORED when it is not finite"""
+    if not np.isfinite(probability):
+        return UNSCORED_TIER
+    if probability >= HIGH_RISK_THRESHOLD:
+        return "HIGH"
+    if probability >= MODERATE_RISK_THRESHOLD:
+        return "MODERATE"
+    return "LOW"
+
+
+def risk_tiers(probabilities: np.ndarray) -> np.ndarray:
+    """Vectorised risk_tier over an array of probabilities"""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    return np.where(~np.isfinite(probabilities), UNSCORED_TIER,
+                    np.where(probabilities >= HIGH_RISK_THRESHOLD, "HIGH",
+                             np.where(probabilities >= MODERATE_RISK_THRESHOLD, "MODERATE", "LOW")))
+
+
+def validate_patient(inputs: Dict) -> List[str]:
+    """List problems that make a patient unscorable (missing or non-numeric fields)"""
+    problems = []
+    for name in INPUT_FEATURES:
+        if name not in inputs:
+            problems.append(f"missing '{name}'")
+        elif name in NUMERIC_RANGES:
+            try:
+                value = float(inputs[name])
+            except (TypeError, ValueError):
+                problems.append(f"'{name}' is not numeric: {inputs[name]!r}")
+                continue
+            if not np.isfinite(value):
+                problems.append(f"'{name}' is not finite")
+    return problems
+
+
+def patient_key(inputs: Dict, fingerprint: str = '') -> str:
+    """Canonical content hash of the 40-field input vector.
+
+    Numerics are compared as floats and flags as booleans, so 51 and 51.0
+    (or 1 and True) address the same entry; keys outside the schema are ignored.
+    A model fingerprint, when given, is hashed in too, so results from
+    different models never share a key.
+    """
+    values = []
+    for name in INPUT_FEATURES:
+        value = inputs.get(name)
+        if value is None or (isinstance(value, float) and value != value):
+            value = None
+        elif name in BOOLEAN_FEATURES:
+            value = bool(value)
+        elif name in NUMERIC_RANGES:
+            value = float(value)
+        else:
+            value = str(value)
+        values.append(value)
+    payload = json.dumps(values, separators=(',', ':')).encode()
+    if fingerprint:
+        payload = fingerprint.encode() + b':' + payload
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class PredictionCache:
+    """Thread-safe LRU cache keyed on patient_key and the model fingerprint, with hit/miss counters"""
+
+    def __init__(self, maxsize: int = 4096, fingerprint: str = ''):
+        self.maxsize = maxsize
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, inputs: Dict, variant=None) -> str:
+        """Cache key for a patient under this cache's model, plus any hashable analysis options"""
+        key = patient_key(inputs, self.fingerprint)
+        return key if variant is None else f"{key}:{variant!r}"
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, inputs: Dict, compute: Callable[[Dict], object], variant=None):
+        """Return the cached result for inputs (and variant), computing and storing it on a miss"""
+        key = self.key(inputs, variant)
+        value = self.get(key)
+        if value is None:
+            value = compute(inputs)
+            self.put(key, value)
+        return value
+
+    def get_or_compute_many(self, patients: List[Dict], compute_many: Callable[[List[Dict]], List]) -> List:
+        """Cached results for many patients; all misses go through one compute_many call"""
+        keys = [self.key(p) for p in patients]
+        results = [self.get(key) for key in keys]
+        missing = {}
+        for i, (key, value) in enumerate(zip(keys, results)):
+            if value is None:
+                missing.setdefault(key, []).append(i)
+        if missing:
+            computed = compute_many([patients[rows[0]] for rows in missing.values()])
+            for (key, rows), value in zip(missing.items(), computed):
+                self.put(key, value)
+                for i in rows:
+                    results[i] = value
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class LatestWinsWorker:
+    """Runs fn on a shared executor, keeping only the newest submitted payload.
+
+    Submissions that arrive while a call is in flight overwrite each other,
+    so stale inputs are dropped and at most one call per worker runs at a time.
+    """
+
+    def __init__(self, executor, fn: Callable):
+        self._executor = executor
+        self._fn = fn
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._pending = None
+        self._running = False
+        self._result = None
+
+    def submit(self, payload) -> int:
+        """Queue payload, replacing any request not yet started; returns its sequence number"""
+        with self._lock:
+            self._submitted += 1
+            self._pending = (self._submitted, payload)
+            if not self._running:
+                self._running = True
+                self._executor.submit(self._drain)
+            return self._submitted
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                job, self._pending = self._pending, None
+                if job is None:
+                    self._running = False
+                    return
+            seq, payload = job
+            try:
+                value, error = self._fn(payload), None
+            except Exception as e:
+                logger.warning("Background scoring failed: %s", e)
+                value, error = None, e
+            with self._lock:
+                if self._result is None or seq > self._result[0]:
+                    self._result = (seq, value, error)
+
+    def resolve(self, value) -> int:
+        """Publish a value computed on the caller's thread as the newest result.
+
+        Any pending payload is dropped and in-flight calls can no longer overwrite it.
+        """
+        with self._lock:
+            self._submitted += 1
+            self._pending = None
+            self._result = (self._submitted, value, None)
+            return self._submitted
+
+    def latest(self):
+        """Most recent published result, or None before the first one lands or if that call failed"""
+        with self._lock:
+            return None if self._result is None else self._result[1]
+
+    def error(self) -> Optional[Exception]:
+        """Exception raised by the call behind the most recent published result, if it failed"""
+        with self._lock:
+            return None if self._result is None else self._result[2]
+
+    def is_current(self) -> bool:
+        """True when the published result belongs to the newest submission"""
+        with self._lock:
+            return self._result is not None and self._result[0] == self._submitted
+
+
+def _input_columns(pipeline) -> List[str]:
+    """Column order the pipeline was fitted on, falling back to the sidebar order.
+
+    PyCaret records the target alongside the features, so only schema fields are kept.
+    """
+    fitted = getattr(pipeline, 'feature_names_in_', None)
+    if fitted is None:
+        return list(INPUT_FEATURES)
+    return [name for name in fitted if name in INPUT_FEATURES]
+
+
+def _preprocess(pipeline, frame: pd.DataFrame) -> pd.DataFrame:
+    """Run every fitted pipeline step except the final estimator"""
+    X = frame
+    for _, step in pipeline.steps[:-1]:
+        X = step.transform(X)
+        if isinstance(X, tuple):
+            X = X[0]
+    return X
+
+
+def _final_booster(pipeline):
+    """Return the native booster of the pipeline's LightGBM estimator"""
+    estimator = pipeline.steps[-1][1]
+    booster = getattr(estimator, 'booster_', None)
+    if booster is None:
+        raise ValueError(f"Final estimator {type(estimator).__name__} has no fitted LightGBM booster")
+    return booster
+
+
+def _changed_columns(rows: np.ndarray, base: np.ndarray) -> np.ndarray:
+    """Indices of output columns that differ from base in any row (NaN-aware)"""
+    same = (rows == base) | (np.isnan(rows) & np.isnan(base))
+    return np.flatnonzero(~same.all(axis=0))
+
+
+def parity_samples(n_samples: int = 32, seed: int = 0) -> List[Dict]:
+    """Deterministic spread of patients across the sidebar ranges for parity checks"""
+    rng = np.random.default_rng(seed)
+    samples = [canonical_patient(REFERENCE_PATIENT)]
+    for _ in range(n_samples - 1):
+        patient = {}
+        for name, (low, high) in NUMERIC_RANGES.items():
+            value = rng.uniform(low, high)
+            patient[name] = int(round(value)) if isinstance(low, int) else round(float(value), 3)
+        for name, levels in CATEGORICAL_LEVELS.items():
+            patient[name] = levels[rng.integers(len(levels))]
+        for name in BOOLEAN_FEATURES:
+            patient[name] = bool(rng.integers(2))
+        samples.append(patient)
+    return samples
+
+
+def _as_float(values) -> np.ndarray:
+    """Column values as float64, with None and unparseable entries as NaN"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _as_model_float(values) -> np.ndarray:
+    """Numeric column values rounded through float32.
+
+    predict_model shrinks float64 columns to float32 before the pipeline runs
+    (the model was trained on the same shrunk data), so the fast path does too.
+    """
+    return _as_float(values).astype(np.float32).astype(np.float64)
+
+
+def _flag_codes(values) -> np.ndarray:
+    """Row index into a boolean table for each value: 1 for non-zero, 0 for zero, -1 for missing"""
+    flags = _as_float(values)
+    return np.where(np.isnan(flags), -1, flags != 0).astype(np.intp)
+
+
+def _level_codes(values, lookup: Dict) -> np.ndarray:
+    """Row index into a categorical table for each value (-1 = missing/unknown)"""
+    if isinstance(values, pd.Series):
+        return values.map(lookup).fillna(-1).to_numpy(dtype=np.intp)
+    return np.fromiter((lookup.get(v, -1) for v in values), dtype=np.intp, count=len(values))
+
+
+class FeatureEncoder:
+    """Schema-driven encoder from patient fields to model feature rows.
+
+    The PyCaret preprocessing steps are compiled once into per-field lookup
+    tables (categoricals and flags) and affine maps (numerics) by probing the
+    fitted pipeline. Every field writes into fixed model-column indices of a
+    preallocated matrix, so one patient dict, a list of dicts or a whole
+    DataFrame chunk go through the same encoding without building DataFrames.
+    """
+
+    def __init__(self, base_row: np.ndarray,
+                 numeric_specs: List[Tuple[str, int, float, float, float]],
+                 categorical_specs: List[Tuple[str, np.ndarray, Dict, np.ndarray]]):
+        self.base_row = base_row
+        self.numeric_specs = numeric_specs
+        self.categorical_specs = categorical_specs
+
+    @property
+    def n_features(self) -> int:
+        return len(self.base_row)
+
+    @property
+    def fields(self) -> List[str]:
+        """Input fields that feed at least one model column, in schema order"""
+        used = {spec[0] for spec in self.numeric_specs} | {spec[0] for spec in self.categorical_specs}
+        return [name for name in INPUT_FEATURES if name in used]
+
+    def unseen_levels(self) -> Dict[str, List]:
+        """Schema levels the model encodes exactly like a missing value (never seen in training)"""
+        unseen = {}
+        for name, cols, lookup, table in self.categorical_specs:
+            if name in BOOLEAN_FEATURES:
+                continue
+            levels = [level for level, i in lookup.items() if np.array_equal(table[i], table[-1])]
+            if levels:
+                unseen[name] = levels
+        return unseen
+
+    def field_matrix(self) -> np.ndarray:
+        """(n_features, n_fields) 0/1 matrix summing model columns back into input fields"""
+        index = {name: i for i, name in enumerate(self.fields)}
+        M = np.zeros((self.n_features, len(index)))
+        for name, col, *_ in self.numeric_specs:
+            M[col, index[name]] = 1.0
+        for name, cols, *_ in self.categorical_specs:
+            M[cols, index[name]] = 1.0
+        return M
+
+    @classmethod
+    def from_pipeline(cls, pipeline, n_features: int, reference: Optional[Dict] = None):
+        """Compile the fitted PyCaret preprocessing into NumPy encoder tables"""
+        reference = canonical_patient(reference or REFERENCE_PATIENT)
+
+        rows = [reference]
+        probes = {}
+        for name in NUMERIC_RANGES:
+            x0 = float(reference[name])
+            probes[name] = len(rows)
+            for value in (x0 + 1.0, x0 + 2.0, np.nan):
+                rows.append({**reference, name: value})
+        for name, levels in CATEGORICAL_LEVELS.items():
+            probes[name] = len(rows)
+            for value in levels + [None]:
+                rows.append({**reference, name: value})
+        for name in BOOLEAN_FEATURES:
+            probes[name] = len(rows)
+            for value in (False, True):
+                rows.append({**reference, name: value})
+
+        frame = pd.DataFrame(rows, columns=_input_columns(pipeline))
+        out = _preprocess(pipeline, frame).to_numpy(dtype=np.float64)
+        if out.shape[1] != n_features:
+            raise ValueError(f"Pipeline emits {out.shape[1]} columns but booster expects {n_features}")
+        base = out[0]
+
+        numeric_specs = []
+        for name in NUMERIC_RANGES:
+            start = probes[name]
+            x0 = float(reference[name])
+            plus_one, plus_two, missing = out[start], out[start + 1], out[start + 2]
+            cols = _changed_columns(np.vstack([plus_one, plus_two, missing]), base)
+            if len(cols) == 0:
+                continue
+            if len(cols) > 1:
+                raise ValueError(f"'{name}' feeds {len(cols)} model columns; only column-wise transforms are supported")
+            col = int(cols[0])
+            slope = plus_one[col] - base[col]
+            intercept = base[col] - slope * x0
+            if not np.isclose(plus_two[col], slope * (x0 + 2.0) + intercept, rtol=1e-9, atol=1e-9):
+                raise ValueError(f"'{name}' goes through a non-linear transform")
+            numeric_specs.append((name, col, float(slope), float(intercept), float(missing[col])))
+
+        categorical_specs = []
+        for name, levels in list(CATEGORICAL_LEVELS.items()) + [(b, [False, True]) for b in BOOLEAN_FEATURES]:
+            start = probes[name]
+            is_bool = name in BOOLEAN_FEATURES
+            block = out[start:start + len(levels) + (0 if is_bool else 1)]
+            if is_bool:
+                # Unknown booleans score as False, like an unticked sidebar box
+                block = np.vstack([block, block[0]])
+            cols = _changed_columns(block, base)
+            if len(cols) == 0:
+                continue
+            lookup = {level: i for i, level in enumerate(levels)}
+            categorical_specs.append((name, cols, lookup, block[:, cols].copy()))
+
+        return cls(base, numeric_specs, categorical_specs)
+
+    def encode(self, inputs: Dict) -> np.ndarray:
+        """Encode one patient dict into a (1, n_features) model row"""
+        row = self.base_row.copy()
+        for name, col, slope, intercept, fill in self.numeric_specs:
+            value = inputs.get(name)
+            row[col] = fill if value is None or value != value else slope * float(np.float32(value)) + intercept
+        for name, cols, lookup, table in self.categorical_specs:
+            value = inputs.get(name)
+            # Flags go through the same normaliser as encode_columns, so 'yes' or 2 encode identically
+            code = _flag_codes([value])[0] if name in BOOLEAN_FEATURES else lookup.get(value, -1)
+            row[cols] = table[code]
+        return row.reshape(1, -1)
+
+    def encode_columns(self, columns, n_rows: int) -> np.ndarray:
+        """Encode column-oriented input (field -> sequence of n_rows values).
+
+        Fields absent from columns are encoded as missing.
+        """
+        X = np.empty((n_rows, self.n_features), dtype=np.float64)
+        X[:] = self.base_row
+        for name, col, slope, intercept, fill in self.numeric_specs:
+            if name not in columns:
+                X[:, col] = fill
+                continue
+            values = _as_model_float(columns[name])
+            X[:, col] = np.where(np.isnan(values), fill, slope * values + intercept)
+        for name, cols, lookup, table in self.categorical_specs:
+            if name not in columns:
+                X[:, cols] = table[-1]
+                continue
+            if name in BOOLEAN_FEATURES:
+                codes = _flag_codes(columns[name])
+            else:
+                codes = _level_codes(columns[name], lookup)
+            X[:, cols] = table[codes]
+        return X
+
+    def encode_many(self, patients: List[Dict]) -> np.ndarray:
+        """Encode a list of patient dicts into an (n, n_features) matrix"""
+        names = [spec[0] for spec in self.numeric_specs] + [spec[0] for spec in self.categorical_specs]
+        columns = {name: [p.get(name) for p in patients] for name in names}
+        return self.encode_columns(columns, len(patients))
+
+    def encode_frame(self, frame: pd.DataFrame) -> np.ndarray:
+        """Encode a DataFrame whose columns are input fields"""
+        return self.encode_columns(frame, len(frame))
+
+    def to_spec(self) -> Tuple[Dict, np.ndarray]:
+        """JSON-serialisable encoder spec plus one flat array holding every table"""
+        arrays = [self.base_row]
+        offset = self.n_features
+        categorical = []
+        for name, cols, lookup, table in self.categorical_specs:
+            levels = sorted(lookup, key=lookup.get)
+            categorical.append({
+                'name': name,
+                'levels': levels,
+                'columns': [int(c) for c in cols],
+                'offset': offset,
+                'shape': list(table.shape)
+            })
+            arrays.append(table.ravel())
+            offset += table.size
+        spec = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'n_features': self.n_features,
+            'numeric': [list(entry) for entry in self.numeric_specs],
+            'categorical': categorical
+        }
+        return spec, np.concatenate(arrays)
+
+    @classmethod
+    def from_spec(cls, spec: Dict, values: np.ndarray):
+        """Rebuild an encoder from to_spec() output; values may be memory-mapped"""
+        if spec.get('format_version') != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported artifact format {spec.get('format_version')}")
+        numeric_specs = [(name, int(col), float(slope), float(intercept), float(fill))
+                         for name, col, slope, intercept, fill in spec['numeric']]
+        categorical_specs = []
+        for entry in spec['categorical']:
+            rows, width = entry['shape']
+            table = values[entry['offset']:entry['offset'] + rows * width].reshape(rows, width)
+            lookup = {level: i for i, level in enumerate(entry['levels'])}
+            categorical_specs.append((entry['name'], np.asarray(entry['columns'], dtype=np.intp), lookup, table))
+        return cls(values[:spec['n_features']], numeric_specs, categorical_specs)
+
+
+class FastRiskScorer:
+    """Scores patients directly against the fitted LightGBM booster via a FeatureEncoder"""
+
+    def __init__(self, booster, encoder: FeatureEncoder):
+        self.booster = booster
+        self.encoder = encoder
+        self.parity_error = None
+        self._field_matrix = None
+
+    @classmethod
+    def from_pipeline(cls, pipeline, reference: Optional[Dict] = None):
+        """Compile the pipeline's preprocessing and grab its final booster"""
+        booster = _final_booster(pipeline)
+        return cls(booster, FeatureEncoder.from_pipeline(pipeline, booster.num_feature(), reference))
+
+    def encode(self, inputs: Dict) -> np.ndarray:
+        return self.encoder.encode(inputs)
+
+    def predict_proba(self, inputs: Dict) -> float:
+        """Angina probability for a single patient"""
+        return self.predict_encoded(self.encoder.encode(inputs))
+
+    def predict_encoded(self, row: np.ndarray) -> float:
+        """Angina probability for a row already produced by encode()"""
+        return float(self.booster.predict(row, num_threads=1)[0])
+
+    def predict_matrix(self, X: np.ndarray) -> np.ndarray:
+        """Angina probabilities for an encoded (n, n_features) matrix"""
+        if len(X) == 0:
+            return np.empty(0)
+        return self.booster.predict(X)
+
+    def predict_proba_many(self, patients: List[Dict]) -> np.ndarray:
+        """Angina probabilities for a list of patient dicts"""
+        return self.predict_matrix(self.encoder.encode_many(patients))
+
+    def predict_frame(self, frame: pd.DataFrame) -> np.ndarray:
+        """Angina probabilities for every row of a DataFrame of input fields"""
+        return self.predict_matrix(self.encoder.encode_frame(frame))
+
+    def contributions_matrix(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact TreeSHAP contributions for an encoded matrix, summed per input field.
+
+        Returns (base, contributions) in log-odds: base has one entry per row and
+        contributions is (n, len(encoder.fields)); base + row sum is the raw score.
+        Model columns no input field reaches are constant, so they fold into base.
+        """
+        if self._field_matrix is None:
+            self._field_matrix = self.encoder.field_matrix()
+        raw = self.booster.predict(X, pred_contrib=True, num_threads=1 if len(X) == 1 else 0)
+        per_column, base = raw[:, :-1], raw[:, -1]
+        contributions = per_column @ self._field_matrix
+        return base + per_column.sum(axis=1) - contributions.sum(axis=1), contributions
+
+    def explain(self, inputs: Dict) -> Tuple[float, Dict[str, float]]:
+        """Base log-odds and per-field TreeSHAP contributions for one patient"""
+        base, contributions = self.contributions_matrix(self.encoder.encode(inputs))
+        return float(base[0]), dict(zip(self.encoder.fields, contributions[0].tolist()))
+
+    def explain_many(self, patients: List[Dict]) -> List[Tuple[float, Dict[str, float]]]:
+        """explain() for many patients in one vectorised booster call"""
+        if not patients:
+            return []
+        base, contributions = self.contributions_matrix(self.encoder.encode_many(patients))
+        fields = self.encoder.fields
+        return [(float(b), dict(zip(fields, row))) for b, row in zip(base.tolist(), contributions.tolist())]
+
+    def to_spec(self) -> Tuple[Dict, np.ndarray]:
+        spec, values = self.encoder.to_spec()
+        spec['parity_error'] = self.parity_error
+        return spec, values
+
+    @classmethod
+    def from_spec(cls, booster, spec: Dict, values: np.ndarray):
+        """Rebuild a scorer from to_spec() output; values may be memory-mapped"""
+        encoder = FeatureEncoder.from_spec(spec, values)
+        if booster.num_feature() != encoder.n_features:
+            raise ValueError(f"Encoder emits {encoder.n_features} columns but booster expects {booster.num_feature()}")
+        scorer = cls(booster, encoder)
+        scorer.parity_error = spec.get('parity_error')
+        return scorer
+
+    def check_parity(self, pipeline, samples: Optional[List[Dict]] = None) -> float:
+        """Largest absolute gap between this scorer and predict_model"""
+        samples = samples or parity_samples()
+        expected = predict_model_proba(pipeline, pd.DataFrame(samples, columns=_input_columns(pipeline)))
+        # Both the single-row and the vectorised encoder paths must agree with PyCaret
+        single = np.array([self.predict_proba(s) for s in samples])
+        batch = self.predict_proba_many(samples)
+        return float(max(np.max(np.abs(single - expected)), np.max(np.abs(batch - expected))))
+
+
+def _booster_feature_ranges(booster) -> List[Optional[Tuple[float, float]]]:
+    """Per model column (min, max) seen in training, from the booster's feature_infos"""
+    for line in booster.model_to_string(num_iteration=1).splitlines():
+        if line.startswith('feature_infos='):
+            ranges = []
+            for info in line[len('feature_infos='):].split():
+                if info.startswith('[') and info.endswith(']'):
+                    low, high = info[1:-1].split(':')
+                    ranges.append((float(low), float(high)))
+                else:
+                    ranges.append(None)
+            return ranges
+    return [None] * booster.num_feature()
+
+
+def _per_field(scorer: FastRiskScorer, column_values: np.ndarray) -> Dict[str, float]:
+    totals = np.asarray(column_values, dtype=np.float64) @ scorer.encoder.field_matrix()
+    return dict(zip(scorer.encoder.fields, totals.tolist()))
+
+
+def model_fingerprint(model) -> str:
+    """Short content hash of a fitted model (booster text and encoder tables, else the pickled pipeline)"""
+    if model is None:
+        return ''
+    digest = hashlib.blake2b(digest_size=8)
+    if isinstance(model, FastRiskScorer):
+        spec, values = model.encoder.to_spec()
+        digest.update(model.booster.model_to_string().encode())
+        digest.update(json.dumps(spec, sort_keys=True, default=str).encode())
+        digest.update(np.ascontiguousarray(values).tobytes())
+    else:
+        digest.update(pickle.dumps(model))
+    return digest.hexdigest()
+
+
+def model_metadata(scorer: Optional[FastRiskScorer], model=None) -> Dict:
+    """Everything the UI needs to know about the model, computed once at load.
+
+    Feature order, slider ranges and categorical vocabularies always come from
+    the schema, and the fingerprint identifies the model (the fast scorer when
+    there is one, else the pipeline) for cache keys. With the native booster
+    available this adds global gain/split importance and training value ranges
+    per input field, plus any schema levels the model never saw.
+    """
+    metadata = {
+        'fingerprint': model_fingerprint(scorer if scorer is not None else model),
+        'features': list(INPUT_FEATURES),
+        'numeric_ranges': dict(NUMERIC_RANGES),
+        'categorical_levels': {name: list(levels) for name, levels in CATEGORICAL_LEVELS.items()},
+        'boolean_features': list(BOOLEAN_FEATURES),
+        'model_columns': None,
+        'num_trees': None,
+        'gain_importance': {},
+        'split_importance': {},
+        'training_ranges': {},
+        'unseen_levels': {}
+    }
+    if scorer is None:
+        return metadata
+
+    booster = scorer.booster
+    gain = _per_field(scorer, booster.feature_importance(importance_type='gain'))
+    total_gain = sum(gain.values()) or 1.0
+    ranges = _booster_feature_ranges(booster)
+    training_ranges = {}
+    for name, col, slope, intercept, _ in scorer.encoder.numeric_specs:
+        if ranges[col] is not None and slope != 0:
+            ends = sorted((bound - intercept) / slope for bound in ranges[col])
+            training_ranges[name] = (ends[0], ends[1])
+
+    metadata.update({
+        'model_columns': booster.feature_name(),
+        'num_trees': booster.num_trees(),
+        'gain_importance': {name: value / total_gain for name, value in
+                            sorted(gain.items(), key=lambda item: item[1], reverse=True)},
+        'split_importance': _per_field(scorer, booster.feature_importance(importance_type='split')),
+        'training_ranges': training_ranges,
+        'unseen_levels': scorer.encoder.unseen_levels()
+    })
+    return metadata
+
+
+def training_range_warnings(inputs: Dict, metadata: Dict) -> List[str]:
+    """Inputs outside the values the model was trained on (scorable, but extrapolated)"""
+    warnings = []
+    for name, (low, high) in metadata['training_ranges'].items():
+        value = inputs.get(name)
+        if value is not None and not low <= float(value) <= high:
+            warnings.append(f"'{name}' = {value} is outside the training range {low:g}–{high:g}")
+    for name, levels in metadata['unseen_levels'].items():
+        if inputs.get(name) in levels:
+            warnings.append(f"'{name}' = {inputs[name]!r} never appeared in the training data")
+    return warnings
+
+
+def predict_model_proba(pipeline, frame: pd.DataFrame) -> np.ndarray:
+    """Angina probabilities from PyCaret predict_model (the reference path)"""
+    from pycaret.classification import predict_model
+
+    result = predict_model(pipeline, data=frame, verbose=False)
+    scores = result['prediction_score'].to_numpy(dtype=np.float64)
+    return np.where(result['prediction_label'].to_numpy() == 1, scores, 1 - scores)
+
+
+def score_patients(model, scorer: Optional[FastRiskScorer], patients: List[Dict]) -> np.ndarray:
+    """Angina probabilities for patient dicts via the fast path, else predict_model"""
+    if scorer is not None:
+        return scorer.predict_proba_many(patients)
+    return predict_model_proba(model, pd.DataFrame(patients, columns=_input_columns(model)))
+
+
+def score_frame(model, scorer: Optional[FastRiskScorer], frame: pd.DataFrame) -> np.ndarray:
+    """Angina probabilities for a DataFrame of input fields via the fast path, else predict_model"""
+    if scorer is not None:
+        return scorer.predict_frame(frame)
+    return predict_model_proba(model, frame)
+
+
+def build_fast_scorer(pipeline, reference: Optional[Dict] = None) -> Optional[FastRiskScorer]:
+    """Compile the fast path and keep it only if it matches predict_model"""
+    try:
+        scorer = FastRiskScorer.from_pipeline(pipeline, reference)
+        scorer.parity_error = scorer.check_parity(pipeline)
+    except Exception as e:
+        logger.warning("Fast LightGBM path unavailable, using predict_model: %s", e)
+        return None
+    if scorer.parity_error > PARITY_TOLERANCE:
+        logger.warning("Fast LightGBM path disabled: parity error %.2e exceeds %.0e",
+                       scorer.parity_error, PARITY_TOLERANCE)
+        return None
+    return scorer
+
+
+def export_artifact(pipeline, directory: str = ARTIFACT_DIR) -> FastRiskScorer:
+    """Write the booster (LightGBM text format) and encoder spec for fast cold starts"""
+    scorer = build_fast_scorer(pipeline)
+    if scorer is None:
+        raise ValueError("Pipeline cannot be compiled to the native fast path; see the log for details")
+    os.makedirs(directory, exist_ok=True)
+    spec, values = scorer.to_spec()
+    scorer.booster.save_model(os.path.join(directory, 'booster.txt'))
+    np.save(os.path.join(directory, 'encoder.npy'), values)
+    with open(os.path.join(directory, 'encoder.json'), 'w') as f:
+        json.dump(spec, f, indent=2)
+    return scorer
+
+
+def artifact_exists(directory: str = ARTIFACT_DIR) -> bool:
+    return all(os.path.exists(os.path.join(directory, name))
+               for name in ('booster.txt', 'encoder.json', 'encoder.npy'))
+
+
+def load_artifact(directory: str = ARTIFACT_DIR) -> FastRiskScorer:
+    """Load an exported artifact without importing PyCaret.
+
+    The encoder tables are memory-mapped; the booster is parsed by LightGBM's
+    native model-file reader, so no copy of the model text lives in Python.
+    """
+    import lightgbm as lgb
+
+    with open(os.path.join(directory, 'encoder.json')) as f:
+        spec = json.load(f)
+    values = np.load(os.path.join(directory, 'encoder.npy'), mmap_mode='r')
+    booster = lgb.Booster(model_file=os.path.join(directory, 'booster.txt'))
+    return FastRiskScorer.from_spec(booster, spec, values)
+
+
+def load_scoring_model(model_name: str = MODEL_NAME, directory: Optional[str] = None):
+    """Return (model, fast_scorer), preferring the compiled artifact over the pickle"""
+    directory = directory or model_name + '_compiled'
+    if artifact_exists(directory):
+        try:
+            scorer = load_artifact(directory)
+            return scorer, scorer
+        except Exception as e:
+            logger.warning("Compiled artifact unusable, loading the PyCaret pickle: %s", e)
+    from pycaret.classification import load_model
+
+    model = load_model(model_name, verbose=False)
+    return model, build_fast_scorer(model)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CardioPredict fast-path model tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help="Compile the PyCaret pipeline into a fast-loading artifact")
+    export.add_argument('--model', default=MODEL_NAME, help="PyCaret model name (without .pkl)")
+    export.add_argument('--output', help="Artifact directory (default: <model>_compiled)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        from pycaret.classification import load_model
+
+        output = args.output or args.model + '_compiled'
+        scorer = export_artifact(load_model(args.model, verbose=False), output)
+        print(f"Wrote {output}/ (parity error vs predict_model: {scorer.parity_error:.2e})")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
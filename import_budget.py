@@ -0,0 +1,86 @@
+# import_budget.py
+"""Cold-start import budget for the Streamlit app.
+
+Imports predict_angina_app in fresh interpreters (bare Streamlit mode, so
+main() does not run) and exits non-zero if the median import time exceeds
+the budget or if the app itself pulls in a dependency that should only be
+loaded by the feature that needs it.
+
+Usage:
+    python import_budget.py --budget 3.0 --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+APP_MODULE = 'predict_angina_app'
+
+# Loaded by Streamlit/Plotly themselves; only what the app adds on top is checked
+FRAMEWORK_MODULES = ('streamlit', 'plotly.graph_objects', 'plotly.express', 'pandas', 'numpy')
+
+# Heavy optional dependencies that must stay out of the render path
+DEFERRED_MODULES = ('speech_recognition', 'pyttsx3', 'seaborn', 'matplotlib', 'scipy',
+                    'PIL', 'pycaret', 'sklearn', 'lightgbm', 'joblib')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {framework!r}:
+    __import__(name)
+framework_seconds = time.perf_counter() - start
+baseline = set(sys.modules)
+import {app}
+total_seconds = time.perf_counter() - start
+added = sorted(m for m in set(sys.modules) - baseline if m.split('.')[0] in {deferred!r})
+print(json.dumps({{'total': total_seconds, 'framework': framework_seconds, 'deferred': added}}))
+"""
+
+
+def measure_import(app_dir: str) -> Dict:
+    """Import the app once in a fresh interpreter and report timings and deferred modules"""
+    code = _PROBE.format(framework=FRAMEWORK_MODULES, app=APP_MODULE, deferred=DEFERRED_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], cwd=app_dir, capture_output=True,
+                            text=True, env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'})
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {APP_MODULE} failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check_budget(budget: float, runs: int = 3, app_dir: str = None) -> List[str]:
+    """Problems found across the runs (empty when within budget)"""
+    app_dir = app_dir or os.path.dirname(os.path.abspath(__file__))
+    samples = [measure_import(app_dir) for _ in range(runs)]
+    total = statistics.median(s['total'] for s in samples)
+    framework = statistics.median(s['framework'] for s in samples)
+    print(f"{APP_MODULE} import: {total:.2f}s median over {runs} run(s) "
+          f"({framework:.2f}s Streamlit/Plotly, {total - framework:.2f}s app)")
+
+    problems = []
+    if total > budget:
+        problems.append(f"import took {total:.2f}s, over the {budget:.2f}s budget")
+    deferred = sorted({m.split('.')[0] for s in samples for m in s['deferred']})
+    if deferred:
+        problems.append(f"heavy modules imported at start-up: {', '.join(deferred)}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail if the app's cold-start import regresses")
+    parser.add_argument('--budget', type=float, default=3.0, help="Maximum median import time in seconds")
+    parser.add_argument('--runs', type=int, default=3, help="Fresh interpreters to time")
+    args = parser.parse_args(argv)
+
+    if args.runs < 1:
+        parser.error("--runs must be positive")
+    problems = check_budget(args.budget, args.runs)
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# inference_server.py
+"""Local inference server with cross-session micro-batching.
+
+Requests from every Streamlit session arrive on a Unix socket as
+newline-delimited JSON ({"inputs": {...}} -> {"probability": p}). A single
+batcher thread gathers concurrent requests for up to --max-wait-ms or
+--max-batch-size rows and scores them in one vectorised model call.
+
+Usage:
+    python inference_server.py --socket /tmp/cardiopredict.sock
+    CARDIOPREDICT_INFERENCE_SOCKET=/tmp/cardiopredict.sock streamlit run predict_angina_app.py
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from typing import Callable, Dict, List
+
+from fast_inference import MODEL_NAME, load_scoring_model, score_patients
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = '/tmp/cardiopredict.sock'
+
+
+class _PendingRequest:
+    __slots__ = ('inputs', 'event', 'result', 'error')
+
+    def __init__(self, inputs: Dict):
+        self.inputs = inputs
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Collects concurrent single-patient requests into batched model calls"""
+
+    def __init__(self, score_batch: Callable[[List[Dict]], List[float]],
+                 max_batch_size: int = 64, max_wait: float = 0.002):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, inputs: Dict, timeout: float = 10.0) -> float:
+        """Block until the batch containing inputs has been scored"""
+        pending = _PendingRequest(inputs)
+        self._queue.put(pending)
+        if not pending.event.wait(timeout):
+            raise TimeoutError("Inference batch did not complete in time")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self) -> List[_PendingRequest]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                probabilities = self.score_batch([p.inputs for p in batch])
+                if len(probabilities) != len(batch):
+                    raise RuntimeError(f"Scorer returned {len(probabilities)} probabilities for {len(batch)} requests")
+                for pending, probability in zip(batch, probabilities):
+                    pending.result = float(probability)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            self.batches += 1
+            self.requests += len(batch)
+            for pending in batch:
+                pending.event.set()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = {'probability': self.server.batcher.submit(request['inputs'])}
+            except Exception as e:
+                response = {'error': str(e)}
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded Unix-socket server feeding one shared MicroBatcher"""
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, batcher: MicroBatcher):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.batcher = batcher
+        super().__init__(socket_path, _RequestHandler)
+
+
+class InferenceClient:
+    """Thread-safe client; each calling thread keeps its own persistent connection"""
+
+    def __init__(self, socket_path: str, timeout: float = 2.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                self._local.reader.close()
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def predict_proba(self, inputs: Dict) -> float:
+        """Angina probability for one patient, scored by the server"""
+        payload = (json.dumps({'inputs': inputs}, default=_json_default) + '\n').encode()
+        for attempt in range(2):
+            try:
+                if getattr(self._local, 'sock', None) is None:
+                    self._connect()
+                self._local.sock.sendall(payload)
+                line = self._local.reader.readline()
+                if not line:
+                    raise ConnectionError("Inference server closed the connection")
+                break
+            except OSError:
+                # Stale connection (e.g. server restarted): reconnect once
+                self._close()
+                if attempt:
+                    raise
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(f"Inference server error: {response['error']}")
+        return float(response['probability'])
+
+
+def _json_default(value):
+    """Serialise NumPy scalars coming from widget values or DataFrames"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CardioPredict local inference server")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument('--model', default=MODEL_NAME, help="PyCaret model name (without .pkl)")
+    parser.add_argument('--max-batch-size', type=int, default=64, help="Largest micro-batch")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help="Longest a request waits for its batch to fill")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    model, scorer = load_scoring_model(args.model)
+    batcher = MicroBatcher(lambda patients: score_patients(model, scorer, patients),
+                           max_batch_size=args.max_batch_size, max_wait=args.max_wait_ms / 1000)
+    with InferenceServer(args.socket, batcher) as server:
+        logger.info("Serving %s on %s (%s)", args.model, args.socket,
+                    'native LightGBM fast path' if scorer else 'PyCaret predict_model')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            logger.info("Served %d requests in %d batches", batcher.requests, batcher.batches)
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# population_index.py
+"""Reference-population percentile index built offline from a cohort file.
+
+Every numeric input is stored as one sorted float32 array, all concatenated
+into a single memory-mapped file next to a small JSON header. The predicted
+angina probability (taken from a batch_score.py output, or scored here with
+--score) is stored the same way for the whole cohort and for each sex, ethnic
+group and age band. Looking up a patient's exact percentile is then a binary
+search (np.searchsorted) over pages the OS maps in on demand, independent of
+cohort size.
+
+Usage:
+    python population_index.py build cohort.parquet --output population_index --score
+    python population_index.py query population_index --feature age --value 63
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from batch_score import iter_chunks
+from fast_inference import MODEL_NAME, NUMERIC_RANGES, load_scoring_model, model_metadata, score_frame
+
+INDEX_DIR = 'population_index'
+INDEX_FORMAT_VERSION = 1
+RISK_COLUMN = 'angina_probability'
+INDEXED_COLUMNS = list(NUMERIC_RANGES) + [RISK_COLUMN]
+
+_HEADER = 'index.json'
+_VALUES = 'values.f32'
+
+ScoreFrame = Callable[[pd.DataFrame], np.ndarray]
+
+
+AGE_BAND_EDGES = [40, 50, 60, 70, 80]
+RISK_GROUPS = ('sex', 'ethnic', 'age_band')
+MIN_GROUP_SIZE = 30
+
+
+def age_bands(ages) -> np.ndarray:
+    """Decade age-band labels ('<40', '40-49', ..., '80+') for an array of ages"""
+    labels = np.array([f"<{AGE_BAND_EDGES[0]}"]
+                      + [f"{lo}-{hi - 1}" for lo, hi in zip(AGE_BAND_EDGES, AGE_BAND_EDGES[1:])]
+                      + [f"{AGE_BAND_EDGES[-1]}+"])
+    return labels[np.digitize(np.asarray(ages, dtype=float), AGE_BAND_EDGES)]
+
+
+def _group_columns(chunk: pd.DataFrame) -> Dict[str, pd.Series]:
+    groups = {name: chunk[name] for name in ('sex', 'ethnic') if name in chunk}
+    if 'age' in chunk:
+        groups['age_band'] = pd.Series(age_bands(chunk['age']), index=chunk.index).where(chunk['age'].notna())
+    return groups
+
+
+def _chunk_arrays(chunk: pd.DataFrame, columns: Sequence[str]) -> Iterator[Tuple[Tuple, np.ndarray]]:
+    """(array key, values) pairs for one chunk: each indexed column, then risk per group level"""
+    for name in columns:
+        if name in chunk:
+            yield (name,), chunk[name].to_numpy(dtype=np.float32, na_value=np.nan)
+    if RISK_COLUMN not in chunk:
+        return
+    risk = chunk[RISK_COLUMN].to_numpy(dtype=np.float32, na_value=np.nan)
+    for group, labels in _group_columns(chunk).items():
+        for level, rows in labels.groupby(labels, sort=False).indices.items():
+            yield (RISK_COLUMN, group, str(level)), risk[rows]
+
+
+def build_index(input_path: str, directory: str = INDEX_DIR, chunk_size: int = 200000,
+                columns: Sequence[str] = INDEXED_COLUMNS, score: Optional[ScoreFrame] = None,
+                model_fingerprint: Optional[str] = None) -> Dict:
+    """Stream a CSV/Parquet cohort into a sorted, memory-mappable per-feature index.
+
+    Values are appended to one scratch file per array while streaming, then
+    each file is sorted in place through a writable memmap and copied into the
+    final values file, so only one array is ever resident at a time. Cohorts
+    without an angina_probability column are scored chunk by chunk with
+    score when it is given. model_fingerprint (fast_inference.model_metadata)
+    names the model behind score and is recorded in the header only if score
+    produced the risks, so the app can tell when they are stale; risks read
+    from the cohort file leave it None.
+    """
+    os.makedirs(directory, exist_ok=True)
+    scratch = {}
+    counts = {}
+    scored = False
+    try:
+        for chunk in iter_chunks(input_path, chunk_size):
+            if RISK_COLUMN not in chunk and score is not None:
+                chunk[RISK_COLUMN] = score(chunk)
+                scored = True
+            for key, values in _chunk_arrays(chunk, columns):
+                values = values[~np.isnan(values)]
+                if key not in scratch:
+                    scratch[key] = open(os.path.join(directory, f"{len(scratch)}.tmp"), 'wb')
+                    counts[key] = 0
+                values.tofile(scratch[key])
+                counts[key] += len(values)
+    finally:
+        for f in scratch.values():
+            f.close()
+
+    features = {}
+    risk_groups = {}
+    offset = 0
+    with open(os.path.join(directory, _VALUES), 'wb') as out:
+        for i, key in enumerate(scratch):
+            path = os.path.join(directory, f"{i}.tmp")
+            if counts[key]:
+                values = np.memmap(path, dtype=np.float32, mode='r+', shape=(counts[key],))
+                values.sort()
+                values.flush()
+                out.write(memoryview(values))
+                del values
+                entry = {'offset': offset, 'count': counts[key]}
+                offset += counts[key]
+                if len(key) == 1:
+                    features[key[0]] = entry
+                else:
+                    risk_groups.setdefault(key[1], {})[key[2]] = entry
+            os.remove(path)
+
+    header = {
+        'format_version': INDEX_FORMAT_VERSION,
+        'source': os.path.basename(input_path),
+        'dtype': 'float32',
+        'model_fingerprint': model_fingerprint if scored else None,
+        'features': {name: features[name] for name in columns if name in features},
+        'risk_groups': {group: dict(sorted(risk_groups[group].items())) for group in RISK_GROUPS if group in risk_groups}
+    }
+    with open(os.path.join(directory, _HEADER), 'w') as f:
+        json.dump(header, f, indent=2)
+    return header
+
+
+def index_exists(directory: str = INDEX_DIR) -> bool:
+    return os.path.exists(os.path.join(directory, _HEADER)) and os.path.exists(os.path.join(directory, _VALUES))
+
+
+class PopulationIndex:
+    """Read-only percentile lookups over a memory-mapped sorted index"""
+
+    def __init__(self, header: Dict, values: np.ndarray):
+        if header.get('format_version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported population index format {header.get('format_version')}")
+        self.header = header
+        self._arrays = {
+            name: values[entry['offset']:entry['offset'] + entry['count']]
+            for name, entry in header['features'].items()
+        }
+        self._risk_groups = {
+            group: {level: values[entry['offset']:entry['offset'] + entry['count']] for level, entry in levels.items()}
+            for group, levels in header.get('risk_groups', {}).items()
+        }
+
+    @classmethod
+    def load(cls, directory: str = INDEX_DIR):
+        with open(os.path.join(directory, _HEADER)) as f:
+            header = json.load(f)
+        values = np.memmap(os.path.join(directory, _VALUES), dtype=np.float32, mode='r')
+        return cls(header, values)
+
+    @property
+    def features(self) -> List[str]:
+        return list(self._arrays)
+
+    def count(self, name: str) -> int:
+        return len(self._arrays[name])
+
+    def percentile(self, name: str, values) -> np.ndarray:
+        """Mid-rank percentile (0-100) of each value within the population for one feature"""
+        array = self._arrays[name]
+        values = np.asarray(values, dtype=np.float32)
+        below = np.searchsorted(array, values, side='left')
+        at_or_below = np.searchsorted(array, values, side='right')
+        return 100.0 * (below + at_or_below) / (2.0 * len(array))
+
+    def patient_percentiles(self, inputs: Dict, features: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """Percentile of every indexed input field for one patient"""
+        names = [name for name in (features or self.features) if name in self._arrays and name in inputs]
+        return {name: float(self.percentile(name, inputs[name])) for name in names}
+
+    @property
+    def has_risk(self) -> bool:
+        return RISK_COLUMN in self._arrays
+
+    @property
+    def model_fingerprint(self) -> Optional[str]:
+        """Fingerprint of the model that scored the risk arrays, None when it was not recorded"""
+        return self.header.get('model_fingerprint')
+
+    def risk_matches(self, fingerprint: str) -> Optional[bool]:
+        """Whether the risk arrays came from the model with this fingerprint (None when unknown)"""
+        if self.model_fingerprint is None:
+            return None
+        return self.model_fingerprint == fingerprint
+
+    def risk_percentiles(self, inputs: Dict, probability: float) -> List[Tuple[str, str, float, int]]:
+        """(group, level, % of that cohort group with lower predicted risk, group size) for this patient
+
+        The whole cohort comes first, then the patient's own sex, ethnic group
+        and age band; groups smaller than MIN_GROUP_SIZE are left out.
+        """
+        if not self.has_risk:
+            return []
+        levels = {'sex': inputs.get('sex'), 'ethnic': inputs.get('ethnic')}
+        if inputs.get('age') is not None:
+            levels['age_band'] = str(age_bands([inputs['age']])[0])
+        candidates = [('overall', 'All patients', self._arrays[RISK_COLUMN])]
+        candidates += [(group, str(levels[group]), self._risk_groups[group][str(levels[group])])
+                       for group in RISK_GROUPS
+                       if group in self._risk_groups and str(levels.get(group)) in self._risk_groups[group]]
+        value = np.float32(probability)
+        return [(group, level, 100.0 * np.searchsorted(array, value, side='left') / len(array), len(array))
+                for group, level, array in candidates if len(array) >= MIN_GROUP_SIZE]
+
+    def quantiles(self, name: str, q: Sequence[float]) -> np.ndarray:
+        """Population values at quantiles q (0-1), read straight off the sorted array"""
+        array = self._arrays[name]
+        positions = np.clip(np.round(np.asarray(q) * (len(array) - 1)).astype(np.intp), 0, len(array) - 1)
+        return np.asarray(array[positions], dtype=np.float64)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the reference-population percentile index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Index a CSV/Parquet cohort")
+    build.add_argument('input', help="Cohort file (.csv or .parquet), optionally scored by batch_score.py")
+    build.add_argument('--output', default=INDEX_DIR, help="Index directory")
+    build.add_argument('--chunk-size', type=int, default=200000, help="Rows per streamed chunk")
+    build.add_argument('--score', action='store_true',
+                       help=f"Score the cohort with the model when it has no {RISK_COLUMN} column")
+    build.add_argument('--model', default=MODEL_NAME, help="PyCaret model name (without .pkl) used by --score")
+    query = subparsers.add_parser('query', help="Percentile of a value")
+    query.add_argument('directory', nargs='?', default=INDEX_DIR)
+    query.add_argument('--feature', required=True)
+    query.add_argument('--value', type=float, required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        score = fingerprint = None
+        if args.score:
+            model, scorer = load_scoring_model(args.model)
+            score = lambda chunk: score_frame(model, scorer, chunk)
+            fingerprint = model_metadata(scorer, model)['fingerprint']
+        header = build_index(args.input, args.output, args.chunk_size, score=score, model_fingerprint=fingerprint)
+        rows = max((entry['count'] for entry in header['features'].values()), default=0)
+        print(f"Indexed {len(header['features'])} features over {rows:,} rows into {args.output}/ "
+              f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    else:
+        index = PopulationIndex.load(args.directory)
+        print(f"{args.feature} = {args.value:g}: {float(index.percentile(args.feature, args.value)):.1f}th percentile "
+              f"of {index.count(args.feature):,}")
+
+
+if __name__ == "__main__":
+    main()
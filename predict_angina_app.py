@@ -2,26 +2,40 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from PIL import Image
-from pycaret.classification import load_model, predict_model
 import plotly.graph_objects as go
 import plotly.express as px
+from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import time
 import json
 import hashlib
+import atexit
 import base64
+import logging
+import os
 from typing import Dict, List, Tuple, Optional
-import speech_recognition as sr
-import pyttsx3
 from streamlit_lottie import st_lottie
-import requests
-import seaborn as sns
-import matplotlib.pyplot as plt
-from scipy import stats
+from inference_server import InferenceClient
+from fast_inference import (ARTIFACT_DIR, INPUT_FEATURES, MODEL_NAME, MODERATE_RISK_THRESHOLD, NUMERIC_RANGES, REFERENCE_PATIENT, FastRiskScorer, LatestWinsWorker,
+                            PredictionCache, artifact_exists, build_fast_scorer, load_artifact, patient_key, risk_tier,
+                            model_metadata, score_frame, score_patients, training_range_warnings, validate_patient)
+from scenarios import (ALL_INTERVENTIONS, best_combination, curve_span, curve_value, lifestyle_grid, medication_grid,
+                       confidence_interval, counterfactual_search, risk_trajectory, sensitivity_curves,
+                       single_intervention_deltas, sobol_indices, ScoringPool)
+from population_index import PopulationIndex, index_exists
+from similar_patients import OUTCOME_COLUMN, RISK_COLUMN, SimilarPatientIndex
+from cohort_analytics import TIERS, CohortAggregate, cohort_row_count, stream_cohort
+from drift_monitor import MIN_REPORT_SAMPLES, DriftMonitor, InputSketch, shared_bins
 import warnings
 warnings.filterwarnings('ignore')
 
+logger = logging.getLogger(__name__)
+
+# Optional local inference server (see inference_server.py)
+INFERENCE_SOCKET = os.environ.get('CARDIOPREDICT_INFERENCE_SOCKET')
+
 # Page configuration with custom theme
 st.set_page_config(
     page_title="CardioPredict AI Pro",
@@ -525,23 +539,86 @@ def get_theme_css():
 
 st.markdown(get_theme_css(), unsafe_allow_html=True)
 
-# Load Lottie animations
-def load_lottie_url(url: str):
-    r = requests.get(url)
-    if r.status_code != 200:
+# Lottie animations: bundled with the app, optionally refreshed from the CDN in the background
+LOTTIE_URLS = {
+    'heart': "https://assets5.lottiefiles.com/packages/lf20_zpjfsp1e.json",
+    'loading': "https://assets5.lottiefiles.com/packages/lf20_x62chJ.json",
+}
+LOTTIE_BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'lottie')
+LOTTIE_CACHE_DIR = os.environ.get('CARDIOPREDICT_LOTTIE_CACHE',
+                                  os.path.join(os.path.expanduser('~'), '.cache', 'cardiopredict', 'lottie'))
+LOTTIE_FETCH_ENABLED = os.environ.get('CARDIOPREDICT_FETCH_LOTTIE') == '1'
+LOTTIE_FETCH_TIMEOUT = 3.0
+
+def _read_lottie_file(path: str) -> Optional[Dict]:
+    """Parse a Lottie JSON file, returning None if it is missing or not an animation"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            animation = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return animation if isinstance(animation, dict) and 'layers' in animation else None
+
+def fetch_lottie_url(name: str, url: str) -> bool:
+    """Download a Lottie animation into the disk cache (never called on the render path)"""
+    import requests
+
+    try:
+        r = requests.get(url, timeout=LOTTIE_FETCH_TIMEOUT)
+        r.raise_for_status()
+        animation = r.json()
+    except Exception as e:
+        logger.info("Lottie fetch for %s skipped: %s", name, e)
+        return False
+    if not isinstance(animation, dict) or 'layers' not in animation:
+        return False
+
+    os.makedirs(LOTTIE_CACHE_DIR, exist_ok=True)
+    path = os.path.join(LOTTIE_CACHE_DIR, f"{name}.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(animation, f)
+    os.replace(tmp_path, path)
+    load_lottie_asset.clear()
+    return True
+
+@st.cache_resource
+def start_lottie_refresh():
+    """Fetch uncached CDN animations once per server process, off the render path"""
+    if not LOTTIE_FETCH_ENABLED:
         return None
-    return r.json()
+    missing = {name: url for name, url in LOTTIE_URLS.items()
+               if not os.path.exists(os.path.join(LOTTIE_CACHE_DIR, f"{name}.json"))}
+    if not missing:
+        return None
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lottie-fetch")
+    for name, url in missing.items():
+        executor.submit(fetch_lottie_url, name, url)
+    executor.shutdown(wait=False)
+    return executor
 
-# Lottie animations
-lottie_heart = load_lottie_url("https://assets5.lottiefiles.com/packages/lf20_zpjfsp1e.json")
-lottie_loading = load_lottie_url("https://assets5.lottiefiles.com/packages/lf20_x62chJ.json")
+@st.cache_resource
+def load_lottie_asset(name: str) -> Optional[Dict]:
+    """Load a Lottie animation from the disk cache, else the bundled copy"""
+    for directory in (LOTTIE_CACHE_DIR, LOTTIE_BUNDLE_DIR):
+        animation = _read_lottie_file(os.path.join(directory, f"{name}.json"))
+        if animation is not None:
+            return animation
+    return None
 
 # Enhanced Functions
 @st.cache_resource
 def load_pycaret_model():
-    """Load the PyCaret model with enhanced error handling"""
+    """Load the compiled model artifact if exported, else the PyCaret model, with enhanced error handling"""
+    if artifact_exists(ARTIFACT_DIR):
+        try:
+            return load_artifact(ARTIFACT_DIR)
+        except Exception as e:
+            st.warning(f"⚠️ Compiled model artifact could not be loaded ({str(e)}); falling back to the PyCaret model.")
+    
     try:
-        model = load_model('All_Variables_Model_LightGBM')
+        from pycaret.classification import load_model
+        model = load_model(MODEL_NAME)
         return model
     except FileNotFoundError:
         st.error("🚨 Model file 'All_Variables_Model_LightGBM.pkl' not found. Please ensure it's in the same directory.")
@@ -550,6 +627,193 @@ def load_pycaret_model():
         st.error(f"🚨 Error loading model: {str(e)}")
         return None
 
+@st.cache_resource
+def load_fast_scorer(_model):
+    """Compile the native LightGBM fast path once per loaded model"""
+    if _model is None:
+        return None
+    if isinstance(_model, FastRiskScorer):
+        return _model
+    return build_fast_scorer(_model)
+
+@st.cache_resource
+def load_model_metadata(_model):
+    """Feature order, vocabularies, ranges and global importance, extracted once per loaded model"""
+    return model_metadata(load_fast_scorer(_model), _model)
+
+def current_model_fingerprint():
+    """Fingerprint of the loaded model, hashed into every cache key"""
+    return load_model_metadata(load_pycaret_model())['fingerprint']
+
+POPULATION_INDEX_DIR = os.environ.get('CARDIOPREDICT_POPULATION_INDEX',
+                                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'population_index'))
+
+@st.cache_resource
+def load_population_index():
+    """Memory-mapped reference-population percentile index, or None if none has been built"""
+    if not index_exists(POPULATION_INDEX_DIR):
+        return None
+    try:
+        return PopulationIndex.load(POPULATION_INDEX_DIR)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not load population index %s: %s", POPULATION_INDEX_DIR, e)
+        return None
+
+SIMILAR_PATIENTS_PATH = os.environ.get('CARDIOPREDICT_SIMILAR_PATIENTS',
+                                       os.path.join(os.path.dirname(os.path.abspath(__file__)), 'similar_patients.joblib'))
+
+@st.cache_resource
+def load_similar_patients():
+    """Persisted nearest-neighbour index over the reference cohort, or None if none has been built"""
+    if not os.path.exists(SIMILAR_PATIENTS_PATH):
+        return None
+    try:
+        return SimilarPatientIndex.load(SIMILAR_PATIENTS_PATH)
+    except (OSError, ValueError, ImportError) as e:
+        logger.warning("Could not load similar-patient index %s: %s", SIMILAR_PATIENTS_PATH, e)
+        return None
+
+DRIFT_BASELINE_PATH = os.environ.get('CARDIOPREDICT_DRIFT_BASELINE',
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), 'drift_baseline.json'))
+DRIFT_STATE_PATH = os.environ.get('CARDIOPREDICT_DRIFT_STATE',
+                                  os.path.join(os.path.expanduser('~'), '.cache', 'cardiopredict', 'drift_sketch.json'))
+
+@st.cache_resource
+def get_drift_monitor():
+    """Process-wide sketch of every scored patient, persisted periodically and on exit"""
+    baseline = None
+    if os.path.exists(DRIFT_BASELINE_PATH):
+        try:
+            baseline = InputSketch.load(DRIFT_BASELINE_PATH)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not load drift baseline %s: %s", DRIFT_BASELINE_PATH, e)
+    monitor = DriftMonitor(baseline, DRIFT_STATE_PATH)
+    atexit.register(monitor.save)
+    return monitor
+
+@st.cache_resource
+def get_prediction_cache():
+    """Process-wide prediction cache shared by every session and rerun"""
+    return PredictionCache(maxsize=4096, fingerprint=current_model_fingerprint())
+
+@st.cache_resource
+def get_explanation_cache():
+    """Process-wide TreeSHAP cache keyed by patient and model hash"""
+    return PredictionCache(maxsize=1024, fingerprint=current_model_fingerprint())
+
+def explain_patient(inputs, model):
+    """Base log-odds and per-field TreeSHAP contributions, or None without the fast path"""
+    scorer = load_fast_scorer(model)
+    if scorer is None:
+        return None
+    return get_explanation_cache().get_or_compute(inputs, scorer.explain)
+
+@st.cache_resource
+def get_analysis_cache(name):
+    """Process-wide per-patient cache for one named what-if analysis (options go in the entry key, not the name)"""
+    return PredictionCache(maxsize=512, fingerprint=current_model_fingerprint())
+
+def get_batch_scorer(model):
+    """Score a list of patients in one model call (fast path, else predict_model)"""
+    scorer = load_fast_scorer(model)
+    return lambda patients: score_patients(model, scorer, patients)
+
+def get_frame_scorer(model):
+    """Score a DataFrame of input fields in one model call (fast path, else predict_model)"""
+    scorer = load_fast_scorer(model)
+    return lambda frame: score_frame(model, scorer, frame)
+
+def get_sensitivity_curves(inputs, model):
+    """Per-field risk curves for a patient, scored in one batch and cached per patient"""
+    return get_analysis_cache('sensitivity').get_or_compute(
+        inputs, lambda patient: sensitivity_curves(patient, get_frame_scorer(model))
+    )
+
+def get_confidence_interval(inputs, model):
+    """Monte Carlo 90% interval under measurement noise, within a latency budget and cached per patient"""
+    return get_analysis_cache('uncertainty').get_or_compute(
+        inputs, lambda patient: confidence_interval(patient, get_frame_scorer(model))
+    )
+
+SOBOL_PROCESSES = int(os.environ.get('CARDIOPREDICT_SOBOL_PROCESSES', '0'))
+
+@st.cache_resource
+def get_sobol_pool(_model):
+    """Persistent process pool holding the fast scorer in each worker, or None to score in-process"""
+    scorer = load_fast_scorer(_model)
+    # predict_model pipelines stay in-process; a FastRiskScorer pickles into the workers once
+    if scorer is None or SOBOL_PROCESSES < 2:
+        return None
+    pool = ScoringPool(scorer.predict_frame, SOBOL_PROCESSES)
+    atexit.register(pool.shutdown)
+    return pool
+
+def get_sobol_indices(inputs, model, compute=True):
+    """Variance-based sensitivity under measurement noise, run once per patient (None if not yet computed)"""
+    cache = get_analysis_cache('sobol')
+    if not compute:
+        return cache.get(cache.key(inputs))
+    pool = get_sobol_pool(model)
+    return cache.get_or_compute(inputs, lambda patient: sobol_indices(patient, get_frame_scorer(model), pool=pool))
+
+def get_similar_patients(inputs, index, k):
+    """The k nearest reference-cohort patients, cached per patient"""
+    return get_analysis_cache('similar').get_or_compute(inputs, lambda patient: index.query(patient, k), variant=k)
+
+def get_counterfactual(inputs, model):
+    """Minimal modifiable-input changes that bring the patient below the LOW cutoff, cached per patient"""
+    return get_analysis_cache('counterfactual').get_or_compute(
+        inputs, lambda patient: counterfactual_search(patient, get_batch_scorer(model))
+    )
+
+def get_risk_trajectory(inputs, model, months, interventions):
+    """Ageing projections with and without interventions, cached per patient and plan"""
+    plan = tuple(sorted(interventions))
+    return get_analysis_cache('trajectory').get_or_compute(
+        inputs, lambda patient: risk_trajectory(patient, get_batch_scorer(model), months, plan), variant=(months, plan)
+    )
+
+def preview_from_curves(inputs):
+    """Risk for sidebar inputs one field away from the analysed patient, at the nearest point of its curves"""
+    base = st.session_state.get('inputs')
+    if not st.session_state.get('prediction_made') or base is None:
+        return None
+    cache = get_analysis_cache('sensitivity')
+    curves = cache.get(cache.key(base))
+    if curves is None:
+        return None
+    changed = [name for name in INPUT_FEATURES if patient_key({name: inputs.get(name)}) != patient_key({name: base.get(name)})]
+    if len(changed) != 1:
+        return None
+    return curve_value(curves, changed[0], inputs[changed[0]])
+
+def explain_patients(patients, model):
+    """Explanations for stored patients in one booster call, reusing cached records"""
+    scorer = load_fast_scorer(model)
+    if scorer is None:
+        return [None] * len(patients)
+    return get_explanation_cache().get_or_compute_many(patients, scorer.explain_many)
+
+def top_risk_drivers(explanation, n=3):
+    """Input fields pushing the risk up the most"""
+    if explanation is None:
+        return []
+    _, contributions = explanation
+    ranked = sorted(contributions.items(), key=lambda item: item[1], reverse=True)
+    return [name for name, value in ranked[:n] if value > 0]
+
+@st.cache_resource
+def get_inference_client():
+    """Client for the shared micro-batching inference server, if one is configured"""
+    if not INFERENCE_SOCKET:
+        return None
+    return InferenceClient(INFERENCE_SOCKET)
+
+@st.cache_resource
+def get_scoring_executor():
+    """Shared background executor for real-time scoring"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="realtime-risk")
+
 # Auto-save functionality
 def auto_save_inputs(inputs: Dict):
     """Auto-save current inputs"""
@@ -586,6 +850,12 @@ def redo():
 # Voice input functionality (placeholder)
 def voice_to_text():
     """Convert voice to text (requires speech recognition setup)"""
+    # Imported on demand so the optional audio stack never slows down app start-up
+    try:
+        import speech_recognition  # noqa: F401
+    except ImportError:
+        st.info("🎤 Voice input needs the optional SpeechRecognition package. Please use manual input.")
+        return ""
     # This is a placeholder - actual implementation requires proper audio handling
     st.info("🎤 Voice input feature requires additional setup. Please use manual input.")
     return ""
@@ -616,8 +886,16 @@ def register_keyboard_shortcuts():
     """, unsafe_allow_html=True)
 
 # Enhanced gauge chart with animation
-def create_enhanced_gauge_chart(probability, show_animation=True):
-    """Create an enhanced gauge chart with modern styling and animations"""
+def create_enhanced_gauge_chart(probability, interval=None, show_animation=True):
+    """Create an enhanced gauge chart with modern styling, animations and an optional Monte Carlo interval band"""
+    steps = [
+        {'range': [0, 30], 'color': "rgba(17, 153, 142, 0.7)"},
+        {'range': [30, 70], 'color': "rgba(255, 195, 0, 0.7)"},
+        {'range': [70, 100], 'color': "rgba(255, 65, 108, 0.7)"}]
+    if interval is not None:
+        steps.append({'range': [interval['low'] * 100, interval['high'] * 100],
+                      'color': "rgba(255, 255, 255, 0.45)", 'thickness': 0.3})
+    
     fig = go.Figure(go.Indicator(
         mode = "gauge+number+delta",
         value = probability * 100,
@@ -631,10 +909,7 @@ def create_enhanced_gauge_chart(probability, show_animation=True):
             'bgcolor': "rgba(0,0,0,0)",
             'borderwidth': 2,
             'bordercolor': "white",
-            'steps': [
-                {'range': [0, 30], 'color': "rgba(17, 153, 142, 0.7)"},
-                {'range': [30, 70], 'color': "rgba(255, 195, 0, 0.7)"},
-                {'range': [70, 100], 'color': "rgba(255, 65, 108, 0.7)"}],
+            'steps': steps,
             'threshold': {
                 'line': {'color': "white", 'width': 4},
                 'thickness': 0.75,
@@ -647,6 +922,14 @@ def create_enhanced_gauge_chart(probability, show_animation=True):
         height=350
     )
     
+    if interval is not None:
+        fig.add_annotation(
+            x=0.5, y=-0.05, showarrow=False,
+            text=f"{interval['level']:.0%} CI: {interval['low']:.1%} – {interval['high']:.1%} "
+                 f"({interval['n_samples']:,} samples)",
+            font=dict(color='white', size=14)
+        )
+    
     if show_animation:
         fig.update_traces(gauge_axis_range=[0, 100])
         
@@ -747,67 +1030,59 @@ def create_enhanced_radar(inputs):
     return fig
 
 # Risk heatmap comparison
-def create_risk_heatmap(patient_data, population_data=None):
-    """Create a heatmap comparing patient to population"""
-    categories = ['Age', 'BMI', 'BP', 'Cholesterol', 'Glucose', 'Heart Rate']
-    
-    # Normalize patient data
-    patient_values = [
-        patient_data['age'] / 80,
-        patient_data['BMI'] / 40,
-        patient_data['mean_sbp'] / 180,
-        patient_data['total_cholesterol'] / 8,
-        patient_data['glucose'] / 15,
-        patient_data['mean_heart_rate'] / 120
-    ]
-    
-    # Population percentiles (mock data - in real app, this would come from database)
-    population_percentiles = [
-        [0.1, 0.25, 0.5, 0.75, 0.9],  # Age
-        [0.1, 0.25, 0.5, 0.75, 0.9],  # BMI
-        [0.1, 0.25, 0.5, 0.75, 0.9],  # BP
-        [0.1, 0.25, 0.5, 0.75, 0.9],  # Cholesterol
-        [0.1, 0.25, 0.5, 0.75, 0.9],  # Glucose
-        [0.1, 0.25, 0.5, 0.75, 0.9],  # Heart Rate
-    ]
-    
+HEATMAP_FEATURES = [('Age', 'age'), ('BMI', 'BMI'), ('BP', 'mean_sbp'), ('Cholesterol', 'total_cholesterol'),
+                    ('Glucose', 'glucose'), ('Heart Rate', 'mean_heart_rate')]
+POPULATION_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+def create_risk_heatmap(patient_data, population_index=None):
+    """Create a heatmap placing the patient at their exact percentile of the reference population"""
     fig = go.Figure()
-    
-    # Add heatmap
+    rows = [(label, field) for label, field in HEATMAP_FEATURES
+            if population_index is not None and field in population_index.features]
+    if not rows:
+        fig.add_annotation(text="No reference population index found.<br>"
+                                "Build one with: python population_index.py build cohort.csv",
+                           showarrow=False, font=dict(size=14, color='white'))
+        fig.update_xaxes(visible=False)
+        fig.update_yaxes(visible=False)
+        fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                          font=dict(color='white', family='Inter'), height=400)
+        return fig
+    
+    categories = [label for label, _ in rows]
+    x = [q * 100 for q in POPULATION_QUANTILES]
+    quantile_values = [population_index.quantiles(field, POPULATION_QUANTILES) for _, field in rows]
+    
+    # Population values at each percentile, coloured by percentile band
     fig.add_trace(go.Heatmap(
-        z=population_percentiles,
-        x=['10th', '25th', '50th', '75th', '90th'],
+        z=[POPULATION_QUANTILES] * len(rows),
+        x=x,
         y=categories,
         colorscale='RdYlGn_r',
-        showscale=True,
-        text=[[f"{v*100:.0f}%" for v in row] for row in population_percentiles],
+        showscale=False,
+        text=[[f"{v:.3g}" for v in values] for values in quantile_values],
         texttemplate="%{text}",
         textfont={"size": 10},
-        hovertemplate="Category: %{y}<br>Percentile: %{x}<br>Value: %{text}<extra></extra>"
+        hovertemplate="Category: %{y}<br>Percentile: %{x:.0f}th<br>Population value: %{text}<extra></extra>"
     ))
     
-    # Add patient markers
-    for i, (cat, val) in enumerate(zip(categories, patient_values)):
-        # Find which percentile bucket the patient falls into
-        percentile_idx = 0
-        for j, p in enumerate(population_percentiles[i]):
-            if val > p:
-                percentile_idx = j
-        
-        fig.add_trace(go.Scatter(
-            x=[['10th', '25th', '50th', '75th', '90th'][percentile_idx]],
-            y=[cat],
-            mode='markers',
-            marker=dict(size=20, color='white', symbol='star', 
-                       line=dict(color='black', width=2)),
-            name='Patient',
-            showlegend=i == 0,
-            hovertemplate=f"Patient's {cat}: {val*100:.0f}%<extra></extra>"
-        ))
+    # Patient markers at their exact percentile
+    percentiles = population_index.patient_percentiles(patient_data, [field for _, field in rows])
+    fig.add_trace(go.Scatter(
+        x=[percentiles[field] for _, field in rows],
+        y=categories,
+        mode='markers',
+        marker=dict(size=20, color='white', symbol='star',
+                   line=dict(color='black', width=2)),
+        name='Patient',
+        customdata=[[patient_data[field], population_index.count(field)] for _, field in rows],
+        hovertemplate="Patient's %{y}: %{customdata[0]:.3g}<br>%{x:.1f}th percentile of %{customdata[1]:,}<extra></extra>"
+    ))
     
     fig.update_layout(
         title="Patient vs Population Risk Factors",
-        xaxis_title="Population Percentiles",
+        xaxis=dict(title="Population Percentiles", range=[0, 100], tickvals=x,
+                   ticktext=[f"{v:.0f}th" for v in x]),
         yaxis_title="Risk Factors",
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)',
@@ -817,31 +1092,46 @@ def create_risk_heatmap(patient_data, population_data=None):
     
     return fig
 
-# SHAP-style feature importance
-def create_feature_importance(inputs, prediction_proba):
-    """Create SHAP-style feature importance visualization"""
-    # Mock SHAP values - in production, use actual SHAP
-    features = list(inputs.keys())[:10]  # Top 10 features
-    
-    # Calculate mock importance based on deviation from normal
-    importances = []
-    for feature in features:
-        if feature == 'age':
-            importance = (inputs[feature] - 50) / 30 * prediction_proba
-        elif feature == 'BMI':
-            importance = (inputs[feature] - 25) / 10 * prediction_proba
-        elif feature == 'mean_sbp':
-            importance = (inputs[feature] - 120) / 40 * prediction_proba
-        elif feature == 'total_cholesterol':
-            importance = (inputs[feature] - 5) / 3 * prediction_proba
-        else:
-            importance = np.random.randn() * 0.1 * prediction_proba
-        importances.append(importance)
-    
-    # Sort by absolute importance
-    sorted_idx = np.argsort(np.abs(importances))[::-1]
-    sorted_features = [features[i] for i in sorted_idx]
-    sorted_importances = [importances[i] for i in sorted_idx]
+# Cohort risk percentiles
+def describe_risk_group(group, level):
+    """Readable name for one cohort group from PopulationIndex.risk_percentiles"""
+    if group == 'overall':
+        return "the reference cohort"
+    if group == 'age_band':
+        return f"patients aged {level}"
+    return f"{level} patients"
+
+def create_risk_percentile_html(rows):
+    """'Higher risk than X% of ...' lines for the prediction card"""
+    lines = "".join(
+        f"<div>Higher than <b>{percentile:.0f}%</b> of {describe_risk_group(group, level)} "
+        f"<span style=\"opacity: 0.6;\">(n={size:,})</span></div>"
+        for group, level, percentile, size in rows
+    )
+    return f'<div style="text-align: center; color: rgba(255,255,255,0.85); margin-top: 0.5rem;">{lines}</div>'
+
+# TreeSHAP feature importance
+def create_feature_importance(explanation, top_n=10):
+    """Create a TreeSHAP feature contribution chart from explain_patient output"""
+    if explanation is None:
+        fig = go.Figure()
+        fig.add_annotation(text="Feature contributions need the native LightGBM model",
+                           showarrow=False, font=dict(color='white', size=14))
+        fig.update_layout(
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            height=400,
+            xaxis=dict(visible=False),
+            yaxis=dict(visible=False)
+        )
+        return fig
+    
+    _, contributions = explanation
+    
+    # Largest absolute contributions first
+    ranked = sorted(contributions.items(), key=lambda item: abs(item[1]), reverse=True)[:top_n]
+    sorted_features = [name for name, _ in ranked]
+    sorted_importances = [value for _, value in ranked]
     
     # Create color map
     colors = ['red' if x > 0 else 'green' for x in sorted_importances]
@@ -858,51 +1148,40 @@ def create_feature_importance(inputs, prediction_proba):
     
     fig.update_layout(
         title="Feature Impact on Prediction",
-        xaxis_title="Impact on Risk Score",
+        xaxis_title="Contribution to Risk (log-odds)",
         yaxis_title="Features",
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)',
         font=dict(color='white', family='Inter'),
         height=400,
         xaxis=dict(zeroline=True, zerolinecolor='white', zerolinewidth=2),
+        yaxis=dict(autorange='reversed'),
         showlegend=False
     )
     
     return fig
 
 # Risk timeline
-def create_risk_timeline(current_risk, modifications=None):
-    """Create interactive risk timeline with projections"""
-    months = pd.date_range(start=datetime.now() - timedelta(days=365), 
-                          end=datetime.now() + timedelta(days=365), 
-                          freq='M')
-    
-    # Historical data (mock)
-    historical_risk = np.random.normal(current_risk * 100 - 10, 5, 12)
-    historical_risk = np.clip(historical_risk, 0, 100)
-    
-    # Future projections
-    baseline_projection = np.linspace(current_risk * 100, current_risk * 100 + 10, 12)
-    
-    # With interventions
-    intervention_projection = np.linspace(current_risk * 100, current_risk * 100 - 20, 12)
-    intervention_projection = np.clip(intervention_projection, 0, 100)
+def create_risk_timeline(current_risk, trajectory=None, history=None):
+    """Create risk timeline from assessment history and model-based ageing projections"""
+    now = datetime.now()
     
     fig = go.Figure()
     
-    # Historical data
-    fig.add_trace(go.Scatter(
-        x=months[:12],
-        y=historical_risk,
-        name='Historical Risk',
-        line=dict(color='#667eea', width=3),
-        mode='lines+markers',
-        marker=dict(size=8)
-    ))
+    # Historical assessments
+    if history:
+        fig.add_trace(go.Scatter(
+            x=[h['timestamp'] for h in history],
+            y=[h['risk_score'] * 100 for h in history],
+            name='Historical Risk',
+            line=dict(color='#667eea', width=3),
+            mode='lines+markers',
+            marker=dict(size=8)
+        ))
     
     # Current point
     fig.add_trace(go.Scatter(
-        x=[datetime.now()],
+        x=[now],
         y=[current_risk * 100],
         name='Current Risk',
         mode='markers',
@@ -910,23 +1189,26 @@ def create_risk_timeline(current_risk, modifications=None):
                    line=dict(color='white', width=2))
     ))
     
-    # Baseline projection
-    fig.add_trace(go.Scatter(
-        x=months[12:],
-        y=baseline_projection,
-        name='Without Intervention',
-        line=dict(color='red', width=3, dash='dash'),
-        mode='lines'
-    ))
-    
-    # Intervention projection
-    fig.add_trace(go.Scatter(
-        x=months[12:],
-        y=intervention_projection,
-        name='With Intervention',
-        line=dict(color='green', width=3, dash='dash'),
-        mode='lines'
-    ))
+    if trajectory is not None:
+        months = [now + pd.DateOffset(months=int(m)) for m in trajectory.index]
+        
+        # Baseline projection
+        fig.add_trace(go.Scatter(
+            x=months,
+            y=trajectory['without'] * 100,
+            name='Without Intervention',
+            line=dict(color='red', width=3, dash='dash'),
+            mode='lines'
+        ))
+        
+        # Intervention projection
+        fig.add_trace(go.Scatter(
+            x=months,
+            y=trajectory['with'] * 100,
+            name='With Intervention',
+            line=dict(color='green', width=3, dash='dash'),
+            mode='lines'
+        ))
     
     # Add risk zones
     fig.add_hrect(y0=70, y1=100, fillcolor="red", opacity=0.1, layer="below", line_width=0)
@@ -948,34 +1230,36 @@ def create_risk_timeline(current_risk, modifications=None):
     return fig
 
 # Medication impact simulator
-def create_medication_impact(current_values):
-    """Simulate medication impact on risk factors"""
-    medications = {
-        'Statins': {'cholesterol': -25, 'ldl': -30, 'risk': -15},
-        'ACE Inhibitors': {'sbp': -10, 'dbp': -5, 'risk': -10},
-        'Beta Blockers': {'heart_rate': -15, 'sbp': -5, 'risk': -8},
-        'Metformin': {'glucose': -20, 'hba1c': -10, 'risk': -12},
-        'Aspirin': {'risk': -5}
-    }
+def create_medication_impact(current_values, model):
+    """Chart model-estimated risk change for each medication and the best regimen"""
+    grid = get_analysis_cache('medication').get_or_compute(
+        current_values, lambda inputs: medication_grid(inputs, get_batch_scorer(model))
+    )
     
     fig = go.Figure()
     
-    x = list(medications.keys())
-    risk_reductions = [med.get('risk', 0) for med in medications.values()]
+    # Each medication on its own, plus the lowest-risk regimen when it combines several
+    regimens = grid[grid['n_interventions'] == 1]
+    if grid.iloc[0]['n_interventions'] > 1:
+        regimens = pd.concat([regimens, grid.iloc[[0]]])
+    x = [name.replace(' + ', '<br>+ ') for name in regimens.index]
+    risk_changes = regimens['delta'] * 100
     
     fig.add_trace(go.Bar(
         x=x,
-        y=risk_reductions,
-        name='Risk Reduction (%)',
-        marker_color='lightgreen',
-        text=[f"{abs(r)}%" for r in risk_reductions],
-        textposition='outside'
+        y=risk_changes,
+        name='Risk Change (pts)',
+        marker_color=['lightgreen' if r < 0 else 'gray' for r in risk_changes],
+        text=[f"{r:+.1f} pts" for r in risk_changes],
+        textposition='outside',
+        customdata=regimens['probability'] * 100,
+        hovertemplate='%{x}: %{customdata:.1f}% risk (%{y:+.1f} pts)<extra></extra>'
     ))
     
     fig.update_layout(
-        title="Potential Medication Impact on Risk",
+        title="Model-Estimated Medication Impact on Risk",
         xaxis_title="Medication",
-        yaxis_title="Risk Reduction (%)",
+        yaxis_title="Risk Change (percentage points)",
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)',
         font=dict(color='white', family='Inter'),
@@ -986,40 +1270,202 @@ def create_medication_impact(current_values):
     return fig
 
 # Lifestyle impact calculator
-def calculate_lifestyle_impact(current_inputs):
-    """Calculate impact of lifestyle changes"""
-    impacts = {
-        'Quit Smoking': -20 if current_inputs['smoking_status'] != 'non-smoker' else 0,
-        'Exercise 150min/week': -15 if current_inputs['physical_activity'] == 'low' else -5,
-        'Mediterranean Diet': -10,
-        'Weight Loss (10%)': -12 if current_inputs['BMI'] > 25 else 0,
-        'Stress Management': -8,
-        'Sleep Optimization': -5
-    }
+def calculate_lifestyle_impact(current_inputs, model):
+    """Model-estimated risk for every combination of lifestyle changes, cached per patient"""
+    return get_analysis_cache('lifestyle').get_or_compute(
+        current_inputs, lambda inputs: lifestyle_grid(inputs, get_batch_scorer(model))
+    )
+
+# Single-patient scoring (inference server, native LightGBM fast path, PyCaret fallback)
+def get_patient_scorer(model):
+    """Resolve the scoring backend; the returned callable is safe to use off the script thread"""
+    scorer = load_fast_scorer(model)
+    client = get_inference_client()
+    
+    def score(inputs):
+        if client is not None:
+            try:
+                prob = client.predict_proba(inputs)
+                return int(prob > 0.5), prob
+            except (OSError, RuntimeError, ValueError) as e:
+                # Unreachable server, an error reply or a malformed reply all fall back to local scoring
+                logger.warning("Inference server unavailable, scoring locally: %s", e)
+        return _score_patient(inputs, model, scorer)
+    
+    return score
+
+def predict_angina_probability(inputs, model, score=None, cache=None, monitor=None):
+    """Return (prediction_label, angina_probability) for one patient, cached by input hash.
+    
+    Every patient scored here is folded into the drift sketch, keyed so that
+    reruns and repeat requests for the same inputs are not recounted. Pass
+    score (from get_patient_scorer), cache and monitor explicitly when calling
+    from outside the script thread.
+    """
+    if cache is None:
+        cache = get_prediction_cache()
+    if score is None:
+        score = get_patient_scorer(model)
+    if monitor is None:
+        monitor = get_drift_monitor()
+    result = cache.get_or_compute(inputs, score)
+    monitor.record(inputs, cache.key(inputs))
+    return result
+
+def _score_patient(inputs, model, scorer):
+    """Score one patient locally through the fast path or predict_model"""
+    if scorer is not None:
+        prob = scorer.predict_proba(inputs)
+        return int(prob > 0.5), prob
+    
+    from pycaret.classification import predict_model
+    input_df = pd.DataFrame([inputs])
+    prediction = predict_model(model, data=input_df, verbose=False)
+    label = prediction['prediction_label'][0]
+    prob = prediction['prediction_score'][0]
+    if label == 0:
+        prob = 1 - prob
+    return label, prob
+
+# Real-time risk calculator (a thin client of the inference server when one is configured)
+def calculate_real_time_risk(inputs, model, score=None, cache=None, monitor=None):
+    """Calculate risk in real-time as inputs change; failures propagate so the card can show them"""
+    _, prob = predict_angina_probability(inputs, model, score, cache, monitor)
+    return prob
+
+# Analysis pipeline with real stage timing
+ANALYSIS_STAGES = [
+    ('validation', "🔍 Validating input data"),
+    ('encoding', "🧮 Encoding features"),
+    ('inference', "🤖 Running AI model"),
+    ('uncertainty', "🎲 Estimating uncertainty"),
+    ('explanation', "📊 Explaining the prediction"),
+    ('report', "💡 Building the report")
+]
+
+class StageTimer:
+    """Times named analysis stages with a monotonic clock"""
+    
+    def __init__(self, on_stage=None):
+        self.timings = {}
+        self.on_stage = on_stage
+    
+    @contextmanager
+    def stage(self, name):
+        if self.on_stage is not None:
+            self.on_stage(name, len(self.timings))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
     
-    return impacts
+    @property
+    def total(self):
+        return sum(self.timings.values())
 
-# Real-time risk calculator
-def calculate_real_time_risk(inputs, model):
-    """Calculate risk in real-time as inputs change"""
-    if model is None:
-        return 0.5
+def run_analysis(inputs, model, timer):
+    """Run validation, encoding, inference, uncertainty, explanation and report build for one patient"""
+    with timer.stage('validation'):
+        problems = validate_patient(inputs)
+        if problems:
+            raise ValueError("Invalid input: " + "; ".join(problems))
+    
+    cache = get_prediction_cache()
+    scorer = load_fast_scorer(model)
+    local = scorer is not None and get_inference_client() is None
+    with timer.stage('encoding'):
+        key = cache.key(inputs)
+        cached = cache.get(key)
+        row = scorer.encode(inputs) if cached is None and local else None
+    
+    with timer.stage('inference'):
+        if cached is not None:
+            prediction_label, angina_probability = cached
+        elif row is not None:
+            angina_probability = scorer.predict_encoded(row)
+            prediction_label = int(angina_probability > 0.5)
+        else:
+            prediction_label, angina_probability = get_patient_scorer(model)(inputs)
+        cache.put(key, (prediction_label, angina_probability))
+    # Same key as predict_angina_probability, so a patient already scored in real time is not recounted
+    get_drift_monitor().record(inputs, key)
     
-    try:
-        input_df = pd.DataFrame([inputs])
-        prediction = predict_model(model, data=input_df, verbose=False)
-        prob = prediction['prediction_score'][0]
-        if prediction['prediction_label'][0] == 0:
-            prob = 1 - prob
-        return prob
-    except:
-        return 0.5
+    with timer.stage('uncertainty'):
+        interval = get_confidence_interval(inputs, model)
+    
+    with timer.stage('explanation'):
+        explanation = explain_patient(inputs, model)
+        feature_importance_chart = create_feature_importance(explanation)
+    
+    with timer.stage('report'):
+        counterfactual = get_counterfactual(inputs, model) if angina_probability >= MODERATE_RISK_THRESHOLD else None
+        report = generate_enhanced_patient_report(inputs, prediction_label, angina_probability, explanation, interval,
+                                                  counterfactual)
+    
+    return prediction_label, angina_probability, interval, feature_importance_chart, report
+
+def get_real_time_worker(model):
+    """Per-session latest-wins worker that scores sidebar inputs off the script thread"""
+    if 'real_time_worker' not in st.session_state:
+        score = get_patient_scorer(model)
+        cache = get_prediction_cache()
+        monitor = get_drift_monitor()
+        st.session_state.real_time_worker = LatestWinsWorker(
+            get_scoring_executor(),
+            lambda inputs: calculate_real_time_risk(inputs, model, score, cache, monitor)
+        )
+    return st.session_state.real_time_worker
 
 # Generate comprehensive patient report with new features
-def generate_enhanced_patient_report(inputs, prediction_label, angina_probability, feature_importance=None):
+COUNTERFACTUAL_LABELS = {
+    'smoking_status': 'Smoking Status',
+    'physical_activity': 'Physical Activity',
+    'BMI': 'BMI (kg/m²)',
+    'mean_sbp': 'Systolic BP (mmHg)',
+    'ldl': 'LDL (mmol/L)',
+    'hba1c': 'HbA1c (mmol/mol)'
+}
+
+def format_counterfactual(counterfactual):
+    """Report lines describing the counterfactual path to LOW risk"""
+    changes = "\n".join(
+        f"    • {COUNTERFACTUAL_LABELS.get(name, name)}: "
+        + (f"{before} → {after}" if isinstance(after, str) else f"{float(before):g} → {float(after):g}")
+        for name, (before, after) in counterfactual['changes'].items()
+    )
+    if counterfactual['reached']:
+        return f"""
+    🎯 PATH TO LOW RISK (below {MODERATE_RISK_THRESHOLD:.0%}, smallest set of changes found):
+{changes}
+    • Model-estimated risk after these changes: {counterfactual['probability']:.1%}
+    """
+    return f"""
+    🎯 PATH TO LOW RISK:
+    No combination of modifiable factors tested reaches LOW risk. The strongest changes tested:
+{changes}
+    • Model-estimated risk after these changes: {counterfactual['probability']:.1%}
+    """
+
+def generate_enhanced_patient_report(inputs, prediction_label, angina_probability, feature_importance=None, interval=None,
+                                     counterfactual=None):
     """Generate an enhanced comprehensive patient report"""
     risk_level = "HIGH" if angina_probability >= 0.7 else "MODERATE" if angina_probability >= 0.3 else "LOW"
     
+    # Risk drivers from the TreeSHAP explanation when available
+    drivers = top_risk_drivers(feature_importance)
+    if not drivers:
+        drivers = [
+            'Age' if inputs['age'] > 60 else 'Cholesterol' if inputs['total_cholesterol'] > 6 else 'Blood Pressure',
+            'Smoking' if inputs['smoking_status'] != 'non-smoker' else 'Physical Inactivity' if inputs['physical_activity'] == 'low' else 'BMI',
+            'Diabetes' if inputs['diabetes_status'] != 'No Diabetes' else 'Family History' if inputs['fam_chd'] else 'Lifestyle'
+        ]
+    contributions = feature_importance[1] if feature_importance is not None else {}
+    top_contributors = "\n    ".join(
+        f"{i}. {name}" + (f" ({contributions[name]:+.3f} log-odds)" if name in contributions else "")
+        for i, name in enumerate(drivers, 1)
+    )
+    
     report = f"""
     ═══════════════════════════════════════════════════════════════════════════════════════
                                   CARDIOPREDICT AI PRO
@@ -1036,7 +1482,7 @@ def generate_enhanced_patient_report(inputs, prediction_label, angina_probabilit
     
     • Overall Risk Assessment: {risk_level} RISK ({angina_probability:.1%})
     • Immediate Action Required: {'YES' if risk_level == 'HIGH' else 'NO'}
-    • Key Risk Drivers: {', '.join(['Age', 'Cholesterol', 'Blood Pressure'][:3])}
+    • Key Risk Drivers: {', '.join(drivers)}
     • Modifiable Risk Factors: {sum([inputs['smoking_status'] != 'non-smoker', 
                                     inputs['physical_activity'] == 'low', 
                                     inputs['BMI'] > 30])}/5
@@ -1064,7 +1510,11 @@ def generate_enhanced_patient_report(inputs, prediction_label, angina_probabilit
     
     • ANGINA RISK LEVEL: {risk_level}
     • Risk Probability: {angina_probability:.1%}
-    • Confidence Interval: [{max(0, angina_probability-0.1):.1%} - {min(1, angina_probability+0.1):.1%}]
+    • Confidence Interval: {
+        f"[{interval['low']:.1%} - {interval['high']:.1%}] ({interval['level']:.0%} Monte Carlo, {interval['n_samples']:,} samples)"
+        if interval is not None else
+        f"[{max(0, angina_probability-0.1):.1%} - {min(1, angina_probability+0.1):.1%}]"
+    }
     • Model Confidence: {max(angina_probability, 1-angina_probability):.1%}
     • Prediction: {'Positive for Angina Risk' if prediction_label == 1 else 'Negative for Angina Risk'}
     
@@ -1119,9 +1569,7 @@ def generate_enhanced_patient_report(inputs, prediction_label, angina_probabilit
     └─────────────────────────────────────────────────────────────────────────────────────┘
     
     TOP RISK CONTRIBUTORS:
-    1. {'Age' if inputs['age'] > 60 else 'Cholesterol' if inputs['total_cholesterol'] > 6 else 'Blood Pressure'}
-    2. {'Smoking' if inputs['smoking_status'] != 'non-smoker' else 'Physical Inactivity' if inputs['physical_activity'] == 'low' else 'BMI'}
-    3. {'Diabetes' if inputs['diabetes_status'] != 'No Diabetes' else 'Family History' if inputs['fam_chd'] else 'Lifestyle'}
+    {top_contributors}
     
     PERSONALIZED RISK REDUCTION POTENTIAL:
     • Achievable Risk Reduction: {20 if inputs['smoking_status'] != 'non-smoker' else 15}%
@@ -1137,6 +1585,9 @@ def generate_enhanced_patient_report(inputs, prediction_label, angina_probabilit
     └─────────────────────────────────────────────────────────────────────────────────────┘
     """
     
+    if counterfactual is not None and counterfactual['changes']:
+        report += format_counterfactual(counterfactual)
+    
     if risk_level == "HIGH":
         report += """
     ⚠️  URGENT ACTIONS REQUIRED:
@@ -1275,6 +1726,306 @@ def compare_patients(patients_data):
     
     return fig
 
+# Sobol indices
+def create_sobol_chart(result, top_n=10):
+    """Grouped first-order and total Sobol indices for the dominant inputs"""
+    indices = result['indices'].head(top_n)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=indices.index, y=indices['S1'].clip(lower=0), name='First-order (S1)', marker_color='#667eea',
+        hovertemplate='%{x}: S1 = %{y:.3f}<extra></extra>'
+    ))
+    fig.add_trace(go.Bar(
+        x=indices.index, y=indices['ST'].clip(lower=0), name='Total (ST)', marker_color='#f093fb',
+        hovertemplate='%{x}: ST = %{y:.3f}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        barmode='group',
+        title="Share of Risk Variance from Measurement Uncertainty",
+        yaxis_title="Sobol Index",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Inter'),
+        height=400,
+        legend=dict(x=0.7, y=1, bgcolor='rgba(0,0,0,0.5)')
+    )
+    
+    return fig
+
+# Global model importance
+def create_global_importance(metadata, top_n=15):
+    """Bar chart of the model's gain importance per input field, with split counts on hover"""
+    gain = list(metadata['gain_importance'].items())[:top_n]
+    fig = go.Figure(go.Bar(
+        x=[value * 100 for _, value in gain],
+        y=[name for name, _ in gain],
+        orientation='h',
+        marker_color='#667eea',
+        customdata=[metadata['split_importance'].get(name, 0) for name, _ in gain],
+        hovertemplate='%{y}: %{x:.1f}% of gain<br>%{customdata:.0f} splits<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title="Share of Total Gain by Feature",
+        xaxis_title="Gain (%)",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Inter'),
+        height=450,
+        yaxis=dict(autorange='reversed'),
+        showlegend=False
+    )
+    
+    return fig
+
+# Contribution breakdown across stored patients
+def create_contribution_stack(explanations, labels, top_n=8):
+    """Stacked TreeSHAP contributions per patient, smaller fields grouped as Other"""
+    fields = list(explanations[0][1])
+    contributions = np.array([[explanation[1][name] for name in fields] for explanation in explanations])
+    order = np.argsort(-np.abs(contributions).mean(axis=0))
+    shown = order[:top_n]
+    
+    fig = go.Figure()
+    for j in shown:
+        fig.add_trace(go.Bar(
+            x=labels,
+            y=contributions[:, j],
+            name=fields[j],
+            hovertemplate=f'{fields[j]}: %{{y:+.3f}}<extra>%{{x}}</extra>'
+        ))
+    if len(order) > top_n:
+        fig.add_trace(go.Bar(
+            x=labels,
+            y=contributions[:, order[top_n:]].sum(axis=1),
+            name='Other',
+            marker_color='gray',
+            hovertemplate='Other: %{y:+.3f}<extra>%{x}</extra>'
+        ))
+    
+    fig.update_layout(
+        barmode='relative',
+        title="Feature Contributions by Patient",
+        yaxis_title="Contribution to Risk (log-odds)",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Inter'),
+        height=450,
+        yaxis=dict(zeroline=True, zerolinecolor='white', zerolinewidth=2)
+    )
+    
+    return fig
+
+def create_contribution_difference(explanation_a, explanation_b, label_a, label_b, top_n=10):
+    """Waterfall of the fields that move patient B's log-odds to patient A's"""
+    base_a, contributions_a = explanation_a
+    base_b, contributions_b = explanation_b
+    start = base_b + sum(contributions_b.values())
+    end = base_a + sum(contributions_a.values())
+    
+    deltas = {name: contributions_a[name] - contributions_b[name] for name in contributions_a}
+    ranked = sorted(deltas.items(), key=lambda item: abs(item[1]), reverse=True)
+    steps = ranked[:top_n]
+    other = sum(delta for _, delta in ranked[top_n:]) + (base_a - base_b)
+    if abs(other) > 1e-9:
+        steps.append(('Other', other))
+    
+    fig = go.Figure(go.Waterfall(
+        orientation='v',
+        measure=['absolute'] + ['relative'] * len(steps) + ['total'],
+        x=[label_b] + [name for name, _ in steps] + [label_a],
+        y=[start] + [delta for _, delta in steps] + [end],
+        increasing=dict(marker=dict(color='red')),
+        decreasing=dict(marker=dict(color='green')),
+        totals=dict(marker=dict(color='#667eea')),
+        hovertemplate='%{x}: %{y:+.3f}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title=f"What Drives the Difference: {label_b} ({1 / (1 + np.exp(-start)):.1%}) → {label_a} ({1 / (1 + np.exp(-end)):.1%})",
+        yaxis_title="Risk (log-odds)",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Inter'),
+        height=450,
+        showlegend=False
+    )
+    
+    return fig
+
+# Per-field sensitivity curves
+def create_sensitivity_curves(curves, inputs, current_risk, features):
+    """Small-multiple risk curves with the patient's current value marked"""
+    n_rows = (len(features) + 1) // 2
+    fig = make_subplots(rows=n_rows, cols=2, subplot_titles=features,
+                        vertical_spacing=0.25 / max(n_rows, 1), horizontal_spacing=0.1)
+    
+    for i, name in enumerate(features):
+        curve = curves[name]
+        row, col = i // 2 + 1, i % 2 + 1
+        numeric = name in NUMERIC_RANGES
+        x = curve.index if numeric else [str(v) for v in curve.index]
+        fig.add_trace(go.Scatter(
+            x=x,
+            y=curve.values * 100,
+            mode='lines' if numeric else 'lines+markers',
+            line=dict(color='#667eea', width=3, shape='linear' if numeric else 'hv'),
+            hovertemplate=f'{name}: %{{x}}<br>Risk: %{{y:.1f}}%<extra></extra>'
+        ), row=row, col=col)
+        fig.add_trace(go.Scatter(
+            x=[inputs[name] if numeric else str(inputs[name])],
+            y=[current_risk * 100],
+            mode='markers',
+            marker=dict(size=12, color='white', symbol='diamond'),
+            hovertemplate='Current: %{x}<br>Risk: %{y:.1f}%<extra></extra>'
+        ), row=row, col=col)
+    
+    fig.update_yaxes(title_text="Risk (%)", range=[0, 100])
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Inter'),
+        height=300 * n_rows,
+        showlegend=False
+    )
+    
+    return fig
+
+# Out-of-core cohort analytics
+TIER_COLORS = {'LOW': '#38ef7d', 'MODERATE': '#f093fb', 'HIGH': '#FF416C'}
+COHORT_REFRESH_SECONDS = 0.5
+
+def create_cohort_dashboard(aggregate: CohortAggregate):
+    """Tier counts, risk distribution and mean risk by group for a (possibly partial) cohort aggregate"""
+    fig = make_subplots(rows=1, cols=3, column_widths=[0.25, 0.4, 0.35],
+                        subplot_titles=("Risk Tiers", "Predicted Risk Distribution", "Mean Risk by Group"))
+    fig.add_trace(go.Bar(
+        x=list(TIERS), y=aggregate.tier_counts, marker_color=[TIER_COLORS[tier] for tier in TIERS],
+        hovertemplate='%{x}: %{y:,} patients<extra></extra>'
+    ), row=1, col=1)
+    
+    edges = np.linspace(0, 100, len(aggregate.risk_histogram) + 1)
+    fig.add_trace(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2, y=aggregate.risk_histogram, width=edges[1] - edges[0],
+        marker_color='#667eea', hovertemplate='%{x:.0f}% risk: %{y:,} patients<extra></extra>'
+    ), row=1, col=2)
+    
+    groups = aggregate.group_means()
+    fig.add_trace(go.Bar(
+        x=groups['mean_risk'] * 100, y=groups['level'], orientation='h',
+        marker_color=groups['group'].map({'sex': '#667eea', 'ethnic': '#f093fb', 'diabetes_status': '#38ef7d'}),
+        customdata=groups['patients'],
+        hovertemplate='%{y}: %{x:.1f}% mean risk<br>%{customdata:,} patients<extra></extra>'
+    ), row=1, col=3)
+    
+    fig.update_xaxes(title_text="Predicted risk (%)", row=1, col=2)
+    fig.update_xaxes(title_text="Mean risk (%)", row=1, col=3)
+    fig.update_yaxes(autorange='reversed', row=1, col=3)
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Inter'),
+        height=450,
+        showlegend=False,
+        bargap=0.05
+    )
+    
+    return fig
+
+def create_cohort_histogram(aggregate: CohortAggregate, feature):
+    """Fixed-bin histogram of one numeric input across the cohort"""
+    edges = aggregate.histogram_edges(feature)
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2, y=aggregate.histograms[feature], width=edges[1] - edges[0],
+        marker_color='#667eea', hovertemplate='%{x:.3g}: %{y:,} patients<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title=f"{feature} across {aggregate.rows:,} patients ({aggregate.missing[feature]:,} missing)",
+        xaxis_title=feature,
+        yaxis_title="Patients",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Inter'),
+        height=350,
+        bargap=0.05
+    )
+    
+    return fig
+
+def show_cohort_progress(container, aggregate: CohortAggregate, elapsed, total_rows=None, final=False):
+    """Redraw the cohort dashboard into a placeholder as chunks finish"""
+    with container.container():
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Patients", f"{aggregate.rows:,}" + (f" / {total_rows:,}" if total_rows else ""))
+        col2.metric("Mean Risk", f"{aggregate.mean_risk:.1%}")
+        col3.metric("HIGH Risk", f"{aggregate.tier_counts[TIERS.index('HIGH')] / max(aggregate.scored, 1):.1%}")
+        col4.metric("Throughput", f"{aggregate.rows / max(elapsed, 1e-9):,.0f} rows/s")
+        if aggregate.unscored:
+            st.caption(f"⚠️ {aggregate.unscored:,} patients have no finite predicted risk "
+                       "and are left out of the risk figures")
+        st.plotly_chart(create_cohort_dashboard(aggregate), use_container_width=True,
+                        key=f"cohort_dashboard_{aggregate.rows}_{final}")
+
+# Input drift
+DRIFT_COLORS = {'stable': '#38ef7d', 'moderate': '#f093fb', 'significant': '#FF416C'}
+
+def create_drift_chart(report, top_n=15):
+    """PSI per input field against the training baseline, coloured by drift status"""
+    top = report.head(top_n)
+    fig = go.Figure(go.Bar(
+        x=top['psi'],
+        y=top['feature'],
+        orientation='h',
+        marker_color=top['status'].map(DRIFT_COLORS),
+        customdata=np.stack([top['status'], top['ks'].fillna(-1)], axis=-1),
+        hovertemplate='%{y}: PSI %{x:.3f} (%{customdata[0]})<br>KS %{customdata[1]:.3f}<extra></extra>'
+    ))
+    fig.add_vline(x=0.1, line_dash="dot", line_color="#f093fb")
+    fig.add_vline(x=0.25, line_dash="dash", line_color="#FF416C")
+    
+    fig.update_layout(
+        title="Population Stability Index vs Training Baseline",
+        xaxis_title="PSI",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Inter'),
+        height=450,
+        yaxis=dict(autorange='reversed'),
+        showlegend=False
+    )
+    
+    return fig
+
+def create_drift_histogram(baseline: InputSketch, live: InputSketch, feature):
+    """Baseline and live distribution of one numeric input as shares of non-missing values, at the bins both share"""
+    low, high = NUMERIC_RANGES[feature]
+    bins = shared_bins(baseline, live)
+    edges = np.linspace(low, high, bins + 1)
+    centers = (edges[:-1] + edges[1:]) / 2
+    fig = go.Figure()
+    for name, sketch, color in [('Training baseline', baseline, '#667eea'), ('Scored in app', live, '#f093fb')]:
+        counts = sketch.histogram(feature, bins)
+        fig.add_trace(go.Bar(
+            x=centers, y=counts / max(counts.sum(), 1) * 100, width=edges[1] - edges[0], name=name,
+            marker_color=color, opacity=0.6, hovertemplate='%{x:.3g}: %{y:.1f}%<extra></extra>'
+        ))
+    
+    fig.update_layout(
+        barmode='overlay',
+        title=f"{feature}: Baseline vs Live",
+        xaxis_title=feature,
+        yaxis_title="Share of patients (%)",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Inter'),
+        height=350,
+        legend=dict(x=0.7, y=1, bgcolor='rgba(0,0,0,0.5)')
+    )
+    
+    return fig
+
 # Settings panel
 def show_settings():
     """Display settings panel"""
@@ -1316,6 +2067,11 @@ def show_settings():
             if st.button("Clear History"):
                 st.session_state.patient_history = []
                 st.success("History cleared")
+            
+            cache_stats = get_prediction_cache().stats()
+            st.caption(f"Prediction cache: {cache_stats['size']}/{cache_stats['maxsize']} entries, "
+                       f"{cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                       f"({cache_stats['hit_rate']:.0%} hit rate)")
 
 # Main UI Components
 def show_quick_templates():
@@ -1341,12 +2097,52 @@ def show_quick_templates():
         return templates[selected_template]
     return None
 
+# Real-time risk card, refreshed from the background worker without a full rerun
+REAL_TIME_POLL_SECONDS = 0.5
+
+def show_real_time_risk_card():
+    """Display the newest background risk score in the sidebar, polling only while a score is pending"""
+    worker = st.session_state.get('real_time_worker')
+    pending = worker is not None and not worker.is_current()
+    st.fragment(_real_time_risk_card, run_every=REAL_TIME_POLL_SECONDS if pending else None)(pending)
+
+def _real_time_risk_card(polling):
+    worker = st.session_state.get('real_time_worker')
+    if polling and (worker is None or worker.is_current()):
+        # The score landed: one full rerun redraws the card without the polling timer
+        st.rerun()
+    error = worker.error() if worker is not None else None
+    if worker is not None and error is None:
+        latest = worker.latest()
+        if latest is not None:
+            st.session_state.real_time_risk = latest
+    
+    if error is not None:
+        risk_color, risk_text, status = "#6c757d", "—", "⚠️ Scoring failed"
+    else:
+        risk_color = "#FF416C" if st.session_state.real_time_risk >= 0.7 else \
+                    "#f093fb" if st.session_state.real_time_risk >= 0.3 else "#38ef7d"
+        risk_text = f"{st.session_state.real_time_risk:.0%}"
+        status = ('Updating…' if polling else
+                  '≈ nearest sensitivity-curve point' if st.session_state.get('real_time_preview') else
+                  '&nbsp;')
+    st.markdown(f"""
+    <div style="background: {risk_color}; padding: 1rem; border-radius: 15px; text-align: center; color: white;">
+        <h3 style="margin: 0;">Real-time Risk</h3>
+        <h1 style="margin: 0;">{risk_text}</h1>
+        <p style="margin: 0; font-size: 0.8rem; opacity: 0.8;">{status}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    if error is not None:
+        st.caption(f"Real-time scoring error: {error}")
+
 # Enhanced header with real-time elements
 def show_enhanced_header():
     """Display enhanced header with animations and real-time elements"""
     col1, col2, col3 = st.columns([1, 2, 1])
     
     with col1:
+        lottie_heart = load_lottie_asset('heart')
         if lottie_heart:
             st_lottie(lottie_heart, height=100, key="heart_animation")
     
@@ -1375,6 +2171,9 @@ def main():
     # Register keyboard shortcuts
     register_keyboard_shortcuts()
     
+    # Optional background refresh of the bundled animations
+    start_lottie_refresh()
+    
     # Show enhanced header
     show_enhanced_header()
     
@@ -1423,19 +2222,7 @@ def main():
         """, unsafe_allow_html=True)
     
     # Default values
-    default_values = {
-        'chest_pain': 0.0, 'age': 51, 'sex': 'Female', 'ethnic': 'White European', 'BMI': 20.2115,
-        'smoking_status': 'non-smoker', 'physical_activity': 'high', 'mean_sbp': 116, 'mean_dbp': 79.5,
-        'mean_heart_rate': 61, 'hba1c': 38.5, 'random_glucose': 5.995, 'total_cholesterol': 4.47,
-        'hdl': 1.492, 'ldl': 2.69, 'triglyceride': 0.504, 'Cholesterol_HDL_Ratio': 2.996, 'fam_chd': 1,
-        'chol_lowering': 0, 'has_t1d': 0, 'has_t2d': 0, 'diabetes_status': 'No Diabetes',
-        'treated_hypertension': 0, 'corticosteroid_use': 0, 'creatinine': 52, 'blood_urea_nitrogen': 2.36,
-        'sodium': 14, 'potassium': 13.6, 'glucose': 5.995, 'hemoglobin': 11.93, 'hematocrit': 35.34,
-        'mean_corpuscular_volume': 91.24, 'mean_corpuscular_hemoglobin': 30.79,
-        'mean_corpuscular_hemoglobin_concentration': 33.75, 'white_blood_cell_count': 5.24,
-        'red_blood_cell_count': 3.873, 'platelet_count': 242.7, 'creatine_phosphokinase': 1690,
-        'ast': 24.6, 'uric_acid': 131.7
-    }
+    default_values = REFERENCE_PATIENT.copy()
     
     # Check for quick template
     template_values = show_quick_templates()
@@ -1471,24 +2258,20 @@ def main():
                 st.session_state['perform_analysis'] = True
                 st.session_state['analysis_inputs'] = {}  # Will be populated below
         
-        # Real-time risk display
-        if 'real_time_risk' in st.session_state:
-            risk_color = "#FF416C" if st.session_state.real_time_risk >= 0.7 else \
-                        "#f093fb" if st.session_state.real_time_risk >= 0.3 else "#38ef7d"
-            st.markdown(f"""
-            <div style="background: {risk_color}; padding: 1rem; border-radius: 15px; text-align: center; color: white;">
-                <h3 style="margin: 0;">Real-time Risk</h3>
-                <h1 style="margin: 0;">{st.session_state.real_time_risk:.0%}</h1>
-            </div>
-            """, unsafe_allow_html=True)
+        # Real-time risk display, filled in once this run's inputs have been submitted
+        real_time_card = st.container()
         
         st.markdown('</div>', unsafe_allow_html=True)
         
-        # Options for dropdowns
-        ethnic_options = ['White European', 'Black African', 'Black Caribbean', 'Chinese', 'Mixed', 'Other ethnic group', 'South Asian']
-        smoking_options = ['ex-smoker', 'heavy smoker', 'light smoker', 'moderate smoker', 'non-smoker']
-        activity_options = ['high', 'low', 'moderate']
-        diabetes_options = ['No Diabetes', 'Type 1 Diabetes', 'Type 2 Diabetes']
+        # Options and slider ranges from the model metadata
+        metadata = load_model_metadata(model)
+        numeric_ranges = metadata['numeric_ranges']
+        categorical_levels = metadata['categorical_levels']
+        sex_options = categorical_levels['sex']
+        ethnic_options = categorical_levels['ethnic']
+        smoking_options = categorical_levels['smoking_status']
+        activity_options = categorical_levels['physical_activity']
+        diabetes_options = categorical_levels['diabetes_status']
         
         # Enhanced tabs with better organization and tooltips
         tab1, tab2, tab3 = st.tabs([f"👤 {t('demographics')}", f"🩺 {t('clinical')}", f"🧪 {t('laboratory')}"])
@@ -1504,15 +2287,15 @@ def main():
             with col1:
                 inputs['age'] = st.slider(
                     t('age'), 
-                    min_value=18, 
-                    max_value=120, 
+                    min_value=numeric_ranges['age'][0], 
+                    max_value=numeric_ranges['age'][1], 
                     value=default_values['age'],
                     help="Patient age in years"
                 )
             with col2:
                 st.markdown('<div class="tooltip">ℹ️<span class="tooltiptext">Patient age in years</span></div>', unsafe_allow_html=True)
             
-            inputs['sex'] = st.selectbox(t('sex'), ['Female', 'Male'], index=0 if default_values['sex'] == 'Female' else 1)
+            inputs['sex'] = st.selectbox(t('sex'), sex_options, index=sex_options.index(default_values['sex']))
             inputs['ethnic'] = st.selectbox('Ethnic Group', ethnic_options, index=ethnic_options.index(default_values['ethnic']))
             
             # BMI slider with tooltip
@@ -1520,8 +2303,8 @@ def main():
             with col1:
                 inputs['BMI'] = st.slider(
                     t('bmi'), 
-                    min_value=10.0, 
-                    max_value=60.0, 
+                    min_value=numeric_ranges['BMI'][0], 
+                    max_value=numeric_ranges['BMI'][1], 
                     value=float(default_values['BMI']),
                     step=0.1,
                     format="%.1f",
@@ -1566,16 +2349,16 @@ def main():
             with col1:
                 inputs['mean_sbp'] = st.slider(
                     'Systolic BP (mmHg)', 
-                    min_value=70, 
-                    max_value=250, 
+                    min_value=numeric_ranges['mean_sbp'][0], 
+                    max_value=numeric_ranges['mean_sbp'][1], 
                     value=default_values['mean_sbp'],
                     help="Normal: < 120 mmHg"
                 )
             with col2:
                 inputs['mean_dbp'] = st.slider(
                     'Diastolic BP (mmHg)', 
-                    min_value=40, 
-                    max_value=150, 
+                    min_value=numeric_ranges['mean_dbp'][0], 
+                    max_value=numeric_ranges['mean_dbp'][1], 
                     value=int(default_values['mean_dbp']),
                     help="Normal: < 80 mmHg"
                 )
@@ -1596,8 +2379,8 @@ def main():
             
             inputs['mean_heart_rate'] = st.slider(
                 t('heart_rate'), 
-                min_value=30, 
-                max_value=200, 
+                min_value=numeric_ranges['mean_heart_rate'][0], 
+                max_value=numeric_ranges['mean_heart_rate'][1], 
                 value=default_values['mean_heart_rate'],
                 help="Normal: 60-100 bpm"
             )
@@ -1630,8 +2413,8 @@ def main():
             with col1:
                 inputs['total_cholesterol'] = st.slider(
                     'Total Cholesterol (mmol/L)', 
-                    min_value=2.0, 
-                    max_value=12.0, 
+                    min_value=numeric_ranges['total_cholesterol'][0], 
+                    max_value=numeric_ranges['total_cholesterol'][1], 
                     value=float(default_values['total_cholesterol']),
                     step=0.1,
                     format="%.1f",
@@ -1639,8 +2422,8 @@ def main():
                 )
                 inputs['hdl'] = st.slider(
                     'HDL (mmol/L)', 
-                    min_value=0.5, 
-                    max_value=3.0, 
+                    min_value=numeric_ranges['hdl'][0], 
+                    max_value=numeric_ranges['hdl'][1], 
                     value=float(default_values['hdl']),
                     step=0.01,
                     format="%.2f",
@@ -1648,8 +2431,8 @@ def main():
                 )
                 inputs['ldl'] = st.slider(
                     'LDL (mmol/L)', 
-                    min_value=0.5, 
-                    max_value=8.0, 
+                    min_value=numeric_ranges['ldl'][0], 
+                    max_value=numeric_ranges['ldl'][1], 
                     value=float(default_values['ldl']),
                     step=0.1,
                     format="%.1f",
@@ -1658,8 +2441,8 @@ def main():
             with col2:
                 inputs['triglyceride'] = st.slider(
                     'Triglycerides (mmol/L)', 
-                    min_value=0.1, 
-                    max_value=5.0, 
+                    min_value=numeric_ranges['triglyceride'][0], 
+                    max_value=numeric_ranges['triglyceride'][1], 
                     value=float(default_values['triglyceride']),
                     step=0.01,
                     format="%.2f",
@@ -1667,8 +2450,8 @@ def main():
                 )
                 inputs['Cholesterol_HDL_Ratio'] = st.slider(
                     'Cholesterol/HDL Ratio', 
-                    min_value=1.0, 
-                    max_value=10.0, 
+                    min_value=numeric_ranges['Cholesterol_HDL_Ratio'][0], 
+                    max_value=numeric_ranges['Cholesterol_HDL_Ratio'][1], 
                     value=float(default_values['Cholesterol_HDL_Ratio']),
                     step=0.01,
                     format="%.2f",
@@ -1690,8 +2473,8 @@ def main():
             with col1:
                 inputs['glucose'] = st.slider(
                     'Glucose (mmol/L)', 
-                    min_value=2.0, 
-                    max_value=20.0, 
+                    min_value=numeric_ranges['glucose'][0], 
+                    max_value=numeric_ranges['glucose'][1], 
                     value=float(default_values['glucose']),
                     step=0.1,
                     format="%.1f",
@@ -1699,8 +2482,8 @@ def main():
                 )
                 inputs['random_glucose'] = st.slider(
                     'Random Glucose (mmol/L)', 
-                    min_value=2.0, 
-                    max_value=20.0, 
+                    min_value=numeric_ranges['random_glucose'][0], 
+                    max_value=numeric_ranges['random_glucose'][1], 
                     value=float(default_values['random_glucose']),
                     step=0.1,
                     format="%.1f"
@@ -1708,8 +2491,8 @@ def main():
             with col2:
                 inputs['hba1c'] = st.slider(
                     'HbA1c (mmol/mol)', 
-                    min_value=20, 
-                    max_value=150, 
+                    min_value=numeric_ranges['hba1c'][0], 
+                    max_value=numeric_ranges['hba1c'][1], 
                     value=int(default_values['hba1c']),
                     help="Normal: < 42 mmol/mol (< 6.0%)"
                 )
@@ -1722,15 +2505,15 @@ def main():
             with col1:
                 inputs['creatinine'] = st.slider(
                     'Creatinine (μmol/L)', 
-                    min_value=30, 
-                    max_value=300, 
+                    min_value=numeric_ranges['creatinine'][0], 
+                    max_value=numeric_ranges['creatinine'][1], 
                     value=int(default_values['creatinine']),
                     help="Normal: 53-97 μmol/L (male), 44-80 μmol/L (female)"
                 )
                 inputs['blood_urea_nitrogen'] = st.slider(
                     'Blood Urea Nitrogen (mmol/L)', 
-                    min_value=1.0, 
-                    max_value=20.0, 
+                    min_value=numeric_ranges['blood_urea_nitrogen'][0], 
+                    max_value=numeric_ranges['blood_urea_nitrogen'][1], 
                     value=float(default_values['blood_urea_nitrogen']),
                     step=0.1,
                     format="%.1f"
@@ -1738,15 +2521,15 @@ def main():
             with col2:
                 inputs['sodium'] = st.slider(
                     'Sodium (mmol/L)', 
-                    min_value=120, 
-                    max_value=160, 
+                    min_value=numeric_ranges['sodium'][0], 
+                    max_value=numeric_ranges['sodium'][1], 
                     value=int(default_values['sodium']),
                     help="Normal: 135-145 mmol/L"
                 )
                 inputs['potassium'] = st.slider(
                     'Potassium (mmol/L)', 
-                    min_value=2.5, 
-                    max_value=7.0, 
+                    min_value=numeric_ranges['potassium'][0], 
+                    max_value=numeric_ranges['potassium'][1], 
                     value=float(default_values['potassium']),
                     step=0.1,
                     format="%.1f",
@@ -1758,8 +2541,8 @@ def main():
             with col1:
                 inputs['hemoglobin'] = st.slider(
                     'Hemoglobin (g/dL)', 
-                    min_value=5.0, 
-                    max_value=20.0, 
+                    min_value=numeric_ranges['hemoglobin'][0], 
+                    max_value=numeric_ranges['hemoglobin'][1], 
                     value=float(default_values['hemoglobin']),
                     step=0.1,
                     format="%.1f",
@@ -1767,16 +2550,16 @@ def main():
                 )
                 inputs['hematocrit'] = st.slider(
                     'Hematocrit (%)', 
-                    min_value=15.0, 
-                    max_value=60.0, 
+                    min_value=numeric_ranges['hematocrit'][0], 
+                    max_value=numeric_ranges['hematocrit'][1], 
                     value=float(default_values['hematocrit']),
                     step=0.1,
                     format="%.1f"
                 )
                 inputs['white_blood_cell_count'] = st.slider(
                     'WBC Count (×10³/μL)', 
-                    min_value=2.0, 
-                    max_value=20.0, 
+                    min_value=numeric_ranges['white_blood_cell_count'][0], 
+                    max_value=numeric_ranges['white_blood_cell_count'][1], 
                     value=float(default_values['white_blood_cell_count']),
                     step=0.1,
                     format="%.1f",
@@ -1785,8 +2568,8 @@ def main():
             with col2:
                 inputs['red_blood_cell_count'] = st.slider(
                     'RBC Count (×10⁶/μL)', 
-                    min_value=2.0, 
-                    max_value=7.0, 
+                    min_value=numeric_ranges['red_blood_cell_count'][0], 
+                    max_value=numeric_ranges['red_blood_cell_count'][1], 
                     value=float(default_values['red_blood_cell_count']),
                     step=0.01,
                     format="%.2f",
@@ -1794,8 +2577,8 @@ def main():
                 )
                 inputs['platelet_count'] = st.slider(
                     'Platelet Count (×10³/μL)', 
-                    min_value=50.0, 
-                    max_value=600.0, 
+                    min_value=numeric_ranges['platelet_count'][0], 
+                    max_value=numeric_ranges['platelet_count'][1], 
                     value=float(default_values['platelet_count']),
                     step=1.0,
                     format="%.0f",
@@ -1807,8 +2590,8 @@ def main():
             with col1:
                 inputs['mean_corpuscular_volume'] = st.slider(
                     'MCV (fL)', 
-                    min_value=60.0, 
-                    max_value=120.0, 
+                    min_value=numeric_ranges['mean_corpuscular_volume'][0], 
+                    max_value=numeric_ranges['mean_corpuscular_volume'][1], 
                     value=float(default_values['mean_corpuscular_volume']),
                     step=0.1,
                     format="%.1f",
@@ -1816,8 +2599,8 @@ def main():
                 )
                 inputs['mean_corpuscular_hemoglobin'] = st.slider(
                     'MCH (pg)', 
-                    min_value=20.0, 
-                    max_value=40.0, 
+                    min_value=numeric_ranges['mean_corpuscular_hemoglobin'][0], 
+                    max_value=numeric_ranges['mean_corpuscular_hemoglobin'][1], 
                     value=float(default_values['mean_corpuscular_hemoglobin']),
                     step=0.1,
                     format="%.1f",
@@ -1825,8 +2608,8 @@ def main():
                 )
                 inputs['mean_corpuscular_hemoglobin_concentration'] = st.slider(
                     'MCHC (g/dL)', 
-                    min_value=25.0, 
-                    max_value=40.0, 
+                    min_value=numeric_ranges['mean_corpuscular_hemoglobin_concentration'][0], 
+                    max_value=numeric_ranges['mean_corpuscular_hemoglobin_concentration'][1], 
                     value=float(default_values['mean_corpuscular_hemoglobin_concentration']),
                     step=0.1,
                     format="%.1f",
@@ -1835,15 +2618,15 @@ def main():
             with col2:
                 inputs['creatine_phosphokinase'] = st.slider(
                     'Creatine Phosphokinase (U/L)', 
-                    min_value=10, 
-                    max_value=5000, 
+                    min_value=numeric_ranges['creatine_phosphokinase'][0], 
+                    max_value=numeric_ranges['creatine_phosphokinase'][1], 
                     value=int(default_values['creatine_phosphokinase']),
                     help="Normal: 30-200 U/L"
                 )
                 inputs['ast'] = st.slider(
                     'AST (U/L)', 
-                    min_value=5.0, 
-                    max_value=200.0, 
+                    min_value=numeric_ranges['ast'][0], 
+                    max_value=numeric_ranges['ast'][1], 
                     value=float(default_values['ast']),
                     step=0.1,
                     format="%.1f",
@@ -1851,8 +2634,8 @@ def main():
                 )
                 inputs['uric_acid'] = st.slider(
                     'Uric Acid (μmol/L)', 
-                    min_value=100.0, 
-                    max_value=600.0, 
+                    min_value=numeric_ranges['uric_acid'][0], 
+                    max_value=numeric_ranges['uric_acid'][1], 
                     value=float(default_values['uric_acid']),
                     step=0.1,
                     format="%.1f",
@@ -1878,14 +2661,25 @@ def main():
     # Auto-save inputs
     auto_save_inputs(inputs)
     
-    # Real-time risk calculation (throttled)
+    # Real-time risk calculation (sensitivity-curve preview, else background with latest inputs winning)
     if model and len(inputs) > 0:
-        st.session_state.real_time_risk = calculate_real_time_risk(inputs, model)
+        worker = get_real_time_worker(model)
+        key = patient_key(inputs)
+        if st.session_state.get('real_time_key') != key:
+            st.session_state.real_time_key = key
+            preview = preview_from_curves(inputs)
+            st.session_state.real_time_preview = preview is not None
+            if preview is not None:
+                worker.resolve(preview)
+            else:
+                worker.submit(inputs.copy())
+    with real_time_card:
+        show_real_time_risk_card()
     
     # Main content area with enhanced tabs
-    main_tab1, main_tab2, main_tab3, main_tab4, main_tab5, main_tab6 = st.tabs([
+    main_tab1, main_tab2, main_tab3, main_tab4, main_tab5, main_tab6, main_tab7 = st.tabs([
         "🎯 Analysis", "📊 Insights", "📈 Monitoring", "📄 Report", 
-        "🔄 Compare", "📜 History"
+        "🔄 Compare", "📜 History", "🗂️ Cohort"
     ])
     
     # Perform analysis if button was clicked
@@ -1893,46 +2687,28 @@ def main():
         st.session_state.analysis_inputs = inputs
         
         try:
-            # Convert inputs to DataFrame
-            input_df = pd.DataFrame([inputs])
-            
             # Loading animation with progress steps
             progress_container = st.empty()
             
             with progress_container.container():
                 st.markdown('<div class="glass-card">', unsafe_allow_html=True)
                 
-                # Progress steps
-                steps = [
-                    "🔍 Validating input data",
-                    "🧮 Preprocessing features",
-                    "🤖 Running AI model",
-                    "📊 Calculating risk scores",
-                    "💡 Generating insights"
-                ]
-                
                 progress_bar = st.progress(0)
                 status_text = st.empty()
+                stage_labels = dict(ANALYSIS_STAGES)
                 
-                for i, step in enumerate(steps):
+                def show_stage(name, index):
                     status_text.markdown(f"""
-                    <div class="progress-step {'active' if i == 0 else ''}">
-                        <span style="color: white;">{step}</span>
+                    <div class="progress-step active">
+                        <span style="color: white;">{stage_labels[name]}</span>
                     </div>
                     """, unsafe_allow_html=True)
-                    progress_bar.progress((i + 1) / len(steps))
-                    time.sleep(0.5)
-                
-                # Make prediction
-                prediction_result = predict_model(model, data=input_df)
-                prediction_label = prediction_result['prediction_label'][0]
-                prediction_score = prediction_result['prediction_score'][0]
+                    progress_bar.progress(index / len(ANALYSIS_STAGES))
                 
-                # Calculate correct angina probability
-                if prediction_label == 1:
-                    angina_probability = prediction_score
-                else:
-                    angina_probability = 1 - prediction_score
+                timer = StageTimer(on_stage=show_stage)
+                prediction_label, angina_probability, interval, feature_importance_chart, report = \
+                    run_analysis(inputs, model, timer)
+                progress_bar.progress(1.0)
                 
                 st.markdown('</div>', unsafe_allow_html=True)
             
@@ -1944,14 +2720,17 @@ def main():
             st.session_state['prediction_label'] = prediction_label
             st.session_state['angina_probability'] = angina_probability
             st.session_state['inputs'] = inputs
-            st.session_state['prediction_result'] = prediction_result
+            st.session_state['feature_importance_chart'] = feature_importance_chart
+            st.session_state['confidence_interval'] = interval
+            st.session_state['report'] = report
+            st.session_state['analysis_timings'] = timer.timings
             
             # Add to patient history
             st.session_state.patient_history.append({
                 'timestamp': datetime.now(),
                 'inputs': inputs.copy(),
                 'risk_score': angina_probability,
-                'risk_level': "HIGH" if angina_probability >= 0.7 else "MODERATE" if angina_probability >= 0.3 else "LOW"
+                'risk_level': risk_tier(angina_probability)
             })
             
             # Clear the analysis flag
@@ -1967,6 +2746,11 @@ def main():
             angina_probability = st.session_state['angina_probability']
             prediction_label = st.session_state['prediction_label']
             
+            # Inputs the model has to extrapolate from
+            range_warnings = training_range_warnings(st.session_state['inputs'], load_model_metadata(model))
+            if range_warnings:
+                st.warning("⚠️ Outside the model's training data, so treat this estimate with caution: " + "; ".join(range_warnings))
+            
             # Enhanced prediction display
             col1, col2, col3 = st.columns([1, 2, 1])
             
@@ -1998,6 +2782,21 @@ def main():
                     <p style="font-size: 1.2rem; margin: 0;">{message}</p>
                 </div>
                 """, unsafe_allow_html=True)
+                
+                # Where this risk sits in the reference cohort
+                population_index = load_population_index()
+                if population_index is not None and population_index.has_risk:
+                    risk_current = population_index.risk_matches(current_model_fingerprint())
+                    if risk_current is False:
+                        st.caption("Cohort risk comparison hidden: the population index was scored by a different "
+                                   "model. Rebuild it with: python population_index.py build cohort.csv --score")
+                    else:
+                        risk_rows = population_index.risk_percentiles(st.session_state['inputs'], angina_probability)
+                        if risk_rows:
+                            st.markdown(create_risk_percentile_html(risk_rows), unsafe_allow_html=True)
+                            if risk_current is None:
+                                st.caption("Cohort risks were not scored by this app, so they may come from "
+                                           "a different model version.")
             
             # Interactive visualizations
             st.markdown('<div class="glass-card">', unsafe_allow_html=True)
@@ -2011,18 +2810,43 @@ def main():
             
             with col2:
                 st.subheader("🎯 Risk Assessment")
-                gauge_chart = create_enhanced_gauge_chart(angina_probability)
+                gauge_chart = create_enhanced_gauge_chart(angina_probability, st.session_state.get('confidence_interval'))
                 st.plotly_chart(gauge_chart, use_container_width=True)
             
             # Feature importance
             st.subheader("🔬 AI Model Insights")
-            feature_importance_chart = create_feature_importance(st.session_state['inputs'], angina_probability)
+            feature_importance_chart = st.session_state.get('feature_importance_chart')
+            if feature_importance_chart is None:
+                feature_importance_chart = create_feature_importance(explain_patient(st.session_state['inputs'], model))
             st.plotly_chart(feature_importance_chart, use_container_width=True)
             
             # Risk timeline
             st.subheader("📈 Risk Progression & Projections")
-            timeline_chart = create_risk_timeline(angina_probability)
+            applicable = [name for name, (applies, _) in ALL_INTERVENTIONS.items() if applies(st.session_state['inputs'])]
+            default_plan = [name for name in best_combination(
+                calculate_lifestyle_impact(st.session_state['inputs'], model))['interventions']]
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                plan = st.multiselect("Interventions", applicable, default=default_plan, key="timeline_interventions")
+            with col2:
+                horizon = st.selectbox("Horizon", [12, 24, 60], format_func=lambda m: f"{m} months", key="timeline_horizon")
+            trajectory = get_risk_trajectory(st.session_state['inputs'], model, horizon, plan)
+            timeline_chart = create_risk_timeline(angina_probability, trajectory, st.session_state.patient_history)
             st.plotly_chart(timeline_chart, use_container_width=True)
+            st.caption("Projections age this patient month by month with every other input held fixed; "
+                       "historical points are your saved assessments.")
+            
+            # Optional timing panel
+            timings = st.session_state.get('analysis_timings')
+            if timings:
+                with st.expander("⏱️ Analysis Timing", expanded=False):
+                    stage_labels = dict(ANALYSIS_STAGES)
+                    timing_df = pd.DataFrame({
+                        'Stage': [stage_labels.get(name, name) for name in timings],
+                        'Time (ms)': [seconds * 1000 for seconds in timings.values()]
+                    })
+                    st.dataframe(timing_df.style.format({'Time (ms)': '{:.2f}'}), use_container_width=True, hide_index=True)
+                    st.caption(f"Total analysis time: {sum(timings.values()) * 1000:.1f} ms")
             
             st.markdown('</div>', unsafe_allow_html=True)
             
@@ -2030,6 +2854,7 @@ def main():
             # Welcome state with animation
             st.markdown('<div class="glass-card">', unsafe_allow_html=True)
             
+            lottie_loading = load_lottie_asset('loading')
             if lottie_loading:
                 col1, col2, col3 = st.columns([1, 2, 1])
                 with col2:
@@ -2056,35 +2881,101 @@ def main():
             st.markdown('<div class="glass-card">', unsafe_allow_html=True)
             st.subheader("📊 Advanced Patient Insights")
             
+            # Global model importance
+            metadata = load_model_metadata(model)
+            if metadata['gain_importance']:
+                with st.expander(f"🌐 Global Feature Importance ({metadata['num_trees']} trees)", expanded=False):
+                    st.plotly_chart(create_global_importance(metadata), use_container_width=True)
+            
             # Population comparison heatmap
             col1, col2 = st.columns([2, 1])
             
             with col1:
                 st.subheader("🌍 Population Risk Comparison")
-                heatmap = create_risk_heatmap(st.session_state['inputs'])
+                population_index = load_population_index()
+                heatmap = create_risk_heatmap(st.session_state['inputs'], population_index)
                 st.plotly_chart(heatmap, use_container_width=True)
+                if population_index is not None:
+                    st.caption(f"Reference population: {population_index.header['source']} "
+                               f"({max(population_index.count(f) for f in population_index.features):,} patients)")
             
             with col2:
                 st.subheader("💊 Medication Impact")
-                med_impact = create_medication_impact(st.session_state['inputs'])
+                med_impact = create_medication_impact(st.session_state['inputs'], model)
                 st.plotly_chart(med_impact, use_container_width=True)
             
+            # Similar patients from the reference cohort
+            st.subheader("👥 Similar Patients")
+            similar_index = load_similar_patients()
+            if similar_index is None:
+                st.info("No similar-patient index found. Build one with: python similar_patients.py build cohort.csv")
+            else:
+                n_similar = st.select_slider("Matches", [5, 10, 25, 50], value=10, key="similar_patients_k")
+                matches = get_similar_patients(st.session_state['inputs'], similar_index, n_similar)
+                summary = []
+                if similar_index.has_outcome:
+                    summary.append(f"{int(matches[OUTCOME_COLUMN].sum())} of {len(matches)} had angina")
+                if RISK_COLUMN in matches:
+                    summary.append(f"mean predicted risk {matches[RISK_COLUMN].mean():.0%}")
+                st.caption(f"Nearest {len(matches)} of {similar_index.size:,} patients in {os.path.basename(similar_index.source)}"
+                           + (" · " + ", ".join(summary) if summary else ""))
+                st.dataframe(matches.style.format({'distance': '{:.2f}', RISK_COLUMN: '{:.0%}'}, precision=1),
+                             use_container_width=True, hide_index=True)
+            
             # Lifestyle modifications
             st.subheader("🏃‍♂️ Lifestyle Modification Impact")
-            lifestyle_impacts = calculate_lifestyle_impact(st.session_state['inputs'])
+            lifestyle_grid_df = calculate_lifestyle_impact(st.session_state['inputs'], model)
+            lifestyle_impacts = single_intervention_deltas(lifestyle_grid_df)
             
             col1, col2, col3 = st.columns(3)
             for i, (intervention, impact) in enumerate(lifestyle_impacts.items()):
                 with [col1, col2, col3][i % 3]:
-                    color = "green" if impact < 0 else "gray"
                     st.markdown(f"""
                     <div class="metric-card" style="background: {'rgba(56, 239, 125, 0.2)' if impact < 0 else 'rgba(128, 128, 128, 0.2)'};">
                         <h4 style="color: white;">{intervention}</h4>
-                        <h2 style="color: white;">{abs(impact)}%</h2>
-                        <p style="color: white;">Risk Reduction</p>
+                        <h2 style="color: white;">{impact * 100:+.1f} pts</h2>
+                        <p style="color: white;">{'Risk Reduction' if impact < 0 else 'No Model-Estimated Benefit'}</p>
                     </div>
                     """, unsafe_allow_html=True)
             
+            # Combined interventions
+            best = best_combination(lifestyle_grid_df)
+            baseline = lifestyle_grid_df.loc['No change', 'probability']
+            st.markdown(f"**Best combination:** {best.name} → {best['probability']:.1%} "
+                        f"(from {baseline:.1%}, {best['delta'] * 100:+.1f} pts)")
+            with st.expander(f"📋 All {len(lifestyle_grid_df)} combinations"):
+                combos_df = lifestyle_grid_df[['n_interventions', 'probability', 'delta']].rename(columns={
+                    'n_interventions': 'Changes', 'probability': 'Risk', 'delta': 'Change'
+                })
+                st.dataframe(combos_df.style.format({'Risk': '{:.1%}', 'Change': '{:+.1%}'}), use_container_width=True)
+            
+            # Sensitivity curves
+            st.subheader("📉 Risk Sensitivity Curves")
+            curves = get_sensitivity_curves(st.session_state['inputs'], model)
+            spans = curve_span(curves)
+            selected = st.multiselect(
+                "Features", list(spans.index), default=list(spans.index[:4]),
+                format_func=lambda name: f"{name} ({spans[name] * 100:.0f} pts range)",
+                key="sensitivity_features"
+            )
+            if selected:
+                st.plotly_chart(create_sensitivity_curves(
+                    curves, st.session_state['inputs'], st.session_state['angina_probability'], selected
+                ), use_container_width=True)
+            st.caption("Each curve varies one field across its slider range with every other field held at this patient's value. "
+                       "Moving a single sidebar slider previews its risk from these curves.")
+            
+            # Variance-based sensitivity
+            st.subheader("🎲 Which Measurement Uncertainties Matter Most")
+            sobol = get_sobol_indices(st.session_state['inputs'], model, compute=False)
+            if sobol is None and st.button("Run Sobol Sensitivity Analysis", key="run_sobol"):
+                with st.spinner("Scoring the Saltelli design..."):
+                    sobol = get_sobol_indices(st.session_state['inputs'], model)
+            if sobol is not None:
+                st.plotly_chart(create_sobol_chart(sobol), use_container_width=True)
+                st.caption(f"First-order (S1) and total (ST) Sobol indices over {sobol['n_evaluations']:,} model evaluations "
+                           f"({sobol['elapsed']:.2f}s). ST − S1 is the share that comes from interactions with other inputs.")
+            
             st.markdown('</div>', unsafe_allow_html=True)
         else:
             st.info("👈 Please complete an analysis first to view detailed insights")
@@ -2173,6 +3064,34 @@ def main():
         else:
             st.info("👈 Please complete an analysis first to view monitoring recommendations")
         
+        # Input drift across every patient scored by this server
+        st.subheader("📡 Input Drift")
+        drift_monitor = get_drift_monitor()
+        n_sketched = drift_monitor.sketch.count
+        if drift_monitor.baseline is None:
+            st.info("No training baseline found. Build one with: python drift_monitor.py baseline training.csv")
+        elif n_sketched < MIN_REPORT_SAMPLES:
+            st.info(f"{n_sketched} of {MIN_REPORT_SAMPLES} predictions needed before drift statistics are meaningful")
+        else:
+            drift_report = drift_monitor.report()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Predictions Sketched", f"{n_sketched:,}")
+            col2.metric("Significant Drift", int((drift_report['status'] == 'significant').sum()))
+            col3.metric("Moderate Drift", int((drift_report['status'] == 'moderate').sum()))
+            st.plotly_chart(create_drift_chart(drift_report), use_container_width=True)
+            numeric_drift = drift_report[drift_report['kind'] == 'numeric']['feature'].tolist()
+            drift_feature = st.selectbox("Compare distribution", numeric_drift, key="drift_feature")
+            st.plotly_chart(create_drift_histogram(drift_monitor.baseline, drift_monitor.sketch, drift_feature),
+                            use_container_width=True)
+            st.caption(f"Baseline: {drift_monitor.baseline.count:,} training rows. PSI below 0.1 is stable, "
+                       "0.1-0.25 a moderate shift and above 0.25 significant; KS is the largest gap between "
+                       "the binned distributions.")
+        st.caption("Sketches every patient scored in this app, live or through the inference server. Files "
+                   "scored by batch_score.py or summarised under Cohort Analytics are not included.")
+        if n_sketched and st.button("🔄 Reset Drift Sketch"):
+            drift_monitor.reset()
+            st.rerun()
+        
         st.markdown('</div>', unsafe_allow_html=True)
     
     with main_tab4:
@@ -2180,12 +3099,14 @@ def main():
         st.subheader("📄 Comprehensive Patient Report")
         
         if 'prediction_made' in st.session_state and st.session_state['prediction_made']:
-            # Generate enhanced report
-            report = generate_enhanced_patient_report(
-                st.session_state['inputs'],
-                st.session_state['prediction_label'],
-                st.session_state['angina_probability']
-            )
+            # Enhanced report built during analysis
+            report = st.session_state.get('report')
+            if report is None:
+                report = generate_enhanced_patient_report(
+                    st.session_state['inputs'],
+                    st.session_state['prediction_label'],
+                    st.session_state['angina_probability']
+                )
             
             # Report preview with syntax highlighting
             st.markdown("**📋 Report Preview:**")
@@ -2289,6 +3210,27 @@ def main():
                     use_container_width=True
                 )
             
+            # Contribution breakdown for every compared patient
+            explanations = explain_patients(st.session_state.comparison_patients, model)
+            if all(explanation is not None for explanation in explanations):
+                st.subheader("🧬 What Drives Each Patient's Risk")
+                labels = [f"Patient {i + 1}" for i in range(len(explanations))]
+                st.plotly_chart(create_contribution_stack(explanations, labels), use_container_width=True)
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    patient_a = st.selectbox("Patient A", range(len(labels)), index=1,
+                                             format_func=lambda i: labels[i], key="diff_patient_a")
+                with col2:
+                    patient_b = st.selectbox("Patient B", range(len(labels)), index=0,
+                                             format_func=lambda i: labels[i], key="diff_patient_b")
+                if patient_a != patient_b:
+                    st.plotly_chart(create_contribution_difference(
+                        explanations[patient_a], explanations[patient_b], labels[patient_a], labels[patient_b]
+                    ), use_container_width=True)
+                else:
+                    st.info("Select two different patients to see what drives the difference")
+            
             # Clear comparison
             if st.button("🗑️ Clear Comparison"):
                 st.session_state.comparison_patients = []
@@ -2338,6 +3280,18 @@ def main():
             
             st.plotly_chart(fig, use_container_width=True)
             
+            # Contribution breakdown across assessments
+            explanations = explain_patients([h['inputs'] for h in st.session_state.patient_history], model)
+            if all(explanation is not None for explanation in explanations):
+                st.subheader("🧬 Risk Drivers Over Time")
+                labels = [f"#{i + 1} {h['timestamp'].strftime('%m-%d %H:%M')}"
+                          for i, h in enumerate(st.session_state.patient_history)]
+                st.plotly_chart(create_contribution_stack(explanations, labels), use_container_width=True)
+                if len(explanations) >= 2:
+                    st.plotly_chart(create_contribution_difference(
+                        explanations[-1], explanations[-2], labels[-1], labels[-2]
+                    ), use_container_width=True)
+            
             # History details
             st.subheader("📋 Assessment Details")
             
@@ -2390,6 +3344,56 @@ def main():
             st.info("No assessment history available yet. Complete an analysis to start building history.")
         
         st.markdown('</div>', unsafe_allow_html=True)
+    
+    with main_tab7:
+        st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+        st.subheader("🗂️ Cohort Analytics")
+        st.caption("Streams a CSV/Parquet extract from disk chunk by chunk and keeps only fixed-size aggregates, "
+                   "so registry files larger than memory can be summarised. Files already scored by "
+                   "batch_score.py are not rescored.")
+        
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            cohort_path = st.text_input("Cohort file path (.csv or .parquet)", key="cohort_path")
+        with col2:
+            cohort_chunk_size = st.selectbox("Chunk size", [10000, 50000, 200000], index=1, key="cohort_chunk_size")
+        
+        dashboard = st.empty()
+        if st.button("▶️ Analyze Cohort", disabled=not cohort_path):
+            if not os.path.exists(cohort_path):
+                st.error(f"❌ File not found: {cohort_path}")
+            else:
+                try:
+                    total_rows = cohort_row_count(cohort_path)
+                    progress_bar = st.progress(0.0)
+                    start = last_refresh = time.perf_counter()
+                    aggregate = None
+                    for aggregate in stream_cohort(cohort_path, get_frame_scorer(model), cohort_chunk_size):
+                        if total_rows:
+                            progress_bar.progress(min(aggregate.rows / total_rows, 1.0))
+                        if time.perf_counter() - last_refresh >= COHORT_REFRESH_SECONDS:
+                            show_cohort_progress(dashboard, aggregate, time.perf_counter() - start, total_rows)
+                            last_refresh = time.perf_counter()
+                    progress_bar.empty()
+                    if aggregate is not None:
+                        st.session_state['cohort_aggregate'] = aggregate
+                        st.session_state['cohort_elapsed'] = time.perf_counter() - start
+                except Exception as e:
+                    st.error(f"❌ Error during cohort analysis: {str(e)}")
+        
+        aggregate = st.session_state.get('cohort_aggregate')
+        if aggregate is not None:
+            show_cohort_progress(dashboard, aggregate, st.session_state['cohort_elapsed'], final=True)
+            feature = st.selectbox("Input distribution", list(NUMERIC_RANGES), key="cohort_histogram_feature")
+            st.plotly_chart(create_cohort_histogram(aggregate, feature), use_container_width=True)
+            st.download_button(
+                label="📥 Download Cohort Summary (JSON)",
+                data=json.dumps(aggregate.to_dict(), indent=2),
+                file_name=f"cohort_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                mime="application/json"
+            )
+        
+        st.markdown('</div>', unsafe_allow_html=True)
 
 # Enhanced Information Section
 with st.expander("ℹ️ About CardioPredict AI Pro - Enhanced Version"):
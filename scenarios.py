@@ -0,0 +1,561 @@
+# scenarios.py
+"""Model-driven what-if scenarios for a single patient.
+
+Each scenario is a transformation of the 40-field input vector; every variant
+of a patient is scored together through one batched model call
+(fast_inference.score_patients), so the UI never loops over predict calls.
+"""
+import itertools
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from fast_inference import (BOOLEAN_FEATURES, CATEGORICAL_LEVELS, INPUT_FEATURES, MODERATE_RISK_THRESHOLD, NUMERIC_RANGES,
+                            patient_key)
+
+ScoreMany = Callable[[List[Dict]], np.ndarray]
+ScoreFrame = Callable[[pd.DataFrame], np.ndarray]
+
+SMOKER_LEVELS = ('light smoker', 'moderate smoker', 'heavy smoker')
+
+
+def clip_to_range(name: str, value: float) -> float:
+    """Clamp a numeric field to its sidebar range"""
+    low, high = NUMERIC_RANGES[name]
+    return float(min(max(value, low), high))
+
+
+def _scale(patient: Dict, name: str, factor: float):
+    patient[name] = clip_to_range(name, float(patient[name]) * factor)
+
+
+def _shift(patient: Dict, name: str, delta: float):
+    patient[name] = clip_to_range(name, float(patient[name]) + delta)
+
+
+def _sync_cholesterol_ratio(patient: Dict):
+    """Keep the derived total/HDL ratio consistent after lipid changes"""
+    if float(patient['hdl']) > 0:
+        patient['Cholesterol_HDL_Ratio'] = clip_to_range(
+            'Cholesterol_HDL_Ratio', float(patient['total_cholesterol']) / float(patient['hdl']))
+
+
+# Lifestyle interventions: (applies to patient?, in-place transformation)
+def _quit_smoking(patient: Dict):
+    patient['smoking_status'] = 'ex-smoker'
+
+
+def _exercise(patient: Dict):
+    patient['physical_activity'] = 'high'
+
+
+def _mediterranean_diet(patient: Dict):
+    _scale(patient, 'ldl', 0.90)
+    _scale(patient, 'total_cholesterol', 0.95)
+    _scale(patient, 'triglyceride', 0.90)
+    _sync_cholesterol_ratio(patient)
+
+
+def _weight_loss(patient: Dict):
+    _scale(patient, 'BMI', 0.90)
+
+
+def _stress_management(patient: Dict):
+    _shift(patient, 'mean_sbp', -4)
+    _shift(patient, 'mean_dbp', -2)
+    _shift(patient, 'mean_heart_rate', -3)
+
+
+def _sleep_optimization(patient: Dict):
+    _shift(patient, 'mean_sbp', -2)
+    _shift(patient, 'mean_heart_rate', -2)
+
+
+LIFESTYLE_INTERVENTIONS = {
+    'Quit Smoking': (lambda p: p['smoking_status'] in SMOKER_LEVELS, _quit_smoking),
+    'Exercise 150min/week': (lambda p: p['physical_activity'] != 'high', _exercise),
+    'Mediterranean Diet': (lambda p: True, _mediterranean_diet),
+    'Weight Loss (10%)': (lambda p: float(p['BMI']) > 25, _weight_loss),
+    'Stress Management': (lambda p: True, _stress_management),
+    'Sleep Optimization': (lambda p: True, _sleep_optimization)
+}
+
+
+# Medications as parameterised effects on model inputs: field -> ('scale' | 'shift' | 'set', amount)
+MEDICATIONS = {
+    'Statins': {'ldl': ('scale', 0.70), 'total_cholesterol': ('scale', 0.75), 'chol_lowering': ('set', 1)},
+    'ACE Inhibitors': {'mean_sbp': ('shift', -10), 'mean_dbp': ('shift', -5), 'treated_hypertension': ('set', 1)},
+    'Beta Blockers': {'mean_heart_rate': ('shift', -15), 'mean_sbp': ('shift', -5), 'treated_hypertension': ('set', 1)},
+    'Metformin': {'hba1c': ('scale', 0.90), 'random_glucose': ('scale', 0.80), 'glucose': ('scale', 0.80)}
+}
+
+MEDICATION_INDICATIONS = {
+    'Statins': lambda p: not p['chol_lowering'],
+    'ACE Inhibitors': lambda p: True,
+    'Beta Blockers': lambda p: True,
+    'Metformin': lambda p: p['diabetes_status'] == 'Type 2 Diabetes' or float(p['hba1c']) >= 42
+}
+
+_EFFECTS = {'scale': _scale, 'shift': _shift}
+
+
+def medication_transform(effects: Dict) -> Callable[[Dict], None]:
+    """In-place transformation applying a medication's effects to a patient"""
+    def transform(patient: Dict):
+        for name, (kind, amount) in effects.items():
+            if kind == 'set':
+                patient[name] = amount
+            else:
+                _EFFECTS[kind](patient, name, amount)
+        if 'total_cholesterol' in effects or 'hdl' in effects:
+            _sync_cholesterol_ratio(patient)
+    return transform
+
+
+MEDICATION_INTERVENTIONS = {
+    name: (MEDICATION_INDICATIONS[name], medication_transform(effects)) for name, effects in MEDICATIONS.items()
+}
+
+
+def apply_interventions(inputs: Dict, names: Sequence[str], interventions: Dict = LIFESTYLE_INTERVENTIONS) -> Dict:
+    """Copy of inputs with the named interventions applied in order"""
+    patient = dict(inputs)
+    for name in names:
+        applies, transform = interventions[name]
+        if applies(patient):
+            transform(patient)
+    return patient
+
+
+def intervention_grid(inputs: Dict, score_many: ScoreMany,
+                      interventions: Dict = LIFESTYLE_INTERVENTIONS) -> pd.DataFrame:
+    """Model risk for every combination of the interventions that apply to this patient.
+
+    All 2^k variants (k = applicable interventions, baseline included) are scored
+    in a single score_many call. Rows are sorted by risk; 'delta' is the change
+    in probability against the unchanged patient.
+    """
+    applicable = [name for name, (applies, _) in interventions.items() if applies(inputs)]
+    combos = [combo for r in range(len(applicable) + 1) for combo in itertools.combinations(applicable, r)]
+    patients = [apply_interventions(inputs, combo, interventions) for combo in combos]
+
+    probabilities = np.asarray(score_many(patients), dtype=np.float64)
+    grid = pd.DataFrame({
+        'interventions': combos,
+        'n_interventions': [len(combo) for combo in combos],
+        'probability': probabilities,
+        'delta': probabilities - probabilities[0]
+    })
+    grid.index = [' + '.join(combo) or 'No change' for combo in combos]
+    return grid.sort_values(['probability', 'n_interventions'])
+
+
+def lifestyle_grid(inputs: Dict, score_many: ScoreMany) -> pd.DataFrame:
+    """intervention_grid over the lifestyle interventions"""
+    return intervention_grid(inputs, score_many, LIFESTYLE_INTERVENTIONS)
+
+
+def medication_grid(inputs: Dict, score_many: ScoreMany) -> pd.DataFrame:
+    """intervention_grid over every regimen of the medications that apply"""
+    return intervention_grid(inputs, score_many, MEDICATION_INTERVENTIONS)
+
+
+def single_intervention_deltas(grid: pd.DataFrame, interventions: Dict = LIFESTYLE_INTERVENTIONS) -> Dict[str, float]:
+    """Risk change of each intervention on its own (0 when it does not apply)"""
+    singles = grid[grid['n_interventions'] == 1]
+    deltas = {combo[0]: delta for combo, delta in zip(singles['interventions'], singles['delta'])}
+    return {name: float(deltas.get(name, 0.0)) for name in interventions}
+
+
+def best_combination(grid: pd.DataFrame, max_interventions: Optional[int] = None) -> pd.Series:
+    """Lowest-risk row of the grid, optionally limited to a number of interventions"""
+    if max_interventions is not None:
+        grid = grid[grid['n_interventions'] <= max_interventions]
+    return grid.iloc[0]
+
+
+ALL_INTERVENTIONS = {**LIFESTYLE_INTERVENTIONS, **MEDICATION_INTERVENTIONS}
+
+
+def age_patient(inputs: Dict, months: float) -> Dict:
+    """Copy of inputs with age advanced by a number of months (other fields held fixed)"""
+    patient = dict(inputs)
+    patient['age'] = clip_to_range('age', float(inputs['age']) + months / 12.0)
+    return patient
+
+
+def risk_trajectory(inputs: Dict, score_many: ScoreMany, months: int = 12,
+                    interventions: Sequence[str] = (), catalogue: Dict = ALL_INTERVENTIONS) -> pd.DataFrame:
+    """Month-by-month risk as the patient ages, with and without the chosen interventions.
+
+    Both paths (months + 1 steps each, month 0 = today) are scored in one
+    score_many call. Returns a frame indexed by month offset with 'without'
+    and 'with' probability columns.
+    """
+    treated = apply_interventions(inputs, interventions, catalogue)
+    steps = range(months + 1)
+    patients = [age_patient(inputs, m) for m in steps] + [age_patient(treated, m) for m in steps]
+    probabilities = np.asarray(score_many(patients), dtype=np.float64)
+    return pd.DataFrame({
+        'without': probabilities[:months + 1],
+        'with': probabilities[months + 1:]
+    }, index=pd.Index(steps, name='month'))
+
+
+def feature_grid(name: str, n_points: int = 50) -> np.ndarray:
+    """Values to sweep for one field: n_points across a numeric range, else every level"""
+    if name in NUMERIC_RANGES:
+        low, high = NUMERIC_RANGES[name]
+        values = np.linspace(low, high, n_points)
+        return np.unique(np.round(values)) if isinstance(low, int) else values
+    if name in CATEGORICAL_LEVELS:
+        return np.array(CATEGORICAL_LEVELS[name], dtype=object)
+    return np.array([False, True])
+
+
+def sensitivity_curves(inputs: Dict, score_frame: ScoreFrame, n_points: int = 50,
+                       features: Optional[Sequence[str]] = None) -> Dict[str, pd.Series]:
+    """Risk as each field sweeps its grid with every other field held at the patient's value.
+
+    The sweeps for all fields are stacked into one DataFrame and scored in a
+    single score_frame call. Each curve is a Series of probabilities indexed
+    by the swept values.
+    """
+    features = list(features or INPUT_FEATURES)
+    grids = {name: feature_grid(name, n_points) for name in features}
+    n_rows = sum(len(grid) for grid in grids.values())
+
+    columns = {}
+    for name in INPUT_FEATURES:
+        value = inputs[name]
+        columns[name] = np.array([value] * n_rows, dtype=object if isinstance(value, str) else None)
+    offsets = {}
+    start = 0
+    for name, grid in grids.items():
+        offsets[name] = start
+        if name in BOOLEAN_FEATURES or name in CATEGORICAL_LEVELS:
+            columns[name] = columns[name].astype(object)
+        elif columns[name].dtype.kind in 'iub':
+            columns[name] = columns[name].astype(np.float64)
+        columns[name][start:start + len(grid)] = grid
+        start += len(grid)
+
+    probabilities = np.asarray(score_frame(pd.DataFrame(columns)), dtype=np.float64)
+    return {
+        name: pd.Series(probabilities[offsets[name]:offsets[name] + len(grid)], index=grid, name=name)
+        for name, grid in grids.items()
+    }
+
+
+def curve_value(curves: Dict[str, pd.Series], name: str, value) -> Optional[float]:
+    """Risk at the sensitivity-curve grid point nearest to value, None if off the curve.
+
+    The model is piecewise constant, so interpolating between grid points
+    would report risks it never outputs; the nearest evaluated point is exact
+    on the grid and an approximation between points.
+    """
+    curve = curves.get(name)
+    if curve is None:
+        return None
+    if name in NUMERIC_RANGES:
+        grid = curve.index.to_numpy(dtype=np.float64)
+        value = float(value)
+        if not grid[0] <= value <= grid[-1]:
+            return None
+        return float(curve.iloc[int(np.argmin(np.abs(grid - value)))])
+    if name in BOOLEAN_FEATURES:
+        value = bool(value)
+    matches = curve[curve.index == value]
+    return float(matches.iloc[0]) if len(matches) else None
+
+
+def curve_span(curves: Dict[str, pd.Series]) -> pd.Series:
+    """Max minus min risk along each curve, most sensitive field first"""
+    return pd.Series({name: float(curve.max() - curve.min()) for name, curve in curves.items()}).sort_values(ascending=False)
+
+
+# Measurement noise: ('sd', absolute SD) for vitals, ('cv', coefficient of variation) for labs and BMI
+MEASUREMENT_NOISE = {
+    'mean_sbp': ('sd', 5.0),
+    'mean_dbp': ('sd', 3.5),
+    'mean_heart_rate': ('sd', 4.0),
+    'BMI': ('cv', 0.02),
+    'hba1c': ('cv', 0.03),
+    'random_glucose': ('cv', 0.10),
+    'glucose': ('cv', 0.05),
+    'total_cholesterol': ('cv', 0.05),
+    'hdl': ('cv', 0.06),
+    'ldl': ('cv', 0.07),
+    'triglyceride': ('cv', 0.10),
+    'creatinine': ('cv', 0.05),
+    'blood_urea_nitrogen': ('cv', 0.08),
+    'sodium': ('cv', 0.01),
+    'potassium': ('cv', 0.04),
+    'hemoglobin': ('cv', 0.03),
+    'hematocrit': ('cv', 0.03),
+    'mean_corpuscular_volume': ('cv', 0.015),
+    'mean_corpuscular_hemoglobin': ('cv', 0.015),
+    'mean_corpuscular_hemoglobin_concentration': ('cv', 0.02),
+    'white_blood_cell_count': ('cv', 0.08),
+    'red_blood_cell_count': ('cv', 0.03),
+    'platelet_count': ('cv', 0.06),
+    'creatine_phosphokinase': ('cv', 0.15),
+    'ast': ('cv', 0.08),
+    'uric_acid': ('cv', 0.06)
+}
+
+
+def _noise_frame(inputs: Dict, z: np.ndarray, fields: Sequence[str]) -> pd.DataFrame:
+    """Patient copies with standard-normal draws z[:, j] applied as noise to fields[j].
+
+    Noise is centred on the patient's own value, even outside the sidebar
+    ranges, and only clipped at zero; clipping to the ranges would describe a
+    different patient and pile samples up at the range edges.
+    """
+    n_samples = len(z)
+    columns = {name: np.full(n_samples, inputs[name], dtype=object if isinstance(inputs[name], str) else None)
+               for name in INPUT_FEATURES}
+    for j, name in enumerate(fields):
+        kind, scale = MEASUREMENT_NOISE[name]
+        value = float(inputs[name])
+        samples = value + scale * z[:, j] if kind == 'sd' else value * (1.0 + scale * z[:, j])
+        columns[name] = np.maximum(samples, 0.0)
+    # The ratio is derived from the measured lipids, so it follows their relative noise
+    total, hdl = float(inputs['total_cholesterol']), float(inputs['hdl'])
+    if ('total_cholesterol' in fields or 'hdl' in fields) and total > 0 and hdl > 0:
+        with np.errstate(divide='ignore'):
+            change = ((columns['total_cholesterol'].astype(np.float64) / total)
+                      / (columns['hdl'].astype(np.float64) / hdl))
+        columns['Cholesterol_HDL_Ratio'] = float(inputs['Cholesterol_HDL_Ratio']) * change
+    return pd.DataFrame(columns)
+
+
+def perturbed_frame(inputs: Dict, n_samples: int, rng: np.random.Generator) -> pd.DataFrame:
+    """n_samples copies of the patient with measurement noise on every vital and lab"""
+    fields = list(MEASUREMENT_NOISE)
+    return _noise_frame(inputs, rng.standard_normal((len(fields), n_samples)).T, fields)
+
+
+def confidence_interval(inputs: Dict, score_frame: ScoreFrame, level: float = 0.90,
+                        budget: float = 0.15, min_samples: int = 256, max_samples: int = 20000) -> Dict:
+    """Monte Carlo percentile interval of the risk under measurement noise.
+
+    A pilot batch of min_samples times the scorer; further batches are sized
+    from the measured throughput to fill the latency budget (seconds), up to
+    max_samples. Sampling is seeded from the patient hash, so a given sample
+    count always reproduces the same interval.
+    """
+    rng = np.random.default_rng(int(patient_key(inputs)[:16], 16))
+    start = time.perf_counter()
+    batches = []
+    batch_size = min_samples
+    while True:
+        batch_start = time.perf_counter()
+        batches.append(np.asarray(score_frame(perturbed_frame(inputs, batch_size, rng)), dtype=np.float64))
+        n_scored = sum(len(batch) for batch in batches)
+        per_sample = (time.perf_counter() - batch_start) / batch_size
+        remaining = budget - (time.perf_counter() - start)
+        batch_size = min(max_samples - n_scored, int(0.9 * remaining / max(per_sample, 1e-9)))
+        if batch_size < min_samples // 4:
+            break
+    probabilities = np.concatenate(batches)
+
+    tail = (1.0 - level) / 2.0 * 100
+    low, median, high = np.percentile(probabilities, [tail, 50, 100 - tail])
+    return {
+        'level': level,
+        'low': float(low),
+        'median': float(median),
+        'high': float(high),
+        'std': float(probabilities.std()),
+        'n_samples': len(probabilities),
+        'elapsed': time.perf_counter() - start
+    }
+
+
+# Counterfactual levers: field -> candidate target values for this patient, mildest change first
+COUNTERFACTUAL_LEVERS = {
+    'smoking_status': lambda p: ['ex-smoker'] if p['smoking_status'] in SMOKER_LEVELS else [],
+    'physical_activity': lambda p: {'low': ['moderate', 'high'], 'moderate': ['high']}.get(p['physical_activity'], []),
+    'BMI': lambda p: [round(float(p['BMI']) * (1 - f), 1) for f in (0.05, 0.10, 0.15, 0.20)
+                      if float(p['BMI']) * (1 - f) >= 22.0],
+    'mean_sbp': lambda p: [target for target in (140, 130, 120) if target < float(p['mean_sbp'])],
+    'ldl': lambda p: [target for target in (3.0, 2.6, 1.8) if target < float(p['ldl'])],
+    'hba1c': lambda p: [target for target in (53, 48, 42) if target < float(p['hba1c'])]
+}
+
+
+def _set_lever(patient: Dict, name: str, value):
+    """Set one lever, keeping total cholesterol and the ratio consistent with LDL"""
+    if name == 'ldl':
+        drop = float(patient['ldl']) - float(value)
+        patient['total_cholesterol'] = clip_to_range('total_cholesterol', float(patient['total_cholesterol']) - drop)
+        patient['ldl'] = value
+        _sync_cholesterol_ratio(patient)
+    else:
+        patient[name] = value
+
+
+def _counterfactual(inputs: Dict, changes: Dict) -> Dict:
+    patient = dict(inputs)
+    for name, value in changes.items():
+        _set_lever(patient, name, value)
+    return patient
+
+
+def counterfactual_search(inputs: Dict, score_many: ScoreMany, threshold: float = MODERATE_RISK_THRESHOLD,
+                          budget: float = 1.0, levers: Dict = COUNTERFACTUAL_LEVERS) -> Dict:
+    """Smallest set of modifiable-input changes that brings the risk below threshold.
+
+    Searches lever subsets by size (1 lever, then 2, ...) and stops at the first
+    size with a solution. Within a size, every subset is first scored with each
+    lever at its strongest setting; subsets that still miss the threshold are
+    pruned (a heuristic, trees are not guaranteed monotone) and the survivors'
+    full option grids go through one batched score_many call. Among solutions
+    the mildest total change wins. The search also stops once budget seconds
+    have passed.
+
+    Returns a dict with 'reached', 'changes' (field -> (from, to)), 'probability',
+    'n_scored' and 'elapsed'; when nothing reaches the threshold, 'changes' holds
+    the lowest-risk strongest-setting candidate that was scored.
+    """
+    start = time.perf_counter()
+    options = {name: candidates(inputs) for name, candidates in levers.items()}
+    options = {name: values for name, values in options.items() if values}
+    names = list(options)
+    n_scored = 0
+    best = None
+
+    def result(reached, changes, probability):
+        return {
+            'reached': reached,
+            'changes': {name: (inputs[name], value) for name, value in changes.items()},
+            'probability': float(probability),
+            'n_scored': n_scored,
+            'elapsed': time.perf_counter() - start
+        }
+
+    for size in range(1, len(names) + 1):
+        subsets = list(itertools.combinations(names, size))
+        strongest = [{name: options[name][-1] for name in subset} for subset in subsets]
+        probabilities = np.asarray(score_many([_counterfactual(inputs, c) for c in strongest]), dtype=np.float64)
+        n_scored += len(subsets)
+        i = int(np.argmin(probabilities))
+        if best is None or probabilities[i] < best[1]:
+            best = (strongest[i], probabilities[i])
+
+        survivors = [subset for subset, p in zip(subsets, probabilities) if p < threshold]
+        if not survivors:
+            if time.perf_counter() - start > budget:
+                break
+            continue
+
+        candidates, efforts = [], []
+        for subset in survivors:
+            for picks in itertools.product(*(range(len(options[name])) for name in subset)):
+                candidates.append({name: options[name][k] for name, k in zip(subset, picks)})
+                efforts.append(sum((k + 1) / len(options[name]) for name, k in zip(subset, picks)))
+        probabilities = np.asarray(score_many([_counterfactual(inputs, c) for c in candidates]), dtype=np.float64)
+        n_scored += len(candidates)
+        reached = [(efforts[j], probabilities[j], j) for j in np.flatnonzero(probabilities < threshold)]
+        effort, probability, j = min(reached)
+        return result(True, candidates[j], probability)
+
+    if best is None:
+        return result(False, {}, np.nan)
+    return result(False, best[0], best[1])
+
+
+_worker_score_frame: Optional[ScoreFrame] = None
+
+
+def _init_scoring_worker(score_frame: ScoreFrame):
+    global _worker_score_frame
+    _worker_score_frame = score_frame
+
+
+def _score_in_worker(frame: pd.DataFrame) -> np.ndarray:
+    return np.asarray(_worker_score_frame(frame), dtype=np.float64)
+
+
+class ScoringPool:
+    """Persistent process pool whose workers each hold one copy of score_frame.
+
+    score_frame (e.g. FastRiskScorer.predict_frame) is pickled once per worker
+    by the initializer instead of once per task, and workers are spawned
+    rather than forked, which is safe from a threaded server.
+    """
+
+    def __init__(self, score_frame: ScoreFrame, processes: int):
+        self.processes = processes
+        self._executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_scoring_worker, initargs=(score_frame,))
+
+    def map(self, frames: List[pd.DataFrame]) -> np.ndarray:
+        return np.concatenate(list(self._executor.map(_score_in_worker, frames)))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _score_chunks(score_frame: ScoreFrame, frames: List[pd.DataFrame], pool: Optional[ScoringPool]) -> np.ndarray:
+    """Score frames across the pool when there is one, else (or if a worker died) in-process"""
+    if pool is not None and len(frames) > 1:
+        try:
+            return pool.map(frames)
+        except BrokenProcessPool:
+            pass
+    return np.concatenate([np.asarray(score_frame(frame), dtype=np.float64) for frame in frames])
+
+
+def sobol_indices(inputs: Dict, score_frame: ScoreFrame, n_base: int = 1024, chunk_size: int = 32768,
+                  pool: Optional[ScoringPool] = None) -> Dict:
+    """First-order and total Sobol indices of the risk over measurement-noise inputs.
+
+    Saltelli design: base matrices A and B (n_base x d standard-normal draws
+    mapped through MEASUREMENT_NOISE) plus one AB_i per input with column i
+    taken from B, n_base * (d + 2) evaluations in all. These are scored in
+    chunks of at most chunk_size rows, optionally across a persistent
+    ScoringPool built around the same scorer, in which case the design is
+    split into at least one chunk per worker. First-order indices use the Saltelli 2010
+    estimator and total indices Jansen's.
+    """
+    start = time.perf_counter()
+    fields = list(MEASUREMENT_NOISE)
+    d = len(fields)
+    rng = np.random.default_rng(int(patient_key(inputs)[:16], 16))
+    A = rng.standard_normal((n_base, d))
+    B = rng.standard_normal((n_base, d))
+    blocks = [A, B]
+    for i in range(d):
+        AB = A.copy()
+        AB[:, i] = B[:, i]
+        blocks.append(AB)
+    design = np.vstack(blocks)
+
+    if pool is not None:
+        # At least one chunk per worker, or a design smaller than chunk_size never leaves this process
+        chunk_size = min(chunk_size, math.ceil(len(design) / pool.processes))
+    frames = [_noise_frame(inputs, design[lo:lo + chunk_size], fields) for lo in range(0, len(design), chunk_size)]
+    y = _score_chunks(score_frame, frames, pool).reshape(d + 2, n_base)
+    f_A, f_B, f_AB = y[0], y[1], y[2:]
+
+    variance = float(np.var(np.concatenate([f_A, f_B])))
+    if variance <= 0:
+        first_order = total = np.zeros(d)
+    else:
+        first_order = (f_B * (f_AB - f_A)).mean(axis=1) / variance
+        total = 0.5 * ((f_A - f_AB) ** 2).mean(axis=1) / variance
+    indices = pd.DataFrame({'S1': first_order, 'ST': total}, index=pd.Index(fields, name='feature'))
+    return {
+        'indices': indices.sort_values('ST', ascending=False),
+        'variance': variance,
+        'n_evaluations': len(design),
+        'elapsed': time.perf_counter() - start
+    }
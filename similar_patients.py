@@ -0,0 +1,243 @@
+# similar_patients.py
+"""Nearest-neighbour search for similar patients in a reference cohort.
+
+Patients are embedded as standardized numeric inputs (cohort mean/SD),
+one-hot categoricals scaled so a mismatch costs the same as one SD, and 0/1
+flags. The build streams the cohort twice (statistics, then encoding into a
+preallocated float32 matrix) and persists the matrix with its squared row
+norms, the encoding spec and the columns shown for each match, all as plain
+arrays; the app memory-maps them and only queries them.
+
+Queries are an exact brute-force scan: one float32 matrix-vector product over
+the cohort shortlists candidates, and every row whose float32 score is within
+the worst-case rounding error of the k-th best float64 distance is re-ranked
+in float64, so near-ties are never lost to float32. Each query reads the whole
+matrix, so latency grows linearly with the cohort: about 60 ms per query at
+1M patients x 55 dimensions on one core, which suits interactive use up to a
+few million patients but not much beyond.
+
+Usage:
+    python similar_patients.py build cohort.parquet --output similar_patients.joblib --id-column patient_id
+    python similar_patients.py query similar_patients.joblib -k 5
+"""
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from batch_score import iter_chunks
+from fast_inference import BOOLEAN_FEATURES, CATEGORICAL_LEVELS, NUMERIC_RANGES, REFERENCE_PATIENT
+
+INDEX_PATH = 'similar_patients.joblib'
+INDEX_FORMAT_VERSION = 3
+OUTCOME_COLUMN = 'angina'
+RISK_COLUMN = 'angina_probability'
+DISPLAY_COLUMNS = ['age', 'sex', 'ethnic', 'BMI', 'smoking_status', 'diabetes_status', 'mean_sbp', 'ldl', 'hba1c']
+# Candidates first re-ranked in float64 per requested neighbour (more join them when within rounding error)
+RERANK_FACTOR = 4
+
+# A categorical mismatch differs in two one-hot columns, so each gets 1/sqrt(2)
+_ONE_HOT_SCALE = 1 / np.sqrt(2)
+
+
+def _numeric(values) -> np.ndarray:
+    return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def fit_encoding(input_path: str, chunk_size: int = 200000) -> Dict:
+    """Cohort row count and per-field mean/SD, accumulated chunk by chunk"""
+    names = list(NUMERIC_RANGES)
+    count = np.zeros(len(names))
+    total = np.zeros(len(names))
+    total_sq = np.zeros(len(names))
+    rows = 0
+    for chunk in iter_chunks(input_path, chunk_size):
+        rows += len(chunk)
+        for i, name in enumerate(names):
+            if name in chunk:
+                values = _numeric(chunk[name])
+                values = values[~np.isnan(values)]
+                count[i] += len(values)
+                total[i] += values.sum()
+                total_sq[i] += np.square(values).sum()
+    mean = total / np.maximum(count, 1)
+    std = np.sqrt(np.maximum(total_sq / np.maximum(count, 1) - np.square(mean), 0))
+    return {
+        'rows': rows,
+        'numeric': {name: [float(m), float(s) if s > 0 else 1.0] for name, m, s in zip(names, mean, std)},
+        'categorical': {name: list(levels) for name, levels in CATEGORICAL_LEVELS.items()},
+        'boolean': list(BOOLEAN_FEATURES)
+    }
+
+
+def encode(frame: pd.DataFrame, spec: Dict) -> np.ndarray:
+    """Embed rows of input fields; missing numerics sit at the cohort mean, unknown levels at the origin"""
+    blocks = []
+    for name, (mean, std) in spec['numeric'].items():
+        values = _numeric(frame[name]) if name in frame else np.full(len(frame), mean)
+        blocks.append(np.nan_to_num((values - mean) / std)[:, None])
+    for name, levels in spec['categorical'].items():
+        values = frame[name].to_numpy() if name in frame else np.full(len(frame), None)
+        blocks.append((values[:, None] == np.asarray(levels, dtype=object)[None, :]) * _ONE_HOT_SCALE)
+    for name in spec['boolean']:
+        values = _numeric(frame[name]) if name in frame else np.zeros(len(frame))
+        blocks.append(np.nan_to_num(values)[:, None])
+    return np.hstack(blocks).astype(np.float32)
+
+
+def _column_arrays(frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Display columns as arrays joblib can memory-map: numbers as they are, text as fixed-width strings"""
+    columns = {}
+    for name in frame.columns:
+        values = frame[name]
+        if pd.api.types.is_numeric_dtype(values):
+            columns[name] = values.to_numpy()
+        else:
+            # Missing text is stored as '' and read back as None
+            columns[name] = values.where(values.notna(), '').astype(str).to_numpy(dtype=str)
+    return columns
+
+
+def _rows_frame(columns: Dict[str, np.ndarray], rows: np.ndarray) -> pd.DataFrame:
+    """The given rows of the display columns as a DataFrame"""
+    frame = {}
+    for name, values in columns.items():
+        picked = values[rows]
+        if picked.dtype.kind == 'U':
+            picked = np.where(picked == '', None, picked.astype(object))
+        frame[name] = picked
+    return pd.DataFrame(frame)
+
+
+def _float32_error_bound(dims: int, max_sq_norm: float, query_norm: float) -> float:
+    """Worst-case float32 rounding error of |x|^2 - 2 x.q for any cohort row x (Higham's gamma_n bound)"""
+    gamma = (dims + 4) * np.finfo(np.float32).eps
+    return 2.0 * gamma * (max_sq_norm + 2.0 * np.sqrt(max_sq_norm) * query_norm)
+
+
+class SimilarPatientIndex:
+    """Exact nearest-neighbour search over the embedded reference cohort"""
+
+    def __init__(self, spec: Dict, points: np.ndarray, columns: Dict[str, np.ndarray], source: str = '',
+                 sq_norms: Optional[np.ndarray] = None):
+        self.spec = spec
+        self.points = points
+        self.sq_norms = sq_norms if sq_norms is not None else np.einsum('ij,ij->i', points, points)
+        self.max_sq_norm = float(self.sq_norms.max()) if len(self.sq_norms) else 0.0
+        self.columns = columns
+        self.source = source
+
+    @property
+    def size(self) -> int:
+        return len(self.points)
+
+    @property
+    def has_outcome(self) -> bool:
+        return OUTCOME_COLUMN in self.columns
+
+    def nearest(self, point: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(distances, rows) of the k cohort points closest to one embedded point, closest first"""
+        k = min(k, self.size)
+        point = np.asarray(point, dtype=np.float32).ravel()
+        # |x - q|^2 up to the constant |q|^2, in float32 and in place; candidates are re-ranked exactly below
+        approximate = self.points @ point
+        approximate *= -2.0
+        approximate += self.sq_norms
+        n_candidates = min(self.size, k * RERANK_FACTOR)
+        candidates = np.argpartition(approximate, n_candidates - 1)[:n_candidates]
+        sq_distances = self._sq_distances(point, candidates)
+        if n_candidates < self.size:
+            # Any row that could beat the k-th shortlisted distance scores within the rounding bound of it
+            query_sq_norm = float(np.dot(point.astype(np.float64), point))
+            kth = np.partition(sq_distances, k - 1)[k - 1]
+            cutoff = kth - query_sq_norm + _float32_error_bound(len(point), self.max_sq_norm, np.sqrt(query_sq_norm))
+            within = np.flatnonzero(approximate <= cutoff)
+            if not np.isin(within, candidates).all():
+                candidates = within
+                sq_distances = self._sq_distances(point, candidates)
+        distances = np.sqrt(sq_distances)
+        order = np.lexsort((candidates, distances))[:k]
+        return distances[order], candidates[order]
+
+    def _sq_distances(self, point: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        diff = self.points[rows].astype(np.float64) - point
+        return np.einsum('ij,ij->i', diff, diff)
+
+    def query(self, inputs: Dict, k: int = 5) -> pd.DataFrame:
+        """The k nearest cohort patients, closest first, with their distance"""
+        distances, rows = self.nearest(encode(pd.DataFrame([inputs]), self.spec), k)
+        matches = _rows_frame(self.columns, rows)
+        matches.insert(0, 'distance', distances)
+        return matches
+
+    def save(self, path: str = INDEX_PATH):
+        import joblib
+
+        joblib.dump({'format_version': INDEX_FORMAT_VERSION, 'spec': self.spec, 'points': self.points,
+                     'sq_norms': self.sq_norms, 'columns': self.columns, 'source': self.source}, path)
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH):
+        """Load an index; the embedded matrix and display columns are memory-mapped rather than read into memory"""
+        import joblib
+
+        payload = joblib.load(path, mmap_mode='r')
+        if payload.get('format_version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported similar-patient index format {payload.get('format_version')}")
+        return cls(payload['spec'], payload['points'], payload['columns'], payload.get('source', ''),
+                   payload['sq_norms'])
+
+
+def build_similar_index(input_path: str, chunk_size: int = 200000, id_column: Optional[str] = None,
+                        display_columns: Sequence[str] = DISPLAY_COLUMNS) -> SimilarPatientIndex:
+    """Embed a CSV/Parquet cohort into the search matrix"""
+    spec = fit_encoding(input_path, chunk_size)
+    points = None
+    kept: List[pd.DataFrame] = []
+    start = 0
+    for chunk in iter_chunks(input_path, chunk_size):
+        embedded = encode(chunk, spec)
+        if points is None:
+            points = np.empty((spec['rows'], embedded.shape[1]), dtype=np.float32)
+        points[start:start + len(chunk)] = embedded
+        start += len(chunk)
+        columns = [c for c in [id_column, *display_columns, OUTCOME_COLUMN, RISK_COLUMN] if c and c in chunk]
+        kept.append(chunk[columns].reset_index(drop=True))
+    if points is None:
+        raise ValueError(f"{input_path} has no rows")
+    patients = pd.concat(kept, ignore_index=True)
+    return SimilarPatientIndex(spec, points, _column_arrays(patients), source=input_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the similar-patient search index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Index a CSV/Parquet cohort")
+    build.add_argument('input', help="Cohort file (.csv or .parquet), optionally scored by batch_score.py")
+    build.add_argument('--output', default=INDEX_PATH, help="Index file")
+    build.add_argument('--chunk-size', type=int, default=200000, help="Rows per streamed chunk")
+    build.add_argument('--id-column', help="Patient identifier to show with each match")
+    query = subparsers.add_parser('query', help="Neighbours of the reference patient")
+    query.add_argument('path', nargs='?', default=INDEX_PATH)
+    query.add_argument('-k', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        index = build_similar_index(args.input, args.chunk_size, args.id_column)
+        index.save(args.output)
+        print(f"Indexed {index.size:,} patients into {args.output} in {time.perf_counter() - start:.1f}s",
+              file=sys.stderr)
+    else:
+        index = SimilarPatientIndex.load(args.path)
+        start = time.perf_counter()
+        matches = index.query(REFERENCE_PATIENT, args.k)
+        print(matches.to_string(index=False))
+        print(f"{args.k} of {index.size:,} in {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
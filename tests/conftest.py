@@ -0,0 +1,54 @@
+# conftest.py
+"""Shared fixtures: a small synthetic PyCaret LightGBM pipeline and cohort.
+
+The pipeline is trained once per session on patients drawn across the sidebar
+ranges, with the outcome driven by a handful of fields, so tests exercise the
+same preprocessing and booster layout as the shipped model without needing it.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# PyCaret logs to ./logs.log from import time unless pointed elsewhere
+os.environ.setdefault('PYCARET_CUSTOM_LOGGING_PATH', os.devnull)
+
+from fast_inference import INPUT_FEATURES, build_fast_scorer, parity_samples  # noqa: E402
+
+
+def synthetic_cohort(n_patients: int, seed: int = 1) -> pd.DataFrame:
+    """Patients across the input ranges with an angina outcome from a known logit"""
+    frame = pd.DataFrame(parity_samples(n_patients, seed=seed), columns=INPUT_FEATURES)
+    logit = ((frame['age'] - 60) / 15 + (frame['ldl'] - 4) / 2 + frame['chest_pain'].astype(float) * 1.2
+             + (frame['smoking_status'] != 'non-smoker') * 0.8 + (frame['sex'] == 'Male') * 0.5)
+    rng = np.random.default_rng(seed)
+    frame['angina'] = (rng.random(len(frame)) < 1 / (1 + np.exp(-logit))).astype(int)
+    return frame
+
+
+@pytest.fixture(scope='session')
+def pipeline(tmp_path_factory):
+    pytest.importorskip('pycaret')
+    from pycaret.classification import create_model, load_model, save_model, setup
+
+    setup(synthetic_cohort(600), target='angina', session_id=1, verbose=False, html=False, n_jobs=1,
+          system_log=False, log_experiment=False)
+    estimator = create_model('lightgbm', verbose=False, cross_validation=False, n_estimators=40)
+    path = str(tmp_path_factory.mktemp('model') / 'synthetic')
+    save_model(estimator, path, verbose=False)
+    return load_model(path, verbose=False)
+
+
+@pytest.fixture(scope='session')
+def scorer(pipeline):
+    scorer = build_fast_scorer(pipeline)
+    assert scorer is not None, "synthetic pipeline did not compile to the native path"
+    return scorer
+
+
+@pytest.fixture
+def cohort():
+    return synthetic_cohort(500, seed=7)
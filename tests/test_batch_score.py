@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_score import ChunkWriter
+
+
+def test_parquet_output_keeps_one_schema_across_chunks(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'scored.parquet')
+    writer = ChunkWriter(path)
+    writer.write(pd.DataFrame({'patient_id': [1, 2], 'note': [None, None], 'angina_probability': [0.1, 0.2]}))
+    writer.write(pd.DataFrame({'patient_id': [3.0, np.nan], 'note': ['recheck', None],
+                               'angina_probability': [0.3, 0.4]}))
+    writer.close()
+
+    result = pd.read_parquet(path)
+    assert len(result) == 4
+    np.testing.assert_array_equal(result['patient_id'].to_numpy(), [1.0, 2.0, 3.0, np.nan])
+    assert result['note'].tolist() == [None, None, 'recheck', None]
+
+
+def test_parquet_output_rejects_incompatible_chunk(tmp_path):
+    pytest.importorskip('pyarrow')
+    writer = ChunkWriter(str(tmp_path / 'scored.parquet'))
+    writer.write(pd.DataFrame({'angina_probability': [0.1]}))
+    with pytest.raises(ValueError, match='output schema'):
+        writer.write(pd.DataFrame({'angina_probability': ['high']}))
+    writer.close()
+
+
+def test_parquet_output_uses_declared_types_for_input_fields(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'scored.parquet')
+    writer = ChunkWriter(path)
+    writer.write(pd.DataFrame({'ldl': [None, None], 'sex': [None, None], 'chest_pain': [0, 1],
+                               'note': [None, None], 'angina_probability': [np.nan, 0.2]}))
+    writer.write(pd.DataFrame({'ldl': [2.6, 'n/a'], 'sex': ['Male', None], 'chest_pain': [True, None],
+                               'note': [3.5, None], 'angina_probability': [0.3, 0.4]}))
+    writer.close()
+
+    result = pd.read_parquet(path)
+    np.testing.assert_array_equal(result['ldl'].to_numpy(), [np.nan, np.nan, 2.6, np.nan])
+    assert result['sex'].tolist() == [None, None, 'Male', None]
+    assert result['chest_pain'].tolist() == [False, True, True, None]
+    assert result['note'].tolist() == [None, None, '3.5', None]
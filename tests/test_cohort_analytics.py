@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from cohort_analytics import TIERS, CohortAggregate, bin_counts
+from fast_inference import HIGH_RISK_THRESHOLD, MODERATE_RISK_THRESHOLD
+
+
+def _assert_same(left: CohortAggregate, right: CohortAggregate):
+    assert left.rows == right.rows
+    np.testing.assert_array_equal(left.tier_counts, right.tier_counts)
+    np.testing.assert_array_equal(left.risk_histogram, right.risk_histogram)
+    assert np.isclose(left.risk_sum, right.risk_sum)
+    for name in left.histograms:
+        np.testing.assert_array_equal(left.histograms[name], right.histograms[name])
+    assert left.missing == right.missing
+    assert left.category_counts == right.category_counts
+    assert left.group_risk.keys() == right.group_risk.keys()
+    for name in left.group_risk:
+        assert left.group_risk[name].keys() == right.group_risk[name].keys()
+        for level, (total, count) in left.group_risk[name].items():
+            assert np.isclose(total, right.group_risk[name][level][0]) and count == right.group_risk[name][level][1]
+
+
+def test_merged_chunks_equal_one_pass(cohort):
+    cohort.loc[::13, 'hdl'] = np.nan
+    cohort.loc[::17, 'smoking_status'] = None
+    probabilities = np.random.default_rng(2).random(len(cohort))
+    whole = CohortAggregate().update(cohort, probabilities)
+
+    merged = CohortAggregate()
+    for lo in range(0, len(cohort), 120):
+        merged.merge(CohortAggregate().update(cohort.iloc[lo:lo + 120], probabilities[lo:lo + 120]))
+    _assert_same(merged, whole)
+    assert sum(merged.category_counts['smoking_status'].values()) == len(cohort)
+    assert merged.category_counts['smoking_status']['Missing'] == len(cohort[::17])
+    assert sum(count for _, count in merged.group_risk['sex'].values()) == len(cohort)
+
+
+def test_tiers_and_mean_risk():
+    probabilities = np.array([0.0, MODERATE_RISK_THRESHOLD - 0.01, MODERATE_RISK_THRESHOLD + 0.01,
+                              HIGH_RISK_THRESHOLD + 0.01, 1.0])
+    aggregate = CohortAggregate().update(pd.DataFrame({'age': [50] * 5}), probabilities)
+    assert dict(zip(TIERS, aggregate.tier_counts.tolist())) == {'LOW': 2, 'MODERATE': 1, 'HIGH': 2}
+    assert np.isclose(aggregate.mean_risk, probabilities.mean())
+
+
+def test_bin_counts_clips_to_edge_bins():
+    counts, missing = bin_counts(np.array([-5.0, 0.0, 0.5, 1.0, 7.0, np.nan]), 0.0, 1.0, 4)
+    assert counts.tolist() == [2, 0, 1, 2] and missing == 1
+
+
+def test_unscored_rows_and_missing_groups():
+    chunk = pd.DataFrame({'sex': ['Male', None, 'Female', 'Male', np.nan],
+                          'ethnic': ['Chinese', 'Chinese', None, 'Chinese', 'Chinese']})
+    probabilities = np.array([0.8, 0.2, np.nan, np.inf, 0.5])
+    aggregate = CohortAggregate().update(chunk, probabilities)
+    assert aggregate.rows == 5 and aggregate.unscored == 2 and aggregate.scored == 3
+    assert aggregate.tier_counts.tolist() == [1, 1, 1]
+    assert aggregate.risk_histogram.sum() == 3
+    assert np.isclose(aggregate.mean_risk, 0.5)
+    assert aggregate.group_risk['sex'].keys() == {'Male', 'Missing'}
+    assert np.isclose(aggregate.group_risk['sex']['Missing'][0], 0.7) and aggregate.group_risk['sex']['Missing'][1] == 2
+    assert 'nan' not in aggregate.group_risk['ethnic'] and 'None' not in aggregate.group_risk['ethnic']
+    assert aggregate.merge(CohortAggregate().update(chunk, probabilities)).unscored == 4
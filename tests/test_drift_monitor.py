@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from drift_monitor import DriftMonitor, InputSketch, binned_ks, drift_report, psi
+
+
+def _odd_inputs(cohort):
+    cohort.loc[::7, 'ldl'] = np.nan
+    cohort.loc[::11, 'sodium'] = 14
+    cohort.loc[::13, 'smoking_status'] = None
+    cohort['chest_pain'] = cohort['chest_pain'].astype(object)
+    cohort.loc[::5, 'chest_pain'] = 'yes'
+    cohort['fam_chd'] = cohort['fam_chd'].astype(object)
+    cohort.loc[::9, 'fam_chd'] = np.nan
+    return cohort
+
+
+def test_update_matches_update_frame(cohort):
+    cohort = _odd_inputs(cohort)
+    by_row = InputSketch()
+    for patient in cohort.to_dict('records'):
+        by_row.update(patient)
+    by_frame = InputSketch()
+    by_frame.update_frame(cohort)
+    assert by_row.to_dict() == by_frame.to_dict()
+    assert by_row.count == len(cohort) and by_row.missing['ldl'] == len(cohort[::7])
+
+
+def test_sketch_round_trips_through_json(tmp_path, cohort):
+    sketch = InputSketch()
+    sketch.update_frame(_odd_inputs(cohort))
+    restored = InputSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.to_dict() == sketch.to_dict()
+    sketch.save(str(tmp_path / 'sketch.json'))
+    assert InputSketch.load(str(tmp_path / 'sketch.json')).to_dict() == sketch.to_dict()
+    restored.update(cohort.iloc[0].to_dict())
+    assert restored.count == sketch.count + 1
+
+
+def test_psi_and_ks_values():
+    expected = np.array([50.0, 30.0, 20.0])
+    actual = np.array([20.0, 30.0, 50.0])
+    p, q = expected / 100, actual / 100
+    assert np.isclose(psi(expected, actual), np.sum((q - p) * np.log(q / p)))
+    assert psi(expected, expected * 3) == 0
+    assert np.isclose(binned_ks(expected, actual), 0.3)
+    assert binned_ks(expected, expected * 2) == 0
+
+
+def test_shifted_input_is_reported_as_significant(cohort):
+    baseline = InputSketch()
+    baseline.update_frame(cohort)
+    shifted = cohort.assign(age=np.clip(cohort['age'] + 25, 18, 120))
+    live = InputSketch()
+    live.update_frame(shifted)
+    report = drift_report(baseline, live).set_index('feature')
+    assert report.loc['age', 'status'] == 'significant'
+    assert report.loc['ldl', 'status'] == 'stable'
+    assert drift_report(baseline, baseline)['psi'].max() == 0
+
+
+def test_report_rebins_compatible_sketches_and_rejects_others(cohort):
+    fine, coarse, odd = InputSketch(40), InputSketch(20), InputSketch(30)
+    for sketch in (fine, coarse, odd):
+        sketch.update_frame(cohort)
+    pd.testing.assert_frame_equal(drift_report(fine, coarse), drift_report(coarse, coarse))
+    assert drift_report(coarse, fine)['psi'].max() == 0
+    with pytest.raises(ValueError, match='bins'):
+        drift_report(fine, odd)
+    np.testing.assert_array_equal(fine.histogram('ldl', 20), coarse.histogram('ldl'))
+    with pytest.raises(ValueError, match='bins'):
+        fine.histogram('ldl', 30)
+
+
+def test_monitor_records_each_key_once(tmp_path, cohort):
+    baseline = InputSketch(30)
+    monitor = DriftMonitor(baseline, str(tmp_path / 'live.json'))
+    assert monitor.baseline is None
+    patient = cohort.iloc[0].to_dict()
+    monitor.record(patient, 'a')
+    monitor.record(patient, 'a')
+    monitor.record(patient, 'b')
+    monitor.record(patient)
+    assert monitor.sketch.count == 3
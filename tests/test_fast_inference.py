@@ -0,0 +1,185 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from fast_inference import (INPUT_FEATURES, PARITY_TOLERANCE, LatestWinsWorker, PredictionCache, export_artifact,
+                            load_artifact, model_fingerprint, model_metadata, parity_samples, patient_key,
+                            predict_model_proba, risk_tier, risk_tiers)
+
+
+def test_native_path_matches_predict_model(pipeline, scorer):
+    samples = parity_samples(64, seed=3)
+    expected = predict_model_proba(pipeline, pd.DataFrame(samples, columns=INPUT_FEATURES))
+    single = np.array([scorer.predict_proba(s) for s in samples])
+    np.testing.assert_allclose(single, expected, atol=PARITY_TOLERANCE)
+    np.testing.assert_allclose(scorer.predict_proba_many(samples), expected, atol=PARITY_TOLERANCE)
+    np.testing.assert_allclose(scorer.predict_frame(pd.DataFrame(samples)), expected, atol=PARITY_TOLERANCE)
+
+
+def test_contributions_sum_to_raw_score(scorer):
+    samples = parity_samples(16, seed=4)
+    X = scorer.encoder.encode_many(samples)
+    base, contributions = scorer.contributions_matrix(X)
+    raw = scorer.booster.predict(X, raw_score=True)
+    np.testing.assert_allclose(base + contributions.sum(axis=1), raw, atol=1e-9)
+
+
+def test_patient_key_is_canonical():
+    patient = parity_samples(2, seed=5)[1]
+    variant = {name: (int(value) if isinstance(value, bool) else value) for name, value in patient.items()}
+    variant['age'] = float(patient['age'])
+    variant['unrelated'] = 'ignored'
+    assert patient_key(patient) == patient_key(variant)
+    assert patient_key(patient) != patient_key({**patient, 'age': patient['age'] + 1})
+
+
+def test_prediction_cache_evicts_least_recently_used():
+    cache = PredictionCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['size'] == 2
+    assert cache.stats()['hits'] == 3 and cache.stats()['misses'] == 1
+
+
+def test_prediction_cache_computes_each_miss_once():
+    patients = parity_samples(4, seed=6)
+    calls = []
+
+    def compute_many(batch):
+        calls.append(len(batch))
+        return [float(p['age']) for p in batch]
+
+    cache = PredictionCache()
+    first = cache.get_or_compute_many(patients + patients[:2], compute_many)
+    second = cache.get_or_compute_many(patients, compute_many)
+    assert calls == [4]
+    assert first == [float(p['age']) for p in patients + patients[:2]]
+    assert second == first[:4]
+
+
+class _ManualExecutor:
+    """Queues submitted callables until run() so the test controls interleaving"""
+
+    def __init__(self):
+        self.queue = []
+
+    def submit(self, fn):
+        self.queue.append(fn)
+
+    def run(self):
+        while self.queue:
+            self.queue.pop(0)()
+
+
+def test_latest_wins_worker_drops_stale_payloads():
+    executor = _ManualExecutor()
+    seen = []
+    worker = LatestWinsWorker(executor, lambda payload: seen.append(payload) or payload * 10)
+    worker.submit(1)
+    worker.submit(2)
+    worker.submit(3)
+    assert len(executor.queue) == 1 and not worker.is_current()
+    executor.run()
+    assert seen == [3]
+    assert worker.latest() == 30 and worker.is_current()
+
+
+def test_latest_wins_worker_resolve_beats_in_flight_call():
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow(payload):
+        started.set()
+        release.wait(5)
+        return payload
+
+    executor = _ManualExecutor()
+    worker = LatestWinsWorker(executor, slow)
+    worker.submit('stale')
+    thread = threading.Thread(target=executor.run)
+    thread.start()
+    started.wait(5)
+    worker.resolve('preview')
+    release.set()
+    thread.join(5)
+    assert worker.latest() == 'preview' and worker.is_current()
+
+
+def test_cache_keys_include_model_fingerprint(pipeline, scorer):
+    metadata = model_metadata(scorer, pipeline)
+    assert metadata['fingerprint'] == model_fingerprint(scorer)
+    assert model_metadata(None, pipeline)['fingerprint'] == model_fingerprint(pipeline) != metadata['fingerprint']
+
+    patient = parity_samples(1)[0]
+    cache = PredictionCache(fingerprint=metadata['fingerprint'])
+    cache.put(cache.key(patient), 0.4)
+    other = PredictionCache(fingerprint='retrained')
+    assert cache.key(patient) != other.key(patient) != patient_key(patient)
+    assert cache.get_or_compute(patient, lambda p: 0.9) == 0.4
+
+
+def test_latest_wins_worker_publishes_failures():
+    def score(payload):
+        if payload is None:
+            raise ValueError("bad inputs")
+        return payload
+
+    executor = _ManualExecutor()
+    worker = LatestWinsWorker(executor, score)
+    worker.submit(None)
+    executor.run()
+    assert worker.is_current() and worker.latest() is None
+    assert isinstance(worker.error(), ValueError)
+    worker.submit(0.2)
+    executor.run()
+    assert worker.latest() == 0.2 and worker.error() is None
+
+
+def test_single_and_column_encoders_agree(scorer):
+    patients = parity_samples(8, seed=8)
+    odd_flags = [True, False, 1, 0, 2.0, '1', 'no', None, np.nan, np.int64(1)]
+    for i, flag in enumerate(odd_flags):
+        patient = dict(patients[i % len(patients)])
+        patient['chest_pain'] = flag
+        patient['ethnic'] = None if i % 3 == 0 else patient['ethnic']
+        patient['ldl'] = np.nan if i % 4 == 0 else patient['ldl']
+        patients.append(patient)
+    single = np.vstack([scorer.encoder.encode(p) for p in patients])
+    np.testing.assert_array_equal(single, scorer.encoder.encode_many(patients))
+    np.testing.assert_array_equal(single, scorer.encoder.encode_frame(pd.DataFrame(patients)))
+
+
+def test_cache_variants_share_one_bounded_cache():
+    patient = parity_samples(1)[0]
+    cache = PredictionCache(maxsize=2)
+    assert cache.get_or_compute(patient, lambda p: 'twelve months', variant=(12, ())) == 'twelve months'
+    assert cache.get_or_compute(patient, lambda p: 'six months', variant=(6, ('exercise',))) == 'six months'
+    assert cache.get_or_compute(patient, lambda p: 'recomputed', variant=(12, ())) == 'twelve months'
+    cache.get_or_compute(patient, lambda p: 'plain')
+    assert cache.stats()['size'] == 2
+
+
+def test_non_finite_probabilities_are_unscored():
+    tiers = risk_tiers([np.nan, 0.1, 0.5, 0.9, np.inf])
+    assert tiers.tolist() == ['UNSCORED', 'LOW', 'MODERATE', 'HIGH', 'UNSCORED']
+    assert [risk_tier(p) for p in (np.nan, 0.1, 0.5, 0.9)] == ['UNSCORED', 'LOW', 'MODERATE', 'HIGH']
+
+
+def test_exported_artifact_scores_like_the_live_pipeline(pipeline, scorer, tmp_path):
+    directory = str(tmp_path / 'compiled')
+    export_artifact(pipeline, directory)
+    loaded = load_artifact(directory)
+
+    samples = parity_samples(32, seed=11)
+    expected = predict_model_proba(pipeline, pd.DataFrame(samples, columns=INPUT_FEATURES))
+    np.testing.assert_allclose([loaded.predict_proba(s) for s in samples], expected, atol=PARITY_TOLERANCE)
+    np.testing.assert_allclose(loaded.predict_proba_many(samples), scorer.predict_proba_many(samples))
+
+    live, restored = model_metadata(scorer, pipeline), model_metadata(loaded)
+    assert restored['fingerprint'] == live['fingerprint']
+    assert restored == live
@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+from import_budget import check_budget
+
+IMPORT_BUDGET = float(os.environ.get('CARDIOPREDICT_IMPORT_BUDGET', '3.0'))
+
+
+def test_app_cold_start_stays_within_budget():
+    pytest.importorskip('streamlit')
+    pytest.importorskip('plotly')
+    problems = check_budget(IMPORT_BUDGET, runs=3)
+    assert not problems, "; ".join(problems)
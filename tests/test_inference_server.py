@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+
+from inference_server import MicroBatcher
+
+
+def _submit_concurrently(batcher, patients):
+    results = [None] * len(patients)
+
+    def call(i):
+        try:
+            results[i] = batcher.submit(patients[i], timeout=5)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(patients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_micro_batcher_returns_each_request_its_own_score():
+    batcher = MicroBatcher(lambda batch: [p['age'] / 100 for p in batch], max_wait=0.05)
+    patients = [{'age': age} for age in range(40, 56)]
+    results = _submit_concurrently(batcher, patients)
+    assert results == [p['age'] / 100 for p in patients]
+    assert batcher.requests == len(patients) and batcher.batches < len(patients)
+
+
+def test_micro_batcher_rejects_short_score_batches():
+    batcher = MicroBatcher(lambda batch: [0.5] * (len(batch) - 1), max_wait=0.05)
+    results = _submit_concurrently(batcher, [{'age': 50}, {'age': 60}])
+    assert all(isinstance(result, RuntimeError) for result in results)
+    with pytest.raises(RuntimeError, match='probabilities'):
+        batcher.submit({'age': 70}, timeout=5)
@@ -0,0 +1,55 @@
+import numpy as np
+
+from population_index import MIN_GROUP_SIZE, RISK_COLUMN, PopulationIndex, age_bands, build_index
+
+
+def test_percentiles_match_numpy(tmp_path, cohort):
+    cohort[RISK_COLUMN] = np.linspace(0, 1, len(cohort))
+    cohort.loc[::11, 'ldl'] = np.nan
+    path = tmp_path / 'cohort.csv'
+    cohort.to_csv(path, index=False)
+    build_index(str(path), str(tmp_path / 'index'), chunk_size=97)
+    index = PopulationIndex.load(str(tmp_path / 'index'))
+
+    ldl = cohort['ldl'].dropna().to_numpy(dtype=np.float32)
+    assert index.count('ldl') == len(ldl)
+    for value in (0.5, 2.6, 4.0, float(ldl[3]), 9.9):
+        value = np.float32(value)
+        expected = 100.0 * ((ldl < value).sum() + (ldl <= value).sum()) / (2 * len(ldl))
+        assert float(index.percentile('ldl', value)) == np.float64(expected)
+    np.testing.assert_allclose(index.quantiles('age', [0, 1]), [cohort['age'].min(), cohort['age'].max()])
+
+
+def test_risk_percentiles_by_group(tmp_path, cohort):
+    cohort[RISK_COLUMN] = np.random.default_rng(0).random(len(cohort))
+    path = tmp_path / 'cohort.csv'
+    cohort.to_csv(path, index=False)
+    build_index(str(path), str(tmp_path / 'index'), chunk_size=128)
+    index = PopulationIndex.load(str(tmp_path / 'index'))
+
+    patient = cohort.iloc[0].to_dict()
+    rows = {group: (level, pct, size) for group, level, pct, size in index.risk_percentiles(patient, 0.5)}
+    risk = cohort[RISK_COLUMN].to_numpy(dtype=np.float32)
+    assert rows['overall'][2] == len(cohort)
+    assert rows['overall'][1] == 100.0 * (risk < np.float32(0.5)).sum() / len(risk)
+    same_sex = cohort['sex'] == patient['sex']
+    assert rows['sex'] == (patient['sex'], 100.0 * (risk[same_sex] < np.float32(0.5)).sum() / same_sex.sum(),
+                           same_sex.sum())
+    assert all(size >= MIN_GROUP_SIZE for _, _, size in rows.values())
+    assert age_bands([39, 40, 79.5, 80]).tolist() == ['<40', '40-49', '70-79', '80+']
+
+
+def test_header_records_the_scoring_model(tmp_path, cohort):
+    path = tmp_path / 'cohort.csv'
+    cohort.to_csv(path, index=False)
+    score = lambda chunk: np.full(len(chunk), 0.25)
+    build_index(str(path), str(tmp_path / 'scored'), chunk_size=128, score=score, model_fingerprint='abc123')
+    index = PopulationIndex.load(str(tmp_path / 'scored'))
+    assert index.has_risk and index.model_fingerprint == 'abc123'
+    assert index.risk_matches('abc123') is True and index.risk_matches('retrained') is False
+
+    cohort[RISK_COLUMN] = 0.5
+    cohort.to_csv(path, index=False)
+    build_index(str(path), str(tmp_path / 'prescored'), chunk_size=128, score=score, model_fingerprint='abc123')
+    index = PopulationIndex.load(str(tmp_path / 'prescored'))
+    assert index.model_fingerprint is None and index.risk_matches('abc123') is None
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+from fast_inference import HIGH_RISK_THRESHOLD, NUMERIC_RANGES, REFERENCE_PATIENT
+from scenarios import (ALL_INTERVENTIONS, COUNTERFACTUAL_LEVERS, LIFESTYLE_INTERVENTIONS, MEDICATION_INTERVENTIONS,
+                       ScoringPool, _counterfactual, _noise_frame, age_patient, apply_interventions, confidence_interval,
+                       counterfactual_search, curve_value, feature_grid, lifestyle_grid, medication_grid,
+                       risk_trajectory, sensitivity_curves, sobol_indices)
+
+
+def test_curve_value_snaps_to_nearest_grid_point():
+    curve = pd.Series([0.1, 0.1, 0.6, 0.6], index=[1.0, 2.0, 3.0, 4.0])
+    curves = {'ldl': curve}
+    assert curve_value(curves, 'ldl', 2.4) == 0.1
+    assert curve_value(curves, 'ldl', 2.6) == 0.6
+    assert curve_value(curves, 'ldl', 4.0) == 0.6
+    assert curve_value(curves, 'ldl', 4.5) is None
+    assert curve_value(curves, 'hdl', 1.0) is None
+
+
+def test_curve_value_is_exact_on_the_grid(scorer):
+    curves = sensitivity_curves(REFERENCE_PATIENT, scorer.predict_frame, features=['age', 'ldl'])
+    for name in ('age', 'ldl'):
+        value = feature_grid(name)[7]
+        expected = scorer.predict_proba({**REFERENCE_PATIENT, name: value})
+        assert np.isclose(curve_value(curves, name, value), expected)
+
+
+def _sodium_scorer(frame):
+    """Risk that rises steeply with sodium, so pinning sodium to the sidebar range moves it"""
+    return 1 / (1 + np.exp(-(frame['sodium'].to_numpy(dtype=np.float64) - 60) / 5))
+
+
+def test_confidence_interval_contains_point_estimate_for_out_of_range_inputs():
+    assert REFERENCE_PATIENT['sodium'] < NUMERIC_RANGES['sodium'][0]
+    point = float(_sodium_scorer(pd.DataFrame([REFERENCE_PATIENT]))[0])
+    interval = confidence_interval(REFERENCE_PATIENT, _sodium_scorer, budget=0.01)
+    assert interval['low'] <= point <= interval['high']
+
+
+def test_noise_is_centred_on_the_patient_and_keeps_the_ratio():
+    z = np.random.default_rng(0).standard_normal((4000, 2))
+    frame = _noise_frame(REFERENCE_PATIENT, z, ['sodium', 'potassium'])
+    assert abs(frame['sodium'].mean() - REFERENCE_PATIENT['sodium']) < 0.05
+    assert abs(frame['potassium'].mean() - REFERENCE_PATIENT['potassium']) < 0.1
+    assert (frame['Cholesterol_HDL_Ratio'] == REFERENCE_PATIENT['Cholesterol_HDL_Ratio']).all()
+
+    frame = _noise_frame(REFERENCE_PATIENT, z, ['total_cholesterol', 'hdl'])
+    patient = REFERENCE_PATIENT
+    expected = (patient['Cholesterol_HDL_Ratio'] * (frame['total_cholesterol'] / patient['total_cholesterol'])
+                / (frame['hdl'] / patient['hdl']))
+    np.testing.assert_allclose(frame['Cholesterol_HDL_Ratio'], expected)
+    assert frame['Cholesterol_HDL_Ratio'].std() > 0
+
+
+def test_sobol_pool_matches_in_process_scoring(scorer):
+    expected = sobol_indices(REFERENCE_PATIENT, scorer.predict_frame, n_base=256, chunk_size=2048)
+    pool = ScoringPool(scorer.predict_frame, 2)
+    try:
+        pooled = sobol_indices(REFERENCE_PATIENT, scorer.predict_frame, n_base=256, chunk_size=2048, pool=pool)
+        again = sobol_indices(REFERENCE_PATIENT, scorer.predict_frame, n_base=256, chunk_size=2048, pool=pool)
+    finally:
+        pool.shutdown()
+    pd.testing.assert_frame_equal(pooled['indices'], expected['indices'])
+    pd.testing.assert_frame_equal(again['indices'], expected['indices'])
+    assert expected['variance'] > 0
+
+
+def _assert_grid_matches_row_scoring(grid, scorer, patient, interventions, n_applicable):
+    assert len(grid) == 2 ** n_applicable
+    assert grid['interventions'].map(len).tolist() == grid['n_interventions'].tolist()
+    assert grid['probability'].is_monotonic_increasing
+    assert grid.loc['No change', 'n_interventions'] == 0 and grid.loc['No change', 'delta'] == 0
+
+    variants = [apply_interventions(patient, combo, interventions) for combo in grid['interventions']]
+    expected = scorer.predict_frame(pd.DataFrame(variants))
+    np.testing.assert_allclose(grid['probability'], expected)
+    np.testing.assert_allclose(grid['delta'], expected - grid.loc['No change', 'probability'])
+
+
+def test_lifestyle_grid_matches_scoring_each_variant(scorer):
+    patient = {**REFERENCE_PATIENT, 'smoking_status': 'heavy smoker', 'physical_activity': 'low', 'BMI': 31.0}
+    grid = lifestyle_grid(patient, scorer.predict_proba_many)
+    _assert_grid_matches_row_scoring(grid, scorer, patient, LIFESTYLE_INTERVENTIONS, len(LIFESTYLE_INTERVENTIONS))
+
+    grid = lifestyle_grid(REFERENCE_PATIENT, scorer.predict_proba_many)
+    skipped = {'Quit Smoking', 'Exercise 150min/week', 'Weight Loss (10%)'}
+    assert not any(skipped & set(combo) for combo in grid['interventions'])
+    _assert_grid_matches_row_scoring(grid, scorer, REFERENCE_PATIENT, LIFESTYLE_INTERVENTIONS,
+                                     len(LIFESTYLE_INTERVENTIONS) - 3)
+
+
+def test_medication_grid_matches_scoring_each_variant(scorer):
+    patient = {**REFERENCE_PATIENT, 'hba1c': 50.0, 'ldl': 4.5, 'total_cholesterol': 6.8}
+    grid = medication_grid(patient, scorer.predict_proba_many)
+    _assert_grid_matches_row_scoring(grid, scorer, patient, MEDICATION_INTERVENTIONS, len(MEDICATION_INTERVENTIONS))
+
+    treated = {**patient, 'chol_lowering': 1, 'hba1c': 38.0}
+    grid = medication_grid(treated, scorer.predict_proba_many)
+    assert not any({'Statins', 'Metformin'} & set(combo) for combo in grid['interventions'])
+    _assert_grid_matches_row_scoring(grid, scorer, treated, MEDICATION_INTERVENTIONS, len(MEDICATION_INTERVENTIONS) - 2)
+
+
+def test_risk_trajectory_matches_scoring_the_aged_patient(scorer):
+    patient = {**REFERENCE_PATIENT, 'smoking_status': 'heavy smoker', 'age': 70}
+    chosen = ('Quit Smoking', 'Statins')
+    trajectory = risk_trajectory(patient, scorer.predict_proba_many, months=24, interventions=chosen)
+    assert len(trajectory) == 25 and trajectory.index.tolist() == list(range(25))
+
+    treated = apply_interventions(patient, chosen, ALL_INTERVENTIONS)
+    for months in (0, 1, 12, 24):
+        aged = age_patient(patient, months)
+        assert aged['age'] == patient['age'] + months / 12
+        assert np.isclose(trajectory.loc[months, 'without'], scorer.predict_proba(aged))
+        assert np.isclose(trajectory.loc[months, 'with'], scorer.predict_proba(age_patient(treated, months)))
+    assert np.isclose(trajectory.loc[0, 'without'], scorer.predict_proba(patient))
+
+
+def test_counterfactual_lowers_risk_through_modifiable_fields_only(scorer):
+    patient = {**REFERENCE_PATIENT, 'smoking_status': 'heavy smoker', 'age': 66, 'ldl': 5.5, 'total_cholesterol': 7.5,
+               'chest_pain': 1, 'sex': 'Male', 'physical_activity': 'low', 'BMI': 31.0, 'mean_sbp': 150, 'hba1c': 55}
+    assert scorer.predict_proba(patient) >= HIGH_RISK_THRESHOLD
+    found = counterfactual_search(patient, scorer.predict_proba_many, threshold=HIGH_RISK_THRESHOLD, budget=5.0)
+    assert found['reached'] and found['probability'] < HIGH_RISK_THRESHOLD
+    assert found['changes'] and set(found['changes']) <= set(COUNTERFACTUAL_LEVERS)
+    assert all(patient[name] == before != after for name, (before, after) in found['changes'].items())
+
+    changed = _counterfactual(patient, {name: after for name, (_, after) in found['changes'].items()})
+    assert np.isclose(scorer.predict_proba(changed), found['probability'])
+    allowed = set(found['changes'])
+    if 'ldl' in allowed:
+        allowed |= {'total_cholesterol', 'Cholesterol_HDL_Ratio'}
+    assert {name for name in patient if changed[name] != patient[name]} <= allowed
+
+    unreachable = counterfactual_search(patient, scorer.predict_proba_many, threshold=0.0, budget=5.0)
+    assert not unreachable['reached'] and unreachable['probability'] >= 0.0
+    assert set(unreachable['changes']) <= set(COUNTERFACTUAL_LEVERS)
+
+
+class _RecordingPool:
+    """Stands in for ScoringPool, scoring in-process and recording the frames it is handed"""
+
+    def __init__(self, score_frame, processes):
+        self.score_frame = score_frame
+        self.processes = processes
+        self.frames = []
+
+    def map(self, frames):
+        self.frames = frames
+        return np.concatenate([self.score_frame(frame) for frame in frames])
+
+
+def test_sobol_default_design_is_split_across_pool_workers(scorer):
+    expected = sobol_indices(REFERENCE_PATIENT, scorer.predict_frame)
+    pool = _RecordingPool(scorer.predict_frame, 4)
+    pooled = sobol_indices(REFERENCE_PATIENT, scorer.predict_frame, pool=pool)
+    assert expected['n_evaluations'] < 32768
+    assert len(pool.frames) == pool.processes
+    assert sum(len(frame) for frame in pool.frames) == pooled['n_evaluations']
+    pd.testing.assert_frame_equal(pooled['indices'], expected['indices'])
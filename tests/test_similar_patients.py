@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from similar_patients import SimilarPatientIndex, build_similar_index, encode
+
+
+def test_query_matches_brute_force_knn(tmp_path, cohort):
+    cohort.insert(0, 'patient_id', np.arange(len(cohort)))
+    cohort.loc[::9, 'ldl'] = np.nan
+    path = tmp_path / 'cohort.csv'
+    cohort.to_csv(path, index=False)
+    index = build_similar_index(str(path), chunk_size=97, id_column='patient_id')
+    reference = encode(pd.read_csv(path), index.spec).astype(np.float64)
+
+    for row in (0, 17, 250):
+        patient = cohort.drop(columns='patient_id').iloc[row].to_dict()
+        patient['age'] += 1
+        distances = np.sqrt(np.square(reference - encode(pd.DataFrame([patient]), index.spec)).sum(axis=1))
+        expected = np.lexsort((np.arange(len(distances)), distances))[:7]
+        matches = index.query(patient, k=7)
+        assert matches['patient_id'].tolist() == expected.tolist()
+        np.testing.assert_allclose(matches['distance'], distances[expected], rtol=1e-6)
+
+
+def test_saved_index_round_trips(tmp_path, cohort):
+    path = tmp_path / 'cohort.csv'
+    cohort.to_csv(path, index=False)
+    index = build_similar_index(str(path))
+    index.save(str(tmp_path / 'similar.joblib'))
+    loaded = SimilarPatientIndex.load(str(tmp_path / 'similar.joblib'))
+    patient = cohort.iloc[3].to_dict()
+    pd.testing.assert_frame_equal(loaded.query(patient, 5), index.query(patient, 5))
+    assert loaded.query(patient, 1)['distance'].iloc[0] == 0
+    assert len(loaded.query(patient, 10 ** 6)) == len(cohort)
+
+
+def test_near_ties_are_ranked_exactly():
+    # A large shared offset leaves float32 scores with far less precision than the gaps between rows
+    rng = np.random.default_rng(5)
+    points = (300 + 0.01 * rng.standard_normal((4000, 8))).astype(np.float32)
+    index = SimilarPatientIndex({}, points, {'row': np.arange(len(points))})
+    for _ in range(5):
+        point = (300 + 0.01 * rng.standard_normal(8)).astype(np.float32)
+        distances = np.sqrt(np.square(points.astype(np.float64) - point).sum(axis=1))
+        expected = np.lexsort((np.arange(len(points)), distances))[:10]
+        found, rows = index.nearest(point, 10)
+        assert rows.tolist() == expected.tolist()
+        np.testing.assert_array_equal(found, distances[expected])
+
+
+def test_display_columns_load_memory_mapped(tmp_path, cohort):
+    cohort.insert(0, 'patient_id', [f"P{i:04d}" for i in range(len(cohort))])
+    cohort.loc[::7, 'ethnic'] = None
+    path = tmp_path / 'cohort.csv'
+    cohort.to_csv(path, index=False)
+    build_similar_index(str(path), id_column='patient_id').save(str(tmp_path / 'similar.joblib'))
+    loaded = SimilarPatientIndex.load(str(tmp_path / 'similar.joblib'))
+    assert all(isinstance(values, np.memmap) for values in loaded.columns.values())
+
+    patient = cohort.drop(columns='patient_id').iloc[14].to_dict()
+    match = loaded.query(patient, 1).iloc[0]
+    assert match['patient_id'] == 'P0014' and match['ethnic'] is None and match['sex'] == patient['sex']